@@ -0,0 +1,604 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Daniel Nunes
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Micro-benchmarks for the performance sensitive parts of the designer.
+
+Usage: python dev/benchmarks.py [benchmark ...] [--plugins N]
+
+Runs every benchmark if none is given.
+"""
+
+import sys
+import os
+import gc
+from argparse import ArgumentParser
+from timeit import default_timer
+from tempfile import TemporaryDirectory
+from lxml.etree import (PythonElementClassLookup, XMLParser, fromstring, tostring, Element, SubElement, CommentBase,
+                        Comment, parse, ElementTree)
+from lxml.objectify import deannotate
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import nodes  # noqa
+from src.snapshots import SnapshotCache  # noqa
+from src.io import module_parser, _NodeClassLookup, node_factory, copy_node, import_, _validate_child, export  # noqa
+from src.previews import PreviewSnapshot, PreviewCodeWorker, LatestQueue  # noqa
+
+
+def large_config(plugins):
+    """
+    Creates a ModuleConfig.xml with *plugins* plugins that covers every tag and every ambiguous tag context.
+
+    :param plugins: The number of plugins in the config.
+    :return: The config as bytes.
+    """
+    plugin = "<plugin name=\"Plugin\"><description>Description</description><image path=\"image.png\"/>" \
+             "<files><file source=\"a.esp\" destination=\"a.esp\"/><folder source=\"b\" destination=\"b\"/></files>" \
+             "<conditionFlags><flag name=\"flag\">On</flag></conditionFlags>" \
+             "<typeDescriptor><dependencyType><defaultType name=\"Optional\"/><patterns>" \
+             "<pattern><dependencies operator=\"And\"><flagDependency flag=\"flag\" value=\"On\"/>" \
+             "<dependencies><fileDependency file=\"a.esp\" state=\"Active\"/></dependencies>" \
+             "</dependencies><type name=\"Recommended\"/></pattern>" \
+             "</patterns></dependencyType></typeDescriptor></plugin>"
+    config = "<config><moduleName>Benchmark</moduleName>" \
+             "<moduleDependencies><gameDependency version=\"1.0\"/></moduleDependencies>" \
+             "<installSteps order=\"Explicit\"><installStep name=\"Step\">" \
+             "<visible><flagDependency flag=\"flag\" value=\"On\"/></visible>" \
+             "<optionalFileGroups><group name=\"Group\" type=\"SelectAny\"><plugins>" + \
+             plugin * plugins + \
+             "</plugins></group></optionalFileGroups></installStep></installSteps>" \
+             "<conditionalFileInstalls><patterns><pattern><dependencies>" \
+             "<flagDependency flag=\"flag\" value=\"On\"/></dependencies>" \
+             "<files><file source=\"c.esp\" destination=\"c.esp\"/></files></pattern></patterns>" \
+             "</conditionalFileInstalls></config>"
+    return config.encode()
+
+
+class LegacyNodeClassLookup(PythonElementClassLookup):
+    """
+    The if/elif lookup the designer used before the table based one, kept here as the reference point.
+    """
+    def lookup(self, doc, element):
+        if element.tag == "fomod":
+            return nodes.NodeInfoRoot
+        elif element.tag == "Name":
+            return nodes.NodeInfoName
+        elif element.tag == "Author":
+            return nodes.NodeInfoAuthor
+        elif element.tag == "Version":
+            return nodes.NodeInfoVersion
+        elif element.tag == "Id":
+            return nodes.NodeInfoID
+        elif element.tag == "Website":
+            return nodes.NodeInfoWebsite
+        elif element.tag == "Description":
+            return nodes.NodeInfoDescription
+        elif element.tag == "Groups":
+            return nodes.NodeInfoGroup
+        elif element.tag == "element":
+            return nodes.NodeInfoElement
+
+        elif element.tag == "config":
+            return nodes.NodeConfigRoot
+        elif element.tag == "moduleName":
+            return nodes.NodeConfigModName
+        elif element.tag == "moduleImage":
+            return nodes.NodeConfigModImage
+        elif element.tag == "moduleDependencies":
+            return nodes.NodeConfigModDepend
+        elif element.tag == "requiredInstallFiles":
+            return nodes.NodeConfigReqFiles
+        elif element.tag == "installSteps":
+            return nodes.NodeConfigInstallSteps
+        elif element.tag == "conditionalFileInstalls":
+            return nodes.NodeConfigCondInstall
+        elif element.tag == "fileDependency":
+            return nodes.NodeConfigDependFile
+        elif element.tag == "flagDependency":
+            return nodes.NodeConfigDependFlag
+        elif element.tag == "gameDependency":
+            return nodes.NodeConfigDependGame
+        elif element.tag == "file":
+            return nodes.NodeConfigFile
+        elif element.tag == "folder":
+            return nodes.NodeConfigFolder
+        elif element.tag == "patterns":
+            if element.getparent().tag == "dependencyType":
+                return nodes.NodeConfigInstallPatterns
+            elif element.getparent().tag == "conditionalFileInstalls":
+                return nodes.NodeConfigPatterns
+        elif element.tag == "pattern":
+            if element.getparent().getparent().tag == "conditionalFileInstalls":
+                return nodes.NodeConfigPattern
+            elif element.getparent().getparent().tag == "dependencyType":
+                return nodes.NodeConfigInstallPattern
+        elif element.tag == "files":
+            return nodes.NodeConfigFiles
+        elif element.tag == "dependencies":
+            if element.getparent().tag == "dependencies" or \
+                    element.getparent().tag == "moduleDependencies" or \
+                    element.getparent().tag == "visible":
+                return nodes.NodeConfigNestedDependencies
+            else:
+                return nodes.NodeConfigDependencies
+        elif element.tag == "installStep":
+            return nodes.NodeConfigInstallStep
+        elif element.tag == "visible":
+            return nodes.NodeConfigVisible
+        elif element.tag == "optionalFileGroups":
+            return nodes.NodeConfigOptGroups
+        elif element.tag == "group":
+            return nodes.NodeConfigGroup
+        elif element.tag == "plugins":
+            return nodes.NodeConfigPlugins
+        elif element.tag == "plugin":
+            return nodes.NodeConfigPlugin
+        elif element.tag == "description":
+            return nodes.NodeConfigPluginDescription
+        elif element.tag == "image":
+            return nodes.NodeConfigImage
+        elif element.tag == "conditionFlags":
+            return nodes.NodeConfigConditionFlags
+        elif element.tag == "typeDescriptor":
+            return nodes.NodeConfigTypeDesc
+        elif element.tag == "flag":
+            return nodes.NodeConfigFlag
+        elif element.tag == "dependencyType":
+            return nodes.NodeConfigDependencyType
+        elif element.tag == "defaultType":
+            return nodes.NodeConfigDefaultType
+        elif element.tag == "type":
+            return nodes.NodeConfigType
+
+        else:
+            raise AssertionError("Tag {} at line {} could not be matched.".format(element.tag, element.sourceline))
+
+
+def timed(function, repeat=3):
+    """
+    :return: The best time out of *repeat* runs of *function*, in seconds.
+    """
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = default_timer()
+        function()
+        elapsed = default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(title, legacy, current):
+    print("{:<40} legacy {:>9.4f}s   current {:>9.4f}s   x{:.1f}".format(title, legacy, current, legacy / current))
+
+
+def bench_lookup(plugins):
+    """
+    Compares the table based node class lookup with the old if/elif chain.
+
+    The resolution alone is measured on plain elements (no node instances are created), then the full
+    parse and walk of the config is measured with each lookup installed in the parser.
+    """
+    config = large_config(plugins)
+    plain_elements = list(fromstring(config).iter())
+    print("Config with {} plugins, {} elements".format(plugins, len(plain_elements)))
+
+    legacy_lookup = LegacyNodeClassLookup()
+    current_lookup = _NodeClassLookup()
+    current_lookup.lookup(None, plain_elements[0])  # build the table outside the timings
+
+    report(
+        "class resolution",
+        timed(lambda: [legacy_lookup.lookup(None, element) for element in plain_elements]),
+        timed(lambda: [current_lookup.lookup(None, element) for element in plain_elements])
+    )
+
+    legacy_parser = XMLParser(remove_pis=True, remove_blank_text=True)
+    legacy_parser.set_element_class_lookup(legacy_lookup)
+    report(
+        "parse and walk",
+        timed(lambda: list(fromstring(config, legacy_parser).iter())),
+        timed(lambda: list(fromstring(config, module_parser).iter()))
+    )
+
+
+def legacy_node_factory(tag, parent=None):
+    """
+    The node factory the designer used before, which serialised and re-parsed the whole ancestor chain.
+    """
+    if parent is None:
+        return module_parser.makeelement(tag)
+    list_ = [parent]
+    for elem in parent.iterancestors():
+        list_.append(elem)
+
+    list_ = list_[::-1]
+    list_[0] = Element(list_[0].tag)
+    for elem in list_[1:]:
+        list_[list_.index(elem)] = SubElement(list_[list_.index(elem) - 1], elem.tag)
+    SubElement(list_[len(list_) - 1], tag)
+
+    root = fromstring(tostring(list_[0]), module_parser)
+    parsed_list = []
+    for elem in root.iterdescendants():
+        parsed_list.append(elem)
+    return parsed_list[len(parsed_list) - 1]
+
+
+def bench_factory(plugins):
+    """
+    Compares creating nested dependencies deep inside a large config with the old and current node factories.
+    """
+    root = fromstring(large_config(plugins), module_parser)
+    parents = root.findall(".//typeDescriptor/dependencyType/patterns/pattern/dependencies")[:200]
+    print("Creating one nested dependency under each of {} parents".format(len(parents)))
+
+    report(
+        "node factory",
+        timed(lambda: [legacy_node_factory("dependencies", parent) for parent in parents]),
+        timed(lambda: [node_factory("dependencies", parent) for parent in parents])
+    )
+
+
+def legacy_copy_node(node, parent=None):
+    """
+    The recursive copy the designer used before, one node_factory call and add_child per element.
+    """
+    if parent is None:
+        parent = node.getparent()
+    result = legacy_node_factory(node.tag, parent)
+    result.text = node.text
+    for key in node.keys():
+        result.set(key, node.get(key))
+    result.parse_attribs()
+    for child in node:
+        if child.tag is Comment:
+            result.append(CommentBase(child.text))
+        else:
+            new_child = legacy_copy_node(child)
+            result.add_child(new_child)
+    result.load_metadata()
+    return result
+
+
+def bench_copy(plugins):
+    """
+    Compares copying a group whose plugins hold *plugins* file entries in total.
+    """
+    root = fromstring(large_config(plugins), module_parser)
+    group = root.find(".//group")
+    print("Copying a group with {} elements".format(len(list(group.iter()))))
+
+    report(
+        "copy node",
+        timed(lambda: legacy_copy_node(group), repeat=1),
+        timed(lambda: copy_node(group), repeat=1)
+    )
+
+
+def legacy_import(config_path):
+    """
+    The multi-pass import the designer used before, for the config file only.
+    """
+    root = parse(config_path, parser=module_parser).getroot()
+    root.sort()
+    root.model_item.sortChildren(0)
+    for element in root.iter():
+        element.parse_attribs()
+
+        for elem in element:
+            element.model_item.appendRow(elem.model_item)
+            if not _validate_child(elem):
+                element.remove_child(elem)
+
+        element.write_attribs()
+        element.load_metadata()
+    return root
+
+
+def bench_import(plugins):
+    """
+    Compares the old multi-pass import with the streaming one.
+    """
+    with TemporaryDirectory() as package:
+        os.mkdir(os.path.join(package, "fomod"))
+        with open(os.path.join(package, "fomod", "Info.xml"), "wb") as info:
+            info.write(b"<fomod/>")
+        config_path = os.path.join(package, "fomod", "ModuleConfig.xml")
+        with open(config_path, "wb") as config:
+            config.write(large_config(plugins))
+        print("Importing a {:.1f} MB config".format(os.path.getsize(config_path) / 2 ** 20))
+
+        report(
+            "import",
+            timed(lambda: legacy_import(config_path), repeat=1),
+            timed(lambda: import_(package), repeat=1)
+        )
+
+
+def legacy_validate_child(child):
+    """
+    The sibling scan import used before to validate each child.
+    """
+    if type(child) in child.getparent().allowed_children or child.tag is Comment:
+        if child.allowed_instances:
+            instances = 0
+            for item in child.getparent():
+                if type(item) == type(child):
+                    instances += 1
+            if instances <= child.allowed_instances:
+                return True
+        else:
+            return True
+    return False
+
+
+def legacy_can_add_child(parent, child):
+    """
+    The sibling scan can_add_child used before.
+    """
+    if child.allowed_instances:
+        instances = 0
+        for item in parent:
+            if type(item) == type(child):
+                instances += 1
+        if instances >= child.allowed_instances:
+            return False
+    if type(child) in parent.allowed_children or child.tag is Comment:
+        return True
+    return False
+
+
+def bench_children(plugins):
+    """
+    Compares the instance checks on wide dependencies nodes, *plugins* children each.
+
+    Validating every child only scans the siblings for instance-limited children, so the worst case (every child
+    is limited) is measured. Adding a child is checked on a node with a single limited child among the others.
+    """
+    limited = "<dependencies>" + "<gameDependency version=\"1.0\"/>" * plugins + "</dependencies>"
+    mixed = "<dependencies>" + "<fileDependency file=\"a.esp\" state=\"Active\"/>" * (plugins - 1) + \
+            "<gameDependency version=\"1.0\"/></dependencies>"
+    root = fromstring("<config><moduleDependencies>" + limited + mixed + "</moduleDependencies></config>",
+                      module_parser)
+    # keep every node alive so the checks don't measure node initialisation
+    nodes_ = list(root.iter())
+    children = list(root[0][0])
+    parent = root[0][1]
+    game_dependency = node_factory("gameDependency", parent)
+    print("Checking nodes with {} children, {} nodes in total".format(plugins, len(nodes_)))
+
+    report(
+        "validate every child",
+        timed(lambda: [legacy_validate_child(child) for child in children], repeat=1),
+        timed(lambda: [_validate_child(child) for child in children], repeat=1)
+    )
+    report(
+        "can_add_child x1000",
+        timed(lambda: [legacy_can_add_child(parent, game_dependency) for _ in range(1000)]),
+        timed(lambda: [parent.can_add_child(game_dependency) for _ in range(1000)])
+    )
+
+
+def legacy_export(info_root, config_root, package_path):
+    """
+    The export the designer used before, which rewrote both files in place every time.
+    """
+    for root, name in ((info_root, "Info.xml"), (config_root, "ModuleConfig.xml")):
+        with open(os.path.join(package_path, "fomod", name), "wb") as file_:
+            ElementTree(root).write(file_, pretty_print=True)
+
+
+def bench_export(plugins):
+    """
+    Compares saving an unchanged installer with the old and current exports.
+    """
+    with TemporaryDirectory() as package:
+        os.mkdir(os.path.join(package, "fomod"))
+        with open(os.path.join(package, "fomod", "Info.xml"), "wb") as info:
+            info.write(b"<fomod/>")
+        with open(os.path.join(package, "fomod", "ModuleConfig.xml"), "wb") as config:
+            config.write(large_config(plugins))
+        info_root, config_root = import_(package)
+        export(info_root, config_root, package)
+        print("Saving an unchanged {:.1f} MB config".format(
+            os.path.getsize(os.path.join(package, "fomod", "ModuleConfig.xml")) / 2 ** 20
+        ))
+
+        report(
+            "export",
+            timed(lambda: legacy_export(info_root, config_root, package)),
+            timed(lambda: export(info_root, config_root, package))
+        )
+
+
+def bench_snapshot(plugins):
+    """
+    Compares importing an installer with loading its snapshot.
+    """
+    with TemporaryDirectory() as package, TemporaryDirectory() as snapshots:
+        os.mkdir(os.path.join(package, "fomod"))
+        with open(os.path.join(package, "fomod", "Info.xml"), "wb") as info:
+            info.write(b"<fomod/>")
+        with open(os.path.join(package, "fomod", "ModuleConfig.xml"), "wb") as config:
+            config.write(large_config(plugins))
+        cache = SnapshotCache(snapshots)
+        cache.store(package, *import_(package))
+        print("Reopening a {:.1f} MB config".format(
+            os.path.getsize(os.path.join(package, "fomod", "ModuleConfig.xml")) / 2 ** 20
+        ))
+
+        report(
+            "reopen",
+            timed(lambda: import_(package), repeat=1),
+            timed(lambda: cache.load(package), repeat=1)
+        )
+
+
+def legacy_sort(node):
+    """
+    The sort the designer used before, which re-sorted every parent in the document with string keys.
+    """
+    for parent in node.xpath('//*[./*]'):
+        parent[:] = sorted(parent, key=lambda x: x.sort_order + "." + x.user_sort_order)
+
+
+def bench_sort(plugins):
+    """
+    Compares sorting the plugins after changing the order of one of them with the old and current sorts.
+    """
+    root = fromstring(large_config(plugins), module_parser)
+    # keep every node alive so the sort doesn't measure node initialisation
+    nodes_ = list(root.iter())
+    root.sort()
+    plugin = root.find(".//plugin")
+    print("Sorting after a change in a config with {} nodes".format(len(nodes_)))
+
+    def current_sort():
+        plugin.user_sort_order = "1".zfill(7) if plugin.user_sort_order == "0".zfill(7) else "0".zfill(7)
+        plugin.getparent().sort()
+
+    report(
+        "sort",
+        timed(lambda: legacy_sort(plugin), repeat=1),
+        timed(current_sort)
+    )
+
+
+def legacy_flag_completers(root):
+    """
+    The flag completers the designer used before, which scanned the whole config with list membership de-duplication.
+    """
+    label_list = []
+    for elem in root.iter():
+        if elem.tag == "flag":
+            value = elem.properties["name"].value
+            if value not in label_list:
+                label_list.append(value)
+    value_list = []
+    for elem in root.iter():
+        if elem.tag == "flag" and elem.text not in value_list and elem.properties["name"].value == "flag":
+            value_list.append(elem.text)
+    return label_list, value_list
+
+
+def bench_flags(plugins):
+    """
+    Compares filling the flag completers after editing a flag with the old scans and the flag index.
+    """
+    root = fromstring(large_config(plugins), module_parser)
+    nodes_ = list(root.iter())
+    for node in nodes_:
+        node.parse_attribs()
+    flag = root.find(".//flag")
+    flag_index = root.flag_index  # built once, like right after opening an installer
+    print("Filling the flag completers in a config with {} nodes".format(len(nodes_)))
+
+    def current_completers():
+        flag.properties["<node_text>"].set_value("Off" if flag.properties["<node_text>"].value == "On" else "On")
+        flag.write_attribs()
+        return flag_index.labels(), flag_index.values("flag")
+
+    report(
+        "flags",
+        timed(lambda: legacy_flag_completers(root), repeat=1),
+        timed(current_completers)
+    )
+
+
+def legacy_snapshot(element):
+    """
+    The preview snapshot before the documents were patched, which wrote the whole document and install step.
+    """
+    return tostring(element.getroottree().getroot()), tostring(next(element.iterancestors("installStep")))
+
+
+def legacy_render(xml):
+    """
+    The code preview's rendering before the documents were patched, from the whole document's xml.
+    """
+    element = fromstring(xml)
+    deannotate(element, cleanup_namespaces=True)
+    code = tostring(element, encoding="unicode", pretty_print=True)
+    return code.splitlines(), fromstring(code)
+
+
+def bench_preview(plugins):
+    """
+    Compares previewing a plugin after editing it by writing the whole document and by patching its subtree.
+    """
+    root = fromstring(large_config(plugins), module_parser)
+    nodes_ = list(root.iter())
+    for node in nodes_:
+        node.parse_attribs()
+    root.sort()
+    plugin = root.find(".//plugin")
+    print("Previewing an edited plugin in a config with {} nodes".format(len(nodes_)))
+
+    worker = PreviewCodeWorker(LatestQueue(), None, cache_size=0)
+    snapshots = [PreviewSnapshot(plugin, None, root)]
+    worker.render(snapshots[0].document, snapshots[0].revision)
+
+    def edit():
+        plugin.properties["name"].set_value("Edited" if plugin.properties["name"].value == "Plugin" else "Plugin")
+        plugin.write_attribs()
+
+    def current_snapshot():
+        edit()
+        snapshots[0] = PreviewSnapshot(plugin, None, root, {plugin}, snapshots[0])
+
+    def current_render():
+        current_snapshot()
+        worker.render(snapshots[0].document, snapshots[0].revision, snapshots[0].patches)
+
+    report(
+        "preview snapshot (gui thread)",
+        timed(lambda: (edit(), legacy_snapshot(plugin))),
+        timed(current_snapshot)
+    )
+    report(
+        "preview snapshot and render",
+        timed(lambda: (edit(), legacy_render(legacy_snapshot(plugin)[0]))),
+        timed(current_render)
+    )
+
+
+benchmarks = {
+    "lookup": bench_lookup,
+    "factory": bench_factory,
+    "copy": bench_copy,
+    "import": bench_import,
+    "children": bench_children,
+    "export": bench_export,
+    "snapshot": bench_snapshot,
+    "sort": bench_sort,
+    "flags": bench_flags,
+    "preview": bench_preview,
+}
+
+
+if __name__ == '__main__':
+    arg_parser = ArgumentParser(description="Runs the designer's micro-benchmarks.")
+    arg_parser.add_argument("benchmarks", nargs="*", help="Any of: " + ", ".join(sorted(benchmarks)))
+    arg_parser.add_argument("--plugins", type=int, default=2000, help="The number of plugins in the test config.")
+    args = arg_parser.parse_args()
+
+    for name in args.benchmarks or sorted(benchmarks):
+        if name not in benchmarks:
+            arg_parser.error("unknown benchmark: " + name)
+        print("== {} ==".format(name))
+        benchmarks[name](args.plugins)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Daniel Nunes
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from re import compile as re_compile
+from PyQt5.QtWidgets import QPlainTextEdit, QWidget, QTextEdit
+from PyQt5.QtGui import QTextCharFormat, QColor, QPainter, QFontDatabase, QTextBlockUserData, QTextCursor, \
+    QTextFormat, QSyntaxHighlighter
+from PyQt5.QtCore import Qt, QRect, QSize
+
+
+def _char_format(colour, italic=False):
+    char_format = QTextCharFormat()
+    char_format.setForeground(QColor(colour))
+    char_format.setFontItalic(italic)
+    return char_format
+
+
+class _Highlighted(QTextBlockUserData):
+    """
+    Marks a line that has been shown, and so is fully highlighted.
+    """
+
+
+class XmlHighlighter(QSyntaxHighlighter):
+    """
+    Highlights xml code, one line at a time.
+
+    Every line only carries whether it ends inside a comment to the next one, through its block state - the tags and
+    attributes are only highlighted in the lines the view asks for with highlight_blocks. Since QSyntaxHighlighter
+    highlights the following lines again whenever a line's state changes, a comment opened or closed above the shown
+    lines highlights them again on its own.
+
+    :param document: The QTextDocument to highlight.
+    """
+    _tag_regex = re_compile(r"</?[\w.:-]+|/?>|\?>|<\?[\w.:-]+")
+    _attribute_regex = re_compile(r"([\w.:-]+)\s*=\s*(\"[^\"]*\"|'[^']*')")
+    _comment_format = _char_format("#aaaaaa", True)
+    _tag_format = _char_format("#0000aa")
+    _attribute_format = _char_format("#1e90ff")
+    _value_format = _char_format("#aa5500")
+    _in_comment_state = 1
+
+    def highlight_blocks(self, first_block, last_number):
+        """
+        Highlights the lines from *first_block* up to the line number *last_number* that aren't highlighted yet.
+
+        :param first_block: The first QTextBlock to highlight.
+        :param last_number: The number of the last line to highlight.
+        """
+        block = first_block
+        while block.isValid() and block.blockNumber() <= last_number:
+            if block.userData() is None:
+                block.setUserData(_Highlighted())
+                self.rehighlightBlock(block)
+            block = block.next()
+
+    def highlightBlock(self, text):
+        in_comment = self.previousBlockState() == self._in_comment_state
+        shown = self.currentBlockUserData() is not None
+
+        index = 0
+        search_from = 0
+        while index < len(text):
+            if in_comment:
+                end = text.find("-->", search_from)
+                if end == -1:
+                    end = len(text)
+                else:
+                    end += 3
+                    in_comment = False
+                if shown:
+                    self.setFormat(index, end - index, self._comment_format)
+                index = end
+                continue
+
+            start = text.find("<!--", index)
+            if shown:
+                self._highlight_code(text, index, len(text) if start == -1 else start)
+            if start == -1:
+                break
+            in_comment = True
+            index = start
+            search_from = start + 4
+
+        self.setCurrentBlockState(self._in_comment_state if in_comment else 0)
+
+    def _highlight_code(self, text, start, end):
+        code = text[start:end]
+        for match in self._tag_regex.finditer(code):
+            self.setFormat(start + match.start(), len(match.group()), self._tag_format)
+        for match in self._attribute_regex.finditer(code):
+            self.setFormat(start + match.start(1), len(match.group(1)), self._attribute_format)
+            self.setFormat(start + match.start(2), len(match.group(2)), self._value_format)
+
+
+class _LineNumberArea(QWidget):
+    """
+    The gutter of a CodeView, where the line numbers are drawn.
+    """
+    def __init__(self, code_view):
+        super().__init__(code_view)
+        self.code_view = code_view
+
+    def sizeHint(self):
+        return QSize(self.code_view.line_number_area_width(), 0)
+
+    def paintEvent(self, event):
+        self.code_view.paint_line_numbers(event)
+
+
+class CodeView(QPlainTextEdit):
+    """
+    A read-only view of xml code with line numbers.
+
+    The text is laid out by QPlainTextEdit, which only lays out what is shown, and highlighted by a XmlHighlighter
+    as the lines come into view, so even very large documents are shown right away - setting the text only costs a
+    search for comments per line.
+
+    :param parent: Optional. The parent widget.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.highlighter = XmlHighlighter(self.document())
+        self.line_number_area = _LineNumberArea(self)
+
+        self.blockCountChanged.connect(self.update_line_number_area_width)
+        self.updateRequest.connect(self.update_line_number_area)
+        self.update_line_number_area_width()
+
+    def apply_update(self, update):
+        """
+        Replaces the lines that changed, then scrolls to and marks the lines of the selected element.
+
+        :param update: The CodePreviewUpdate to apply.
+        """
+        if update.lines is not None:
+            self._replace_lines(update.start, update.end, update.lines)
+
+        if update.selection is None:
+            self.setExtraSelections([])
+            return
+        first, last = update.selection
+        cursor = QTextCursor(self.document().findBlockByNumber(first))
+        last_block = self.document().findBlockByNumber(last)
+        cursor.setPosition(last_block.position() + last_block.length() - 1, QTextCursor.KeepAnchor)
+        selection = QTextEdit.ExtraSelection()
+        selection.format.setBackground(self.palette().alternateBase())
+        selection.format.setProperty(QTextFormat.FullWidthSelection, True)
+        selection.cursor = cursor
+        self.setExtraSelections([selection])
+        self.verticalScrollBar().setValue(first)
+
+    def _replace_lines(self, start, end, lines):
+        """
+        :param start: The first line to replace.
+        :param end: The line after the last line to replace.
+        :param lines: The new lines.
+        """
+        document = self.document()
+        old_count = document.blockCount() if document.characterCount() > 1 else 0
+        if start == 0 and end >= old_count:
+            self.setPlainText("\n".join(lines))
+        elif end < old_count:
+            cursor = QTextCursor(document)
+            cursor.setPosition(document.findBlockByNumber(start).position())
+            cursor.setPosition(document.findBlockByNumber(end).position(), QTextCursor.KeepAnchor)
+            cursor.insertText("".join(line + "\n" for line in lines))
+        else:
+            cursor = QTextCursor(document)
+            previous = document.findBlockByNumber(start - 1)
+            cursor.setPosition(previous.position() + previous.length() - 1)
+            cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+            cursor.insertText("".join("\n" + line for line in lines))
+        self.highlight_visible_blocks()
+
+    def line_number_area_width(self):
+        """
+        :return: The width needed for the largest line number.
+        """
+        return 10 + self.fontMetrics().width("9") * len(str(max(1, self.blockCount())))
+
+    def update_line_number_area_width(self):
+        self.setViewportMargins(self.line_number_area_width(), 0, 0, 0)
+
+    def visible_blocks(self):
+        """
+        Yields the QTextBlock's that are currently shown along with their top and bottom positions in the viewport.
+        """
+        block = self.firstVisibleBlock()
+        top = self.blockBoundingGeometry(block).translated(self.contentOffset()).top()
+        while block.isValid() and top <= self.viewport().height():
+            bottom = top + self.blockBoundingRect(block).height()
+            yield block, top, bottom
+            block = block.next()
+            top = bottom
+
+    def highlight_visible_blocks(self):
+        """
+        Highlights the shown lines that aren't highlighted yet.
+        """
+        first_block = self.firstVisibleBlock()
+        last_number = first_block.blockNumber()
+        for block, _, _ in self.visible_blocks():
+            last_number = block.blockNumber()
+        self.highlighter.highlight_blocks(first_block, last_number)
+
+    def update_line_number_area(self, rect, dy):
+        self.highlight_visible_blocks()
+
+        if dy:
+            self.line_number_area.scroll(0, dy)
+        else:
+            self.line_number_area.update(0, rect.y(), self.line_number_area.width(), rect.height())
+        if rect.contains(self.viewport().rect()):
+            self.update_line_number_area_width()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        contents = self.contentsRect()
+        self.line_number_area.setGeometry(
+            QRect(contents.left(), contents.top(), self.line_number_area_width(), contents.height())
+        )
+
+    def paint_line_numbers(self, event):
+        """
+        Draws the line numbers of the shown lines in the gutter.
+
+        :param event: The gutter's paint event.
+        """
+        painter = QPainter(self.line_number_area)
+        painter.fillRect(event.rect(), self.palette().alternateBase())
+        painter.setPen(self.palette().color(self.foregroundRole()).lighter(200))
+        width = self.line_number_area.width() - 5
+        height = self.fontMetrics().height()
+        for block, top, bottom in self.visible_blocks():
+            if bottom >= event.rect().top() and block.isVisible():
+                painter.drawText(0, int(top), width, height, Qt.AlignRight, str(block.blockNumber() + 1))
@@ -17,8 +17,6 @@
 from traceback import print_tb
 from io import StringIO
 from os.path import join
-from PyQt5.QtWidgets import QMessageBox
-from PyQt5.QtGui import QPixmap
 from . import __version__, cur_folder
 
 
@@ -29,6 +27,8 @@ def excepthook(exc_type, exc_value, tracebackobj):
     :param exc_value: exception value
     :param tracebackobj: traceback object
     """
+    from PyQt5.QtWidgets import QMessageBox
+    from PyQt5.QtGui import QPixmap
 
     notice = (
         "An unhandled exception occurred. Please report the problem"
@@ -91,3 +91,23 @@ class ParserError(DesignerError):
                        msg.split(",")[len(msg.split(",")) - 2] + \
                        ". If you need help visit <a href = http://www.w3schools.com/xml/xml_syntax.asp>W3Schools</a>."
         Exception.__init__(self, self.msg)
+
+
+class CancelledImportError(DesignerError):
+    """
+    Exception raised when an import is cancelled before it finished.
+    """
+    def __init__(self):
+        self.title = "Import Cancelled"
+        self.detailed = ""
+        Exception.__init__(self, "The installer import was cancelled.")
+
+
+class ReadOnlyArchiveError(DesignerError):
+    """
+    Exception raised when trying to save an installer that was opened from a zip archive.
+    """
+    def __init__(self, path):
+        self.title = "I/O Error"
+        self.detailed = ""
+        Exception.__init__(self, "{} is a zip archive, installers can only be saved to a folder.".format(path))
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Daniel Nunes
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import Counter
+
+
+class FlagIndex(object):
+    """
+    A live index of the flags in an installer's config.
+
+    Maps each flag label to the nodes that set it (the flag nodes under conditionFlags), the nodes that depend on it
+    (the flagDependency nodes) and the values it's set to. The index only reads the nodes' properties, so a node has
+    to be added again after it's edited and its whole subtree added or removed when it's added to or removed from
+    the config - the nodes do this themselves in append_child, remove_child and the flag nodes' write_attribs, so
+    every change to the config's tree has to go through those.
+
+    labels_revision is bumped whenever a label starts or stops being set, so the label list only has to be copied
+    again when it changes.
+    """
+    def __init__(self):
+        self._entries = {}
+        self._setters = {}
+        self._readers = {}
+        self._values = {}
+        self.labels_revision = 0
+
+    def add(self, node):
+        """
+        Indexes the node, replacing whatever was indexed for it before. Nodes that aren't flags are ignored.
+
+        :param node: The node to index.
+        """
+        if node.tag == "flag":
+            label, value, nodes = node.properties["name"].value, node.properties["<node_text>"].value, self._setters
+        elif node.tag == "flagDependency":
+            label, value, nodes = node.properties["flag"].value, node.properties["value"].value, self._readers
+        else:
+            return
+        value = value or ""
+        if self._entries.get(node) == (label, value):
+            return
+
+        dropped = self._discard(node)
+        added = bool(label) and nodes is self._setters and label not in nodes
+        if label:
+            self._entries[node] = (label, value)
+            nodes.setdefault(label, {})[node] = None
+            if nodes is self._setters:
+                self._values.setdefault(label, Counter())[value] += 1
+        if (dropped is not None or added) and dropped != label:
+            self.labels_revision += 1
+
+    def remove(self, node):
+        """
+        Removes the node from the index, if it's there.
+
+        :param node: The node to remove.
+        """
+        if self._discard(node) is not None:
+            self.labels_revision += 1
+
+    def _discard(self, node):
+        """
+        Removes the node from the index without bumping labels_revision.
+
+        :param node: The node to remove.
+        :return: The node's label if it was setting it and no other node sets it anymore, None otherwise.
+        """
+        try:
+            label, value = self._entries.pop(node)
+        except KeyError:
+            return None
+
+        if node.tag != "flag":
+            del self._readers[label][node]
+            if not self._readers[label]:
+                del self._readers[label]
+            return None
+
+        values = self._values[label]
+        values[value] -= 1
+        if not values[value]:
+            del values[value]
+        del self._setters[label][node]
+        if self._setters[label]:
+            return None
+        del self._setters[label]
+        del self._values[label]
+        return label
+
+    def add_tree(self, node):
+        """
+        Indexes the node and every flag node under it.
+
+        :param node: The root of the subtree to index.
+        """
+        for element in node.iter("flag", "flagDependency"):
+            self.add(element)
+
+    def remove_tree(self, node):
+        """
+        Removes the node and every flag node under it from the index.
+
+        :param node: The root of the subtree to remove.
+        """
+        for element in node.iter("flag", "flagDependency"):
+            self.remove(element)
+
+    def labels(self):
+        """
+        :return: A list with every flag label that is set somewhere, in the order they were first indexed.
+        """
+        return list(self._setters)
+
+    def values(self, label):
+        """
+        :param label: The flag label.
+        :return: A list with every value the flag is set to.
+        """
+        return list(self._values.get(label, ()))
+
+    def usages(self, label):
+        """
+        :param label: The flag label.
+        :return: A tuple with the list of nodes that set the flag and the list of nodes that depend on it.
+        """
+        return list(self._setters.get(label, ())), list(self._readers.get(label, ()))
+
+    def rename(self, old, new):
+        """
+        Renames a flag everywhere it's used - both the nodes that set it and the nodes that depend on it.
+
+        :param old: The flag's current label.
+        :param new: The flag's new label.
+        :return: The list of nodes that were changed.
+        """
+        if not new or new == old:
+            return []
+        setters, readers = self.usages(old)
+        nodes = setters + readers
+        self.relabel(nodes, new)
+        return nodes
+
+    def relabel(self, nodes, label):
+        """
+        Sets the flag label of every node given, writes them and indexes them again.
+
+        :param nodes: The flag nodes to change.
+        :param label: The flag label to set.
+        """
+        for node in nodes:
+            node.properties["name" if node.tag == "flag" else "flag"].set_value(label)
+            node.write_attribs()
+            self.add(node)
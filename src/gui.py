@@ -14,11 +14,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from os import makedirs, listdir
-from os.path import expanduser, normpath, basename, join, relpath, isdir, isfile, abspath
+from os import makedirs
+from os.path import expanduser, normpath, basename, join, relpath, isdir, abspath
 from io import BytesIO
 from threading import Thread
-from queue import Queue
 from webbrowser import open_new_tab
 from datetime import datetime
 from collections import deque
@@ -28,16 +27,21 @@ from lxml.etree import parse, tostring, Comment
 from PyQt5.QtWidgets import (QFileDialog, QColorDialog, QMessageBox, QLabel, QHBoxLayout, QCommandLinkButton, QDialog,
                              QFormLayout, QLineEdit, QSpinBox, QComboBox, QWidget, QPushButton, QSizePolicy, QStatusBar,
                              QCompleter, QApplication, QMainWindow, QUndoCommand, QUndoStack, QMenu, QHeaderView,
-                             QAction, QVBoxLayout, QGroupBox, QCheckBox, QRadioButton)
+                             QAction, QVBoxLayout, QGroupBox, QCheckBox, QRadioButton, QProgressDialog, QInputDialog,
+                             QListWidget)
 from PyQt5.QtGui import QIcon, QPixmap, QColor, QFont, QStandardItemModel, QStandardItem
-from PyQt5.QtCore import Qt, pyqtSignal, QStringListModel, QMimeData, QEvent
+from PyQt5.QtCore import Qt, pyqtSignal, QStringListModel, QMimeData, QEvent, QTimer
 from PyQt5.uic import loadUi
 from requests import get, head, codes, ConnectionError, Timeout
 from validator import validate_tree, check_warnings, ValidatorError, ValidationError, WarningError, MissingFolderError
 from . import cur_folder, __version__
 from .nodes import _NodeElement, NodeComment
-from .io import import_, new, export, node_factory, copy_node
-from .previews import PreviewDispatcherThread
+from .io import new, export, node_factory, copy_node, is_archive
+from .previews import PreviewDispatcherThread, PreviewSnapshot, LatestQueue
+from .code_view import CodeView
+from .items import SORT_ROLE
+from .loader import InstallerLoader
+from .snapshots import SnapshotCache
 from .props import PropertyFile, PropertyColour, PropertyFolder, PropertyCombo, PropertyInt, PropertyText, \
     PropertyFlagLabel, PropertyFlagValue, PropertyHTML
 from .exceptions import DesignerError
@@ -59,7 +63,7 @@ class IntroWindow(QMainWindow, window_intro.Ui_MainWindow):
         self.settings_dict = read_settings()
         paths_to_remove = []
         for path in self.settings_dict["Recent Files"]:
-            if not isdir(path):
+            if not isdir(path) and not is_archive(path):
                 paths_to_remove.append(path)
                 continue
             button = QCommandLinkButton(basename(path), path, self)
@@ -142,7 +146,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
     xml_code_changed = pyqtSignal([object])
 
     #: Signals the code preview is updated.
-    update_code_preview = pyqtSignal([str])
+    update_code_preview = pyqtSignal([object])
 
     #: Signals there is an update available.
     update_check_update_available = pyqtSignal()
@@ -200,6 +204,10 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
             self._original_item = item
 
     class NodeStandardModel(QStandardItemModel):
+        def __init__(self):
+            super().__init__()
+            self.setSortRole(SORT_ROLE)
+
         def mimeData(self, index_list):
             if not index_list:
                 return 0
@@ -226,9 +234,9 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
 
             parent = self.itemFromIndex(parent_index)
             xml_node = mime_data.node()
-            parent.xml_node.remove(mime_data.original_item().xml_node)
-            parent.xml_node.append(mime_data.node())
-            parent.insertRow(row, xml_node.model_item)
+            parent.xml_node.remove_child(mime_data.original_item().xml_node, keep_item=True)
+            parent.xml_node.append_child(xml_node)
+            parent.xml_node.attach_child_item(xml_node, row)
             for row_index in range(0, parent.rowCount()):
                 if parent.child(row_index) == mime_data.original_item():
                     continue
@@ -325,6 +333,30 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
             self.select_node.emit(self.tree_model.indexFromItem(self.item))
             self.current_prop_widgets[self.widget_index].setValue(self.original_int)
 
+    class RenameFlagCommand(QUndoCommand):
+        def __init__(self, flag_index, old_label, new_label, tree_model, item, select_node, node_changed):
+            super().__init__("Flag renamed.")
+            self.flag_index = flag_index
+            self.old_label = old_label
+            self.new_label = new_label
+            self.tree_model = tree_model
+            self.item = item
+            self.select_node = select_node
+            self.node_changed = node_changed
+            self.nodes = []
+
+        def redo(self):
+            self.nodes = self.flag_index.rename(self.old_label, self.new_label)
+            for node in self.nodes:
+                self.node_changed.emit(node)
+            self.select_node.emit(self.tree_model.indexFromItem(self.item))
+
+        def undo(self):
+            self.flag_index.relabel(self.nodes, self.old_label)
+            for node in self.nodes:
+                self.node_changed.emit(node)
+            self.select_node.emit(self.tree_model.indexFromItem(self.item))
+
     class RunWizardCommand(QUndoCommand):
         def __init__(self, parent_node, original_node, modified_node, tree_model, select_node_signal):
             super().__init__("Wizard was run on this node.")
@@ -362,8 +394,8 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
 
         def undo(self):
             self.parent_node.add_child(self.node_to_delete)
+            self.parent_node.model_item.sortChildren(0)
             self.select_node_signal.emit(self.tree_model.indexFromItem(self.node_to_delete.model_item))
-            self.tree_model.sort(0)
 
     class AddChildCommand(QUndoCommand):
         def __init__(self, child_tag, parent_node, tree_model, settings_dict, select_node_signal):
@@ -384,7 +416,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
                         defaults_dict[self.child_tag].value()
                     )
             self.parent_node.add_child(self.new_child_node)
-            self.tree_model.sort(0)
+            self.parent_node.model_item.sortChildren(0)
 
             # select the new item
             self.select_node_signal.emit(self.tree_model.indexFromItem(self.new_child_node.model_item))
@@ -406,8 +438,8 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
 
         def redo(self):
             self.pasted_node = copy_node(QApplication.clipboard().mimeData().node())
-            self.parent_item.xml_node.append(self.pasted_node)
-            self.parent_item.appendRow(self.pasted_node.model_item)
+            self.parent_item.xml_node.append_child(self.pasted_node)
+            self.parent_item.xml_node.attach_child_item(self.pasted_node)
             self.parent_item.sortChildren(0)
 
         def undo(self):
@@ -445,6 +477,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
         self.undo_stack.setUndoLimit(25)
         self.undo_stack.canRedoChanged.connect(self.actionRedo.setEnabled)
         self.undo_stack.canUndoChanged.connect(self.actionUndo.setEnabled)
+        self.undo_stack.indexChanged.connect(lambda _: self.mark_preview_dirty(self.current_node))
         self.actionRedo.triggered.connect(self.undo_stack.redo)
         self.actionUndo.triggered.connect(self.undo_stack.undo)
 
@@ -458,6 +491,9 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
         self.node_tree_model = self.NodeStandardModel()
         self.node_tree_view.setModel(self.node_tree_model)
         self.node_tree_model.itemChanged.connect(lambda item: item.xml_node.save_metadata())
+        self.node_tree_model.itemChanged.connect(lambda item: self.mark_preview_dirty(item.xml_node))
+        self.node_tree_model.rowsInserted.connect(self.mark_rows_dirty)
+        self.node_tree_model.rowsRemoved.connect(self.mark_rows_dirty)
         self.node_tree_model.itemChanged.connect(
             lambda item: self.xml_code_changed.emit(item.xml_node)
             if self.settings_dict["General"]["code_refresh"] >= 3 else None
@@ -498,21 +534,33 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
         self.settings_dict = read_settings()
         self._info_root = None
         self._config_root = None
+        self.loader = None
+        self.snapshot_cache = SnapshotCache(join(expanduser("~"), ".fomod", "snapshots"))
         self._current_prop_list = []
         self.original_prop_value_list = {}
 
         # start the preview threads
-        self.preview_queue = Queue()
+        self.preview_queue = LatestQueue(debounce=0.05, max_delay=0.25)
         self.preview_gui_worker = PreviewMoGui(self.layout_mo)
-        self.update_previews.connect(self.preview_queue.put)
-        self.update_code_preview.connect(self.xml_code_browser.setHtml)
+        self.xml_code_browser = CodeView(self.tabWidgetPage2)
+        self.xml_code_browser.setPlaceholderText("Click a node to see the generated XML code here.")
+        self.verticalLayout.addWidget(self.xml_code_browser)
+        self._preview_element = None
+        self._preview_root = None
+        self._preview_dirty = True
+        self._preview_changed = set()
+        self._preview_snapshot = None
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(0)
+        self.preview_timer.timeout.connect(self.publish_preview)
+        self.update_previews.connect(self.request_preview)
+        self.update_code_preview.connect(self.xml_code_browser.apply_update)
         self.preview_thread = PreviewDispatcherThread(
             self.preview_queue,
             self.update_code_preview,
             **{
                 "package_path": self.package_path,
-                "info_root": self.info_root,
-                "config_root": self.config_root,
                 "gui_worker": self.preview_gui_worker
             }
         )
@@ -530,6 +578,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
         self.flag_value_completer = QCompleter()
         self.flag_value_completer.setCaseSensitivity(Qt.CaseInsensitive)
         self.flag_value_completer.setModel(self.flag_value_model)
+        self._flag_labels_revision = None
 
         # connect node selected signal
         self.current_node = None  # type: _NodeElement
@@ -566,6 +615,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
         )
 
         # manage code changed signal
+        self.xml_code_changed.connect(self.mark_preview_dirty)
         self.xml_code_changed.connect(self.update_previews.emit)
 
         # manage clean/dirty states
@@ -622,6 +672,66 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
     def package_path(self):
         return self._package_path
 
+    def request_preview(self, element):
+        """
+        Schedules the previews to show *element*. The requests made while handling the same event are coalesced
+        and only the newest is published, once control is back in the event loop - bursts spread over several
+        events are debounced by the preview dispatcher instead.
+
+        :param element: The element to preview or None.
+        """
+        self._preview_element = element
+        if not self.preview_timer.isActive():
+            self.preview_timer.start()
+
+    def mark_preview_dirty(self, node=None):
+        """
+        Marks a node as changed, so the next preview writes its subtree again.
+
+        :param node: Optional. The node that changed. If None, the previewed documents are marked as changed and the
+                     next preview writes the whole document again.
+        """
+        if node is None:
+            self._preview_dirty = True
+        else:
+            self._preview_changed.add(node)
+
+    def mark_rows_dirty(self, parent, *_):
+        """
+        Marks the node whose children were inserted or removed as changed.
+
+        :param parent: The QModelIndex of the node's item, invalid for the top level.
+        """
+        self.mark_preview_dirty(self.node_tree_model.itemFromIndex(parent).xml_node if parent.isValid() else None)
+
+    def publish_preview(self):
+        """
+        Hands a snapshot of the requested element to the preview threads.
+
+        If anything changed since the last snapshot, the element and the document's order are brought up to date and
+        the snapshot writes the changed subtrees again - or the whole document, if it's another document or may have
+        changed as a whole. Otherwise the snapshot only has the element's position.
+        """
+        element, self._preview_element = self._preview_element, None
+        changed = ()
+        if element is not None:
+            root = element.getroottree().getroot()
+            if self._preview_dirty or self._preview_changed or root is not self._preview_root:
+                element.write_attribs()
+                element.load_metadata()
+                self._preview_changed.add(element)
+                self._preview_changed.update(root.sort())
+                changed = self._preview_changed
+                if self._preview_dirty or root is not self._preview_root:
+                    changed = None
+                self._preview_root = root
+                self._preview_dirty = False
+        self._preview_snapshot = PreviewSnapshot(
+            element, self._info_root, self._config_root, changed, self._preview_snapshot
+        )
+        self._preview_changed = set()
+        self.preview_queue.put(self._preview_snapshot)
+
     def copy_item_to_clipboard(self):
         item = self.node_tree_model.itemFromIndex(self.node_tree_view.selectedIndexes()[0])
         QApplication.clipboard().setMimeData(self.node_tree_model.mimeData([self.node_tree_model.indexFromItem(item)]))
@@ -642,23 +752,91 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
                 )
             )
 
-    @staticmethod
-    def update_flag_label_completer(label_model, elem_root):
-        label_list = []
-        for elem in elem_root.iter():
-            if elem.tag == "flag":
-                value = elem.properties["name"].value
-                if value not in label_list:
-                    label_list.append(value)
-        label_model.setStringList(label_list)
+    def update_flag_label_completer(self):
+        """
+        Fills the flag label completer with the config's flag labels. The list is only copied again when the labels
+        changed since it was last filled.
+        """
+        flag_index = self._config_root.flag_index
+        if self._flag_labels_revision != (flag_index, flag_index.labels_revision):
+            self.flag_label_model.setStringList(flag_index.labels())
+            self._flag_labels_revision = (flag_index, flag_index.labels_revision)
+
+    def flag_label_menu(self, line_edit, position):
+        """
+        Shows the flag label editor's context menu - the usual line edit actions plus renaming the flag and listing
+        its usages.
+
+        :param line_edit: The flag label's line edit.
+        :param position: The position the menu was requested at, relative to the line edit.
+        """
+        label = line_edit.text()
+        menu = line_edit.createStandardContextMenu()
+        menu.addSeparator()
+        rename_action = menu.addAction("Rename Flag...")
+        usages_action = menu.addAction("Find Usages...")
+        rename_action.setEnabled(bool(label))
+        usages_action.setEnabled(bool(label))
+        rename_action.triggered.connect(lambda: self.rename_flag(label))
+        usages_action.triggered.connect(lambda: self.show_flag_usages(label))
+        menu.exec_(line_edit.mapToGlobal(position))
+
+    def rename_flag(self, label):
+        """
+        Asks for a new label and renames the flag in every node that sets it or depends on it.
+
+        :param label: The flag's current label.
+        """
+        new_label, accepted = QInputDialog.getText(
+            self, "Rename Flag", "Rename \"" + label + "\" everywhere it's used to:", text=label
+        )
+        if not accepted or not new_label or new_label == label:
+            return
+        self.undo_stack.push(
+            self.RenameFlagCommand(
+                self._config_root.flag_index,
+                label,
+                new_label,
+                self.node_tree_model,
+                self.current_node.model_item,
+                self.select_node,
+                self.xml_code_changed
+            )
+        )
+
+    def show_flag_usages(self, label):
+        """
+        Lists the nodes that set or depend on a flag. Activating an entry selects its node.
+
+        :param label: The flag label.
+        """
+        setters, readers = self._config_root.flag_index.usages(label)
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Usages of \"" + label + "\"")
+        layout = QVBoxLayout(dialog)
+        usage_list = QListWidget(dialog)
+        layout.addWidget(usage_list)
+        nodes = setters + readers
+        for index, node in enumerate(nodes):
+            path = " > ".join(ancestor.item_text for ancestor in reversed(list(node.iterancestors())))
+            if index < len(setters):
+                description = "Sets to \"" + (node.properties["<node_text>"].value or "") + "\" in "
+            else:
+                description = "Depends on \"" + (node.properties["value"].value or "") + "\" in "
+            usage_list.addItem(description + path)
+
+        def select_usage(item):
+            index = self.node_tree_model.indexFromItem(nodes[usage_list.row(item)].model_item)
+            if index.isValid():
+                self.select_node.emit(index)
+                dialog.accept()
+
+        usage_list.itemActivated.connect(select_usage)
+        dialog.exec_()
 
     @staticmethod
     def update_flag_value_completer(value_model, elem_root, label):
-        value_list = []
-        for elem in elem_root.iter():
-            if elem.tag == "flag" and elem.text not in value_list and elem.properties["name"].value == label:
-                value_list.append(elem.text)
-        value_model.setStringList(value_list)
+        value_model.setStringList(elem_root.flag_index.values(label))
 
     def check_updates(self):
         """
@@ -719,7 +897,8 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
         Open a new installer if one exists at path (if no path is given a dialog pops up asking the user to choose one)
         or create a new one.
 
-        If enabled in the Settings the installer is also validated and checked for common errors.
+        The installer is loaded in the background with a cancellable progress dialog. If enabled in the Settings the
+        installer is also validated and checked for common errors.
 
         :param path: Optional. The path to open/create an installer at.
         """
@@ -739,54 +918,103 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
                 package_path = path
 
             if package_path:
-                info_root, config_root = import_(normpath(package_path))
-                if info_root is not None and config_root is not None:
-                    if self.settings_dict["Load"]["validate"]:
-                        try:
-                            validate_tree(
-                                parse(BytesIO(tostring(config_root, pretty_print=True)))
-                            )
-                        except ValidationError as p:
-                            generic_errorbox(p.title, str(p), p.detailed).exec_()
-                            if not self.settings_dict["Load"]["validate_ignore"]:
-                                return
-                    if self.settings_dict["Load"]["warnings"]:
-                        try:
-                            check_warnings(
-                                package_path,
-                                config_root,
-                            )
-                        except WarningError as p:
-                            generic_errorbox(p.title, str(p), p.detailed).exec_()
-                            if not self.settings_dict["Save"]["warn_ignore"]:
-                                return
-                else:
-                    info_root, config_root = new()
-
-                self._package_path = package_path
-                self._info_root, self._config_root = info_root, config_root
-
-                self.node_tree_model.clear()
+                self.stop_loader()
+                self.loader = InstallerLoader(
+                    normpath(package_path),
+                    self.settings_dict["Load"]["validate"],
+                    self.settings_dict["Load"]["warnings"],
+                    self.snapshot_cache
+                )
 
-                self.node_tree_model.appendRow(self._info_root.model_item)
-                self.node_tree_model.appendRow(self._config_root.model_item)
+                progress_dialog = QProgressDialog("Opening installer...", "Cancel", 0, 100, self)
+                progress_dialog.setWindowTitle("Opening")
+                progress_dialog.setWindowModality(Qt.WindowModal)
+                progress_dialog.canceled.connect(self.loader.cancel)
+                self.loader.progress.connect(
+                    lambda read, total: progress_dialog.setValue(read * 100 // total) if total else None
+                )
+                self.loader.finished.connect(progress_dialog.reset)
 
-                self.package_name = basename(normpath(self._package_path))
-                self.current_node = None
-                self.xml_code_changed.emit(self.current_node)
-                self.undo_stack.setClean()
-                self.undo_stack.cleanChanged.emit(True)
-                self.undo_stack.clear()
-                QApplication.clipboard().clear()
-                self.actionPaste.setEnabled(False)
-                self.action_Delete.setEnabled(False)
-                self.update_recent_files(self._package_path)
-                self.clear_prop_list()
-                self.button_wizard.setEnabled(False)
+                self.loader.loaded.connect(
+                    lambda info_root, config_root, validation_error, warning_error: self._open_loaded(
+                        package_path, info_root, config_root, validation_error, warning_error
+                    )
+                )
+                self.loader.failed.connect(self._open_failed)
+                self.loader.start()
         except (DesignerError, ValidatorError) as p:
             generic_errorbox(p.title, str(p), p.detailed).exec_()
             return
 
+    def stop_loader(self):
+        """
+        Cancels the installer being loaded, if any, and waits for its thread to stop. Its results are dropped - only
+        its progress dialog is still closed once it's done.
+        """
+        if self.loader is None:
+            return
+        self.loader.progress.disconnect()
+        self.loader.loaded.disconnect()
+        self.loader.failed.disconnect()
+        self.loader.cancel()
+        self.loader.wait()
+        self.loader = None
+
+    def _open_loaded(self, package_path, info_root, config_root, validation_error, warning_error):
+        """
+        Called once the loader is done, shows any validation errors or warnings and then the loaded installer.
+
+        :param package_path: The path the installer was loaded from.
+        :param info_root: The info root or None if any file was missing.
+        :param config_root: The config root or None if any file was missing.
+        :param validation_error: The ValidationError raised while validating or None.
+        :param warning_error: The WarningError raised while checking for common errors or None.
+        """
+        if info_root is not None and config_root is not None:
+            if validation_error is not None:
+                generic_errorbox(validation_error.title, str(validation_error), validation_error.detailed).exec_()
+                if not self.settings_dict["Load"]["validate_ignore"]:
+                    return
+            if warning_error is not None:
+                generic_errorbox(warning_error.title, str(warning_error), warning_error.detailed).exec_()
+                if not self.settings_dict["Save"]["warn_ignore"]:
+                    return
+        else:
+            info_root, config_root = new()
+
+        self._package_path = package_path
+        self._info_root, self._config_root = info_root, config_root
+
+        self.node_tree_model.clear()
+
+        self.node_tree_model.appendRow(self._info_root.model_item)
+        self.node_tree_model.appendRow(self._config_root.model_item)
+
+        self.package_name = basename(normpath(self._package_path))
+        self.current_node = None
+        self.xml_code_changed.emit(self.current_node)
+        self.undo_stack.setClean()
+        self.undo_stack.cleanChanged.emit(True)
+        self.undo_stack.clear()
+        QApplication.clipboard().clear()
+        self.actionPaste.setEnabled(False)
+        self.action_Delete.setEnabled(False)
+        self.update_recent_files(self._package_path)
+        self.clear_prop_list()
+        self.button_wizard.setEnabled(False)
+
+    @staticmethod
+    def _open_failed(error):
+        """
+        Called if the loader failed. Errors other than the designer's and validator's are raised again here.
+
+        :param error: The exception raised by the loader.
+        """
+        if isinstance(error, (DesignerError, ValidatorError)):
+            generic_errorbox(error.title, str(error), error.detailed).exec_()
+        else:
+            raise error
+
     def save(self):
         """
         Saves the current installer at the current path.
@@ -839,6 +1067,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
         Refreshes all the previews if the refresh rate in Settings is high enough.
         """
         if self.settings_dict["General"]["code_refresh"] >= 1:
+            self.mark_preview_dirty()
             self.update_previews.emit(self.current_node)
 
     def delete(self):
@@ -907,7 +1136,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
 
         # check for invalid paths and remove them
         for path in file_list:
-            if not isdir(path):
+            if not isdir(path) and not is_archive(path):
                 file_list.remove(path)
 
         # check if the path is new or if it already exists - delete the last one or reorder respectively
@@ -1026,7 +1255,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
             label.setText(props[key].name)
             self.layout_prop_editor.setWidget(prop_index, QFormLayout.LabelRole, label)
 
-            if type(props[key]) is PropertyText:
+            if type(props[key].prop) is PropertyText:
                 def open_plain_editor(line_edit_, node):
                     dialog_ui = window_plaintexteditor.Ui_Dialog()
                     dialog = QDialog(self)
@@ -1090,7 +1319,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
                     lambda _, line_edit_=text_edit, node=self.current_node: open_plain_editor(line_edit_, node)
                 )
 
-            if type(props[key]) is PropertyHTML:
+            if type(props[key].prop) is PropertyHTML:
                 def open_plain_editor(line_edit_):
                     dialog_ui = window_texteditor.Ui_Dialog()
                     dialog = QDialog(self)
@@ -1191,10 +1420,14 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
                 )
                 text_button.clicked.connect(lambda _, line_edit_=text_edit: open_plain_editor(line_edit_))
 
-            if type(props[key]) is PropertyFlagLabel:
+            if type(props[key].prop) is PropertyFlagLabel:
                 og_values[prop_index] = props[key].value
                 prop_list.append(QLineEdit(self.dockWidgetContents))
-                self.update_flag_label_completer(self.flag_label_model, self._config_root)
+                self.update_flag_label_completer()
+                prop_list[prop_index].setContextMenuPolicy(Qt.CustomContextMenu)
+                prop_list[prop_index].customContextMenuRequested.connect(
+                    lambda position, line_edit_=prop_list[prop_index]: self.flag_label_menu(line_edit_, position)
+                )
                 self.flag_label_completer.activated[str].connect(prop_list[prop_index].setText)
                 prop_list[prop_index].setCompleter(self.flag_label_completer)
                 prop_list[prop_index].textChanged[str].connect(
@@ -1226,7 +1459,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
                     lambda index=prop_index: og_values.update({index: prop_list[index].text()})
                 )
 
-            if type(props[key]) is PropertyFlagValue:
+            if type(props[key].prop) is PropertyFlagValue:
                 og_values[prop_index] = props[key].value
                 prop_list.append(QLineEdit(self.dockWidgetContents))
                 prop_list[prop_index].setCompleter(self.flag_value_completer)
@@ -1257,7 +1490,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
                     lambda index=prop_index: og_values.update({index: prop_list[index].text()})
                 )
 
-            elif type(props[key]) is PropertyInt:
+            elif type(props[key].prop) is PropertyInt:
                 og_values[prop_index] = props[key].value
                 prop_list.append(QSpinBox(self.dockWidgetContents))
                 prop_list[prop_index].setValue(int(props[key].value))
@@ -1287,7 +1520,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
                     lambda new_value, index=prop_index: og_values.update({index: new_value})
                 )
 
-            elif type(props[key]) is PropertyCombo:
+            elif type(props[key].prop) is PropertyCombo:
                 og_values[prop_index] = props[key].value
                 prop_list.append(QComboBox(self.dockWidgetContents))
                 prop_list[prop_index].insertItems(0, props[key].values)
@@ -1316,7 +1549,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
                     lambda new_value, index=prop_index: og_values.update({index: new_value})
                 )
 
-            elif type(props[key]) is PropertyFile:
+            elif type(props[key].prop) is PropertyFile:
                 def button_clicked(line_edit_):
                     open_dialog = QFileDialog()
                     file_path = open_dialog.getOpenFileName(self, "Select File:", self._package_path)
@@ -1361,7 +1594,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
                 )
                 push_button.clicked.connect(lambda _, line_edit_=line_edit: button_clicked(line_edit_))
 
-            elif type(props[key]) is PropertyFolder:
+            elif type(props[key].prop) is PropertyFolder:
                 def button_clicked(line_edit_):
                     open_dialog = QFileDialog()
                     folder_path = open_dialog.getExistingDirectory(self, "Select folder:", self._package_path)
@@ -1406,7 +1639,7 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
                 )
                 push_button.clicked.connect(lambda _, line_edit_=line_edit: button_clicked(line_edit_))
 
-            elif type(props[key]) is PropertyColour:
+            elif type(props[key].prop) is PropertyColour:
                 def button_clicked(line_edit_):
                     init_colour = QColor("#" + props[key].value)
                     colour_dialog = QColorDialog()
@@ -1549,6 +1782,8 @@ class MainFrame(QMainWindow, window_mainframe.Ui_MainWindow):
             pass
         elif answer == QMessageBox.Cancel:
             event.ignore()
+            return
+        self.stop_loader()
 
 
 class SettingsDialog(QDialog, window_settings.Ui_Dialog):
@@ -1799,6 +2034,7 @@ class PreviewMoGui(QWidget, preview_mo.Ui_Form):
         self.button_results_less.clicked.connect(self.widget_results.hide)
         self.button_results_less.clicked.emit()
 
+        self.package = None
         self.model_files = QStandardItemModel()
         self.tree_results.expanded.connect(
             lambda: self.tree_results.header().resizeSections(QHeaderView.Stretch)
@@ -1855,10 +2091,26 @@ class PreviewMoGui(QWidget, preview_mo.Ui_Form):
     def eventFilter(self, object_, event):
         if event.type() == QEvent.HoverEnter:
             self.label_description.setText(object_.property("description"))
-            self.label_image.set_scalable_pixmap(QPixmap(object_.property("image_path")))
+            self.label_image.set_scalable_pixmap(self.load_image(object_.property("image_path")))
 
         return QWidget().eventFilter(object_, event)
 
+    def load_image(self, path):
+        """
+        Reads an image through the previewed package, which may be a zip archive.
+
+        :param path: The image's real path, relative to the package.
+        :return: The image's QPixmap, a null one if it can't be read.
+        """
+        pixmap = QPixmap()
+        if path and self.package is not None:
+            try:
+                with self.package.open(path) as file_:
+                    pixmap.loadFromData(file_.read())
+            except (OSError, KeyError):
+                pass
+        return pixmap
+
     def clear_ui(self):
         self.label_name.clear()
         self.label_author.clear()
@@ -1904,6 +2156,7 @@ class PreviewMoGui(QWidget, preview_mo.Ui_Form):
 
     # this is pretty horrendous, need to come up with a better way of doing this.
     def create_page(self, page_data):
+        self.package = page_data.package
         group_step = QGroupBox(page_data.name)
         layout_step = QVBoxLayout()
         group_step.setLayout(layout_step)
@@ -1977,8 +2230,8 @@ class PreviewMoGui(QWidget, preview_mo.Ui_Form):
 
     def update_installed_files(self):
         def recurse_add_items(folder, parent):
-            for boop in listdir(folder):  # I was very tired
-                if isdir(join(folder, boop)):
+            for boop, boop_path, boop_is_folder in self.package.list_folder(folder):  # I was very tired
+                if boop_is_folder:
                     folder_item = None
                     existing_folder_ = self.model_files.findItems(boop, Qt.MatchRecursive)
                     if existing_folder_:
@@ -1993,9 +2246,9 @@ class PreviewMoGui(QWidget, preview_mo.Ui_Form):
                         )
                         folder_item.set_priority(folder_.priority)
                         parent.appendRow([folder_item, QStandardItem(rel_source), QStandardItem(button.text())])
-                    recurse_add_items(join(folder, boop), folder_item)
+                    recurse_add_items(boop_path, folder_item)
 
-                elif isfile(join(folder, boop)):
+                else:
                     file_item_ = None
                     existing_file_ = self.model_files.findItems(boop, Qt.MatchRecursive)
                     if existing_file_:
@@ -2022,7 +2275,7 @@ class PreviewMoGui(QWidget, preview_mo.Ui_Form):
                         folder_.install_usable and button.property("type") != "NotUsable" or
                         button.property("type") == "Required"):
                     destination = folder_.destination
-                    abs_source = folder_.abs_source
+                    source = folder_.source
                     rel_source = folder_.rel_source
                     parent_item = self.model_files_root
 
@@ -2045,8 +2298,8 @@ class PreviewMoGui(QWidget, preview_mo.Ui_Form):
                         parent_item.appendRow([item_, QStandardItem(), QStandardItem(button.text())])
                         parent_item = item_
 
-                    if isdir(abs_source):
-                        recurse_add_items(abs_source, parent_item)
+                    if self.package.is_folder(source):
+                        recurse_add_items(source, parent_item)
 
             for file_ in button.property("file_list"):
                 if (button.isChecked() and button.property("type") != "NotUsable" or
@@ -2054,7 +2307,7 @@ class PreviewMoGui(QWidget, preview_mo.Ui_Form):
                         file_.install_usable and button.property("type") != "NotUsable" or
                         button.property("type") == "Required"):
                     destination = file_.destination
-                    abs_source = file_.abs_source
+                    source = file_.source
                     rel_source = file_.rel_source
                     parent_item = self.model_files_root
 
@@ -2077,7 +2330,7 @@ class PreviewMoGui(QWidget, preview_mo.Ui_Form):
                         parent_item.appendRow([item_, QStandardItem(), QStandardItem(button.text())])
                         parent_item = item_
 
-                    source_file = abs_source.split("/")[len(abs_source.split("/")) - 1]
+                    source_file = basename(source.replace("\\", "/"))
                     file_item = None
                     existing_file_list = self.model_files.findItems(source_file, Qt.MatchRecursive)
                     if existing_file_list:
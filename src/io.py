@@ -14,13 +14,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from os import listdir, makedirs, rename
-from os.path import join
-from lxml.etree import (PythonElementClassLookup, XMLParser, tostring, fromstring, CommentBase, Comment,
-                        Element, SubElement, parse, ParseError, ElementTree, CustomElementClassLookup)
-from .exceptions import MissingFileError, ParserError
+from os import listdir, makedirs, rename, replace, remove, stat, sep, chmod, umask
+from os.path import join, normpath, getsize, split, isfile, isdir
+from hashlib import sha1
+from shutil import copymode
+from tempfile import mkstemp
+from zipfile import ZipFile, BadZipFile, is_zipfile
+from itertools import islice
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from lxml.etree import (PythonElementClassLookup, XMLParser, Comment, SubElement, iterparse, ParseError,
+                        CustomElementClassLookup, fromstring, tostring)
+from lxml.objectify import deannotate
+from .exceptions import MissingFileError, ParserError, CancelledImportError, ReadOnlyArchiveError
 
 module_parser = XMLParser(remove_pis=True, remove_blank_text=True)
+_plain_parser = XMLParser(remove_pis=True)
+
+#: The hash, modification time and size of the last contents saved at each exported path.
+_saved_files = {}
 
 
 class _CommentLookup(CustomElementClassLookup):
@@ -33,109 +45,358 @@ class _CommentLookup(CustomElementClassLookup):
             return None
 
 
+class _NodeClassContext(object):
+    """
+    Resolves the node class for a tag that is shared by several node classes.
+
+    :param default: The class used when the element's context doesn't match any known parent.
+    :param by_parent: Maps the parent tag to either a node class or a dict of grandparent tags to node classes.
+    """
+    def __init__(self, default, by_parent):
+        self.default = default
+        self.by_parent = by_parent
+
+    def resolve(self, element):
+        parent = element.getparent()
+        if parent is None:
+            return self.default
+        result = self.by_parent.get(parent.tag, self.default)
+        if isinstance(result, dict):
+            grandparent = parent.getparent()
+            if grandparent is None:
+                return self.default
+            return result.get(grandparent.tag, self.default)
+        return result
+
+
+def _build_node_class_table():
+    """
+    Builds the table used by _NodeClassLookup from the node classes in the nodes module.
+
+    Unique tags map straight to their class. Tags shared by several classes map to a _NodeClassContext that
+    picks the class from the parent tag and, when that is still ambiguous, the grandparent tag. The contexts
+    are derived from each class' allowed children.
+
+    :return: A dict mapping each tag to a node class or a _NodeClassContext.
+    """
+    from . import nodes
+
+    node_classes = [value for value in vars(nodes).values()
+                    if isinstance(value, type) and
+                    issubclass(value, nodes._NodeElement) and
+                    value is not nodes._NodeElement]
+
+    parents = {}
+    for parent_class in node_classes:
+        for child_class in parent_class.schema().allowed_children:
+            parents.setdefault(child_class, []).append(parent_class)
+
+    classes_by_tag = {}
+    for node_class in node_classes:
+        classes_by_tag.setdefault(node_class.tag, []).append(node_class)
+
+    table = {}
+    for tag, candidates in classes_by_tag.items():
+        if len(candidates) == 1:
+            table[tag] = candidates[0]
+            continue
+
+        by_parent_tag = {}
+        for candidate in candidates:
+            for parent_class in parents.get(candidate, []):
+                by_parent_tag.setdefault(parent_class.tag, {}).setdefault(candidate, []).append(parent_class)
+
+        by_parent = {}
+        for parent_tag, matches in by_parent_tag.items():
+            if len(matches) == 1:
+                by_parent[parent_tag] = next(iter(matches))
+                continue
+            by_grandparent = {}
+            for candidate, parent_classes in matches.items():
+                for parent_class in parent_classes:
+                    for grandparent_class in parents.get(parent_class, []):
+                        if by_grandparent.get(grandparent_class.tag, candidate) is not candidate:
+                            raise AssertionError("Tag {} can't be resolved from its context.".format(tag))
+                        by_grandparent[grandparent_class.tag] = candidate
+            by_parent[parent_tag] = by_grandparent
+
+        table[tag] = _NodeClassContext(candidates[0], by_parent)
+    return table
+
+
 class _NodeClassLookup(PythonElementClassLookup):
     """
     Class that handles the custom lookup for the element factories.
+
+    The node class is found in a table that is built once (on first use) from the node classes themselves,
+    only the few tags shared between node classes need to look at the element's ancestors.
     """
+    def __init__(self):
+        super().__init__()
+        self.table = None
+
     def lookup(self, doc, element):
-        from . import nodes
-
-        if element.tag == "fomod":
-            return nodes.NodeInfoRoot
-        elif element.tag == "Name":
-            return nodes.NodeInfoName
-        elif element.tag == "Author":
-            return nodes.NodeInfoAuthor
-        elif element.tag == "Version":
-            return nodes.NodeInfoVersion
-        elif element.tag == "Id":
-            return nodes.NodeInfoID
-        elif element.tag == "Website":
-            return nodes.NodeInfoWebsite
-        elif element.tag == "Description":
-            return nodes.NodeInfoDescription
-        elif element.tag == "Groups":
-            return nodes.NodeInfoGroup
-        elif element.tag == "element":
-            return nodes.NodeInfoElement
-
-        elif element.tag == "config":
-            return nodes.NodeConfigRoot
-        elif element.tag == "moduleName":
-            return nodes.NodeConfigModName
-        elif element.tag == "moduleImage":
-            return nodes.NodeConfigModImage
-        elif element.tag == "moduleDependencies":
-            return nodes.NodeConfigModDepend
-        elif element.tag == "requiredInstallFiles":
-            return nodes.NodeConfigReqFiles
-        elif element.tag == "installSteps":
-            return nodes.NodeConfigInstallSteps
-        elif element.tag == "conditionalFileInstalls":
-            return nodes.NodeConfigCondInstall
-        elif element.tag == "fileDependency":
-            return nodes.NodeConfigDependFile
-        elif element.tag == "flagDependency":
-            return nodes.NodeConfigDependFlag
-        elif element.tag == "gameDependency":
-            return nodes.NodeConfigDependGame
-        elif element.tag == "file":
-            return nodes.NodeConfigFile
-        elif element.tag == "folder":
-            return nodes.NodeConfigFolder
-        elif element.tag == "patterns":
-            if element.getparent().tag == "dependencyType":
-                return nodes.NodeConfigInstallPatterns
-            elif element.getparent().tag == "conditionalFileInstalls":
-                return nodes.NodeConfigPatterns
-        elif element.tag == "pattern":
-            if element.getparent().getparent().tag == "conditionalFileInstalls":
-                return nodes.NodeConfigPattern
-            elif element.getparent().getparent().tag == "dependencyType":
-                return nodes.NodeConfigInstallPattern
-        elif element.tag == "files":
-            return nodes.NodeConfigFiles
-        elif element.tag == "dependencies":
-            if element.getparent().tag == "dependencies" or \
-                    element.getparent().tag == "moduleDependencies" or \
-                    element.getparent().tag == "visible":
-                return nodes.NodeConfigNestedDependencies
-            else:
-                return nodes.NodeConfigDependencies
-        elif element.tag == "installStep":
-            return nodes.NodeConfigInstallStep
-        elif element.tag == "visible":
-            return nodes.NodeConfigVisible
-        elif element.tag == "optionalFileGroups":
-            return nodes.NodeConfigOptGroups
-        elif element.tag == "group":
-            return nodes.NodeConfigGroup
-        elif element.tag == "plugins":
-            return nodes.NodeConfigPlugins
-        elif element.tag == "plugin":
-            return nodes.NodeConfigPlugin
-        elif element.tag == "description":
-            return nodes.NodeConfigPluginDescription
-        elif element.tag == "image":
-            return nodes.NodeConfigImage
-        elif element.tag == "conditionFlags":
-            return nodes.NodeConfigConditionFlags
-        elif element.tag == "typeDescriptor":
-            return nodes.NodeConfigTypeDesc
-        elif element.tag == "flag":
-            return nodes.NodeConfigFlag
-        elif element.tag == "dependencyType":
-            return nodes.NodeConfigDependencyType
-        elif element.tag == "defaultType":
-            return nodes.NodeConfigDefaultType
-        elif element.tag == "type":
-            return nodes.NodeConfigType
+        if self.table is None:
+            self.table = _build_node_class_table()
 
-        else:
+        try:
+            result = self.table[element.tag]
+        except KeyError:
             raise AssertionError("Tag {} at line {} could not be matched.".format(element.tag, element.sourceline))
 
+        if isinstance(result, _NodeClassContext):
+            return result.resolve(element)
+        return result
+
+
+_module_lookup = _CommentLookup(_NodeClassLookup())
+module_parser.set_element_class_lookup(_module_lookup)
+
+
+class PackageIndex(object):
+    """
+    A case-insensitive index of the files and folders inside a package.
+
+    Each folder is listed the first time something inside it is looked up and is only listed again once its
+    modification time changes, so the index follows files being added, removed or renamed while resolving a
+    path costs a single stat and dictionary lookup per path component. Since a modification time may not change
+    for entries added right after a listing (on filesystems with coarse timestamps), a folder is also listed again
+    once before a name is reported missing from it.
+
+    :param root: The package root.
+    """
+    def __init__(self, root):
+        self.root = root
+        self._folders = {}
+
+    def _entries(self, folder, refresh=False):
+        """
+        :param folder: The real path of a folder, relative to the root.
+        :param refresh: Optional. If the folder should be listed again even if its modification time is the same.
+        :return: A dictionary mapping the casefolded name of each entry in *folder* to its real name.
+        """
+        path = join(self.root, folder)
+        try:
+            mtime = stat(path).st_mtime_ns
+        except OSError:
+            self._folders.pop(folder, None)
+            return {}
+
+        listing = self._folders.get(folder)
+        if refresh or listing is None or listing[0] != mtime:
+            entries = {}
+            try:
+                for name in listdir(path):
+                    entries.setdefault(name.casefold(), name)
+            except OSError:
+                return {}
+            listing = (mtime, entries)
+            self._folders[folder] = listing
+        return listing[1]
+
+    def resolve(self, path):
+        """
+        Resolves a path relative to the root case-insensitively. Both "/" and "\\" are accepted as separators.
+
+        Raises ``MissingFileError`` if any component of the path could not be found.
+
+        :param path: The path to resolve.
+        :return: The real path, relative to the root.
+        """
+        real_path = ""
+        for part in normpath(path.replace("\\", "/")).split(sep):
+            if part == ".":
+                continue
+            if part == "..":
+                raise MissingFileError(part)
+            real_part = self._entries(real_path).get(part.casefold())
+            if real_part is None:
+                real_part = self._entries(real_path, refresh=True).get(part.casefold())
+            if real_part is None:
+                raise MissingFileError(part)
+            real_path = join(real_path, real_part)
+        return real_path
+
+    def open(self, path):
+        """
+        :param path: A real path, relative to the root.
+        :return: The file at *path* opened for reading in binary mode.
+        """
+        return open(join(self.root, path), "rb")
+
+    def size(self, path):
+        """
+        :param path: A real path, relative to the root.
+        :return: The size of the file at *path*, in bytes.
+        """
+        return getsize(join(self.root, path))
+
+    def is_folder(self, path):
+        """
+        :param path: A real path, relative to the root. "" for the root itself.
+        :return: True if *path* is a folder, False otherwise.
+        """
+        return isdir(join(self.root, path))
+
+    def list_folder(self, path):
+        """
+        :param path: A real path to a folder, relative to the root. "" for the root itself.
+        :return: A list with a (name, real path, is folder) tuple for each entry in the folder.
+        """
+        try:
+            return [(name, join(path, name), self.is_folder(join(path, name)))
+                    for name in listdir(join(self.root, path))]
+        except OSError:
+            return []
+
+
+class _ArchiveMember(object):
+    """
+    Wraps an open archive member to keep track of the read position, which not every zip member file provides.
+
+    :param file_: The open archive member.
+    """
+    def __init__(self, file_):
+        self.file_ = file_
+        self.position = 0
+
+    def read(self, size=-1):
+        data = self.file_.read(size)
+        self.position += len(data)
+        return data
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        self.file_.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ArchiveIndex(object):
+    """
+    A case-insensitive index of the files and folders inside a zip archive, used as a package without extracting it.
 
-module_parser.set_element_class_lookup(_CommentLookup(_NodeClassLookup()))
+    The index is built from the archive's central directory alone and is only rebuilt once the archive's modification
+    time changes. Folders that only exist as part of their members' paths are indexed as well. The real paths use "/"
+    as separator, as the archive members do.
+
+    :param root: The path to the archive.
+    """
+    def __init__(self, root):
+        self.root = root
+        self._listing = None
+
+    def _entries(self):
+        """
+        :return: A dictionary mapping the casefolded path of each file and folder in the archive to its real path.
+        """
+        return self._index()[0]
+
+    def _index(self):
+        """
+        :return: The dictionary returned by _entries and a dictionary mapping the casefolded path of each folder
+            (including the archive's root, "") to a dictionary of its entries' casefolded paths to their real paths.
+        """
+        try:
+            mtime = stat(self.root).st_mtime_ns
+            if self._listing is None or self._listing[0] != mtime:
+                entries = {}
+                folders = {"": {}}
+                with ZipFile(self.root) as archive:
+                    for name in archive.namelist():
+                        parts = [part for part in name.replace("\\", "/").split("/") if part]
+                        parent = ""
+                        for end in range(1, len(parts) + 1):
+                            real_path = "/".join(parts[:end])
+                            key = real_path.casefold()
+                            entries.setdefault(key, real_path)
+                            folders[parent].setdefault(key, real_path)
+                            if end < len(parts) or name.endswith("/"):
+                                folders.setdefault(key, {})
+                            parent = key
+                self._listing = (mtime, entries, folders)
+        except (OSError, BadZipFile):
+            self._listing = None
+            return {}, {"": {}}
+        return self._listing[1:]
+
+    def resolve(self, path):
+        """
+        Resolves a path inside the archive case-insensitively. Both "/" and "\\" are accepted as separators.
+
+        Raises ``MissingFileError`` if any component of the path could not be found.
+
+        :param path: The path to resolve.
+        :return: The real path of the archive member.
+        """
+        entries = self._entries()
+        parts = [part for part in path.replace("\\", "/").split("/") if part and part != "."]
+        real_path = ""
+        for end in range(1, len(parts) + 1):
+            real_path = entries.get("/".join(parts[:end]).casefold()) if parts[end - 1] != ".." else None
+            if real_path is None:
+                raise MissingFileError(parts[end - 1])
+        return real_path
+
+    def open(self, path):
+        """
+        :param path: The real path of an archive member.
+        :return: The member opened for reading, it's decompressed as it's read.
+        """
+        archive = ZipFile(self.root)
+        try:
+            return _ArchiveMember(archive.open(path))
+        finally:
+            archive.close()  # the member keeps the archive file open until it's closed itself
+
+    def size(self, path):
+        """
+        :param path: The real path of an archive member.
+        :return: The uncompressed size of the member, in bytes.
+        """
+        with ZipFile(self.root) as archive:
+            return archive.getinfo(path).file_size
+
+    def is_folder(self, path):
+        """
+        :param path: The real path of an archive member, "" for the archive's root.
+        :return: True if *path* is a folder in the archive, False otherwise.
+        """
+        return path.casefold() in self._index()[1]
+
+    def list_folder(self, path):
+        """
+        :param path: The real path of a folder in the archive, "" for the archive's root.
+        :return: A list with a (name, real path, is folder) tuple for each entry in the folder.
+        """
+        folders = self._index()[1]
+        return [(real_path.rsplit("/", 1)[-1], real_path, key in folders)
+                for key, real_path in folders.get(path.casefold(), {}).items()]
+
+
+def is_archive(path):
+    """
+    :param path: The path to check.
+    :return: True if *path* is a zip archive (and not a package folder), False otherwise.
+    """
+    return isfile(path) and is_zipfile(path)
+
+
+@lru_cache(maxsize=8)
+def package_index(root):
+    """
+    :param root: The package root, either a folder or a zip archive.
+    :return: The shared PackageIndex or ArchiveIndex for *root*.
+    """
+    if is_archive(root):
+        return ArchiveIndex(root)
+    return PackageIndex(root)
 
 
 def _check_file(base_path, file_):
@@ -143,17 +404,10 @@ def _check_file(base_path, file_):
     Function used to search case-insensitively for a file/folder is a given path.
 
     :param base_path: The path to search for the file/folder in.
-    :param file_: The file/folder to search for.
-    :return: The file if found, raises an exception if not.
+    :param file_: The file/folder to search for, may be a relative path.
+    :return: The file's real path relative to *base_path* if found, raises an exception if not.
     """
-    base_file = file_
-    try:
-        for item in listdir(base_path):
-            if item.casefold() == base_file.casefold():
-                return item
-        raise MissingFileError(base_file)
-    except FileNotFoundError:
-        raise MissingFileError(base_file)
+    return package_index(base_path).resolve(file_)
 
 
 def _validate_child(child):
@@ -163,16 +417,11 @@ def _validate_child(child):
     :param child: The child to check.
     :return: True if valid, False if not.
     """
-    if type(child) in child.getparent().allowed_children or child.tag is Comment:
+    parent = child.getparent()
+    if type(child) in parent.allowed_children or child.tag is Comment:
         if child.allowed_instances:
-            instances = 0
-            for item in child.getparent():
-                if type(item) == type(child):
-                    instances += 1
-            if instances <= child.allowed_instances:
-                return True
-        else:
-            return True
+            return parent.child_count(type(child)) <= child.allowed_instances
+        return True
     return False
 
 
@@ -180,9 +429,10 @@ def node_factory(tag, parent=None):
     """
     Function meant as a replacement for the default element factory.
 
-    Creates a tree up to the root, re-parses that tree and returns an element corresponding to the tag given.
-    This is necessary due to the way the _NodeLookup class works when checking for tags
-    (it requires parents and grandparents).
+    The _NodeClassLookup needs the parent and grandparent tags to pick the class for some tags, so when a parent
+    is given the element is created under bare copies of its closest ancestors only (never the whole ancestor
+    chain) - three of them, so that the parent itself also resolves to the right class.
+    The element stays under that context until it's added to its actual parent.
 
     :param tag: The tag to create an element from.
     :param parent: The parent of the future element.
@@ -192,80 +442,163 @@ def node_factory(tag, parent=None):
         from .nodes import NodeComment
         return NodeComment()
     elif parent is not None:
-        list_ = [parent]
-        for elem in parent.iterancestors():
-            list_.append(elem)
-
-        list_ = list_[::-1]
-        list_[0] = Element(list_[0].tag)
-        for elem in list_[1:]:
-            list_[list_.index(elem)] = SubElement(list_[list_.index(elem) - 1], elem.tag)
-        SubElement(list_[len(list_) - 1], tag)
-
-        root = fromstring(tostring(list_[0]), module_parser)
-        parsed_list = []
-        for elem in root.iterdescendants():
-            parsed_list.append(elem)
-        return parsed_list[len(parsed_list) - 1]
+        ancestors = [parent] + list(islice(parent.iterancestors(), 2))
+        context = module_parser.makeelement(ancestors[-1].tag)
+        for ancestor in reversed(ancestors[:-1]):
+            context = SubElement(context, ancestor.tag)
+        return SubElement(context, tag)
     else:
         return module_parser.makeelement(tag)
 
 
 def copy_node(node, parent=None):
+    """
+    Copies *node* and its whole subtree in a single, non-recursive pass.
+
+    The copies are created in place so the node classes resolve from their context, then the properties and
+    metadata are loaded. The model items of the copies are only built when first requested, all at once.
+    Hidden children are copied as well and stay hidden.
+
+    :param node: The node to copy. Plain lxml elements are accepted as well.
+    :param parent: The parent of the future copy. Defaults to *node*'s parent.
+    :return: The copy of *node*.
+    """
+    from .nodes import NodeComment
+
     if parent is None:
         parent = node.getparent()
     result = node_factory(node.tag, parent)
-    result.text = node.text
-    for key in node.keys():
-        result.set(key, node.get(key))
-    result.parse_attribs()
-    for child in node:
-        if child.tag is Comment:
-            result.append(CommentBase(child.text))
-        else:
-            new_child = copy_node(child)
-            result.add_child(new_child)
-    result.load_metadata()
+    copies = []
+    stack = [(node, result)]
+    while stack:
+        source, copy = stack.pop()
+        copy.text = source.text
+        for key, value in source.items():
+            copy.set(key, value)
+        copies.append(copy)
+
+        hidden_children = getattr(source, "hidden_children", ())
+        for child in source:
+            if child.tag is Comment:
+                new_child = NodeComment(child.text)
+                copy.append_child(new_child)
+                if not new_child.text.startswith("<designer.metadata.do.not.edit>"):
+                    copies.append(new_child)
+                    copy.attach_child_item(new_child)
+            else:
+                new_child = SubElement(copy, child.tag)
+                copy.remove(new_child)
+                if copy.can_add_child(new_child):
+                    copy.append_child(new_child)
+                    copy.attach_child_item(new_child)
+                    stack.append((child, new_child))
+                    if child in hidden_children:
+                        new_child.set_hidden(True)
+
+    for copy in copies:
+        copy.parse_attribs()
+        if copy is not result:
+            copy.write_attribs()
+    for copy in reversed(copies):
+        copy.load_metadata()
     return result
 
 
-def import_(package_path):
+def _finish_element(element):
     """
-    Function used to import an existing installer from *package_path*.
+    Finishes an element during import, once all of its children have been read.
 
-    Raises ``ParserError`` if the lxml parser could not read a file.
+    Its children are sorted, validated and attached to its node tree entry, then its own properties and metadata are
+    loaded.
 
-    :param package_path: The package where the installer is.
-    :return: The root elements of each installer file. A tuple of None, None if any file is missing.
+    :param element: The element to finish.
     """
-    try:
-        fomod_folder = _check_file(package_path, "fomod")
-        fomod_folder_path = join(package_path, fomod_folder)
+    element.parse_attribs()
+    element.sort_children()
+
+    for child in [child for child in element if not _validate_child(child)]:
+        element.remove_child(child)
+
+    for child in element:
+        if child.tag is Comment:
+            child.parse_attribs()
+            if child.text.startswith("<designer.metadata.do.not.edit>"):
+                element.pin_child(child)
+                continue
+            child.write_attribs()
+        element.attach_child_item(child)
+
+    element.write_attribs()
+    element.load_metadata()
 
-        info_file = _check_file(fomod_folder_path, "Info.xml")
-        config_file = _check_file(fomod_folder_path, "ModuleConfig.xml")
 
-        info_path = join(fomod_folder_path, info_file)
-        config_path = join(fomod_folder_path, config_file)
-        rename(info_path, info_path)
-        rename(config_path, config_path)  # check if another app is using these files
+def _stream_parse(file_, progress=None, cancelled=None):
+    """
+    Parses an installer file in a single streaming pass, each element is finished as soon as its end tag is read.
 
-        info_root = parse(info_path, parser=module_parser).getroot()
-        config_root = parse(config_path, parser=module_parser).getroot()
+    :param file_: The file to parse, opened for reading in binary mode.
+    :param progress: Optional. Called with the number of bytes read so far whenever more of the file is read.
+    :param cancelled: Optional. Checked whenever more of the file is read, the parsing stops if it returns True.
+    :return: The root element.
+    """
+    finished = []  # keeps the finished elements alive until their parents attach them
+    position = 0
+    context = iterparse(file_, events=("end",), remove_pis=True, remove_blank_text=True)
+    context.set_element_class_lookup(_module_lookup)
+    for _, element in context:
+        _finish_element(element)
+        finished.append(element)
+        if file_.tell() != position:
+            position = file_.tell()
+            if cancelled is not None and cancelled():
+                raise CancelledImportError()
+            if progress is not None:
+                progress(position)
+    return context.root
+
+
+def import_(package_path, progress=None, cancelled=None):
+    """
+    Function used to import an existing installer from *package_path*.
 
-        for root in (info_root, config_root):
-            root.sort()
-            root.model_item.sortChildren(0)
-            for element in root.iter():
-                element.parse_attribs()
+    Both files are read at the same time (Info.xml in a worker thread) with a streaming parser - classification,
+    attribute parsing, child validation and metadata loading are all done in the same pass.
+    The package may also be a zip archive, in which case both files are read straight from it.
 
-                for elem in element:
-                    element.model_item.appendRow(elem.model_item)
-                    if not _validate_child(elem):
-                        element.remove_child(elem)
+    Raises ``ParserError`` if the lxml parser could not read a file and ``CancelledImportError`` if the import was
+    cancelled.
 
-                element.write_attribs()
-                element.load_metadata()
+    :param package_path: The package where the installer is, a folder or a zip archive.
+    :param progress: Optional. Called with the number of bytes read and the total number of bytes to read.
+                     May be called from the worker thread.
+    :param cancelled: Optional. Called periodically from both threads, the import is cancelled if it returns True.
+    :return: The root elements of each installer file. A tuple of None, None if any file is missing.
+    """
+    try:
+        index = package_index(package_path)
+        info_file = index.resolve(join("fomod", "Info.xml"))
+        config_file = index.resolve(join("fomod", "ModuleConfig.xml"))
+        if not isinstance(index, ArchiveIndex):
+            for file_ in (info_file, config_file):
+                rename(join(package_path, file_), join(package_path, file_))  # check if another app is using it
+
+        total = index.size(info_file) + index.size(config_file)
+        positions = [0, 0]
+
+        def file_progress(index):
+            if progress is None:
+                return None
+
+            def report(position):
+                positions[index] = position
+                progress(sum(positions), total)
+            return report
+
+        with index.open(info_file) as info, index.open(config_file) as config, \
+                ThreadPoolExecutor(max_workers=1) as executor:
+            info_future = executor.submit(_stream_parse, info, file_progress(0), cancelled)
+            config_root = _stream_parse(config, file_progress(1), cancelled)
+            info_root = info_future.result()
 
     except ParseError as e:
         raise ParserError(str(e))
@@ -289,50 +622,176 @@ def new():
     return info_root, config_root
 
 
+def _index_path(node, root):
+    """
+    :param node: A node in *root*'s subtree.
+    :param root: The root of the subtree.
+    :return: The child indexes that lead from *root* to *node*.
+    """
+    path = []
+    while node is not root:
+        parent = node.getparent()
+        path.append(parent.index(node))
+        node = parent
+    return path[::-1]
+
+
+def _export_copy(root):
+    """
+    Builds a plain (node-less) copy of *root* as it's exported.
+
+    The hidden nodes are taken out of the copy and serialized into their parent's metadata comment instead - in memory
+    they're kept as regular nodes, this is the only time they're serialized. The live tree is never touched.
+
+    :param root: The root element to copy.
+    :return: The exported copy.
+    """
+    from .nodes import _encode_metadata
+
+    copy = fromstring(tostring(root, with_tail=False), _plain_parser)
+    hidden_parents = []
+    for element in root.iter():
+        if not getattr(element, "hidden_children", None):
+            continue
+        ancestor = element
+        while ancestor is not root and not ancestor.is_hidden:
+            ancestor = ancestor.getparent()
+        if ancestor is not root:
+            continue  # it's exported along with its hidden ancestor
+
+        copy_parent = copy
+        for index in _index_path(element, root):
+            copy_parent = copy_parent[index]
+        comment = element._find_metadata_comment()
+        copy_comment = copy_parent[element.index(comment)] if comment is not None else None
+        copy_hidden = [copy_parent[element.index(node)] for node in element.hidden_children]
+        hidden_parents.append((element, copy_parent, copy_comment, copy_hidden))
+
+    for element, copy_parent, copy_comment, copy_hidden in hidden_parents:
+        metadata = dict(element.metadata)
+        metadata["hidden_nodes"] = [_hidden_string(node) for node in element.hidden_children]
+        if copy_comment is not None:
+            copy_comment.text = _encode_metadata(metadata)
+        else:
+            copy_parent.insert(0, Comment(_encode_metadata(metadata)))
+        for copy_node_ in copy_hidden:
+            copy_parent.remove(copy_node_)
+    return copy
+
+
+def _hidden_string(node):
+    """
+    :param node: A hidden node.
+    :return: *node* serialized as it's stored in its parent's metadata.
+    """
+    copy = _export_copy(node)
+    deannotate(copy, cleanup_namespaces=True)
+    return tostring(copy, encoding="unicode").replace("<!--", "<!- -").replace("-->", "- ->")
+
+
+def _serialize(root):
+    """
+    Serializes *root* as an installer file, with its hidden nodes stored in their parents' metadata.
+
+    The live tree is serialized as it is unless it has hidden nodes, only then an export copy is built.
+
+    :param root: The root element to serialize.
+    :return: The file's contents as bytes.
+    """
+    from .nodes import _hidden_parents
+
+    if any(parent is root or root in parent.iterancestors() for parent in list(_hidden_parents)):
+        root = _export_copy(root)
+    return tostring(root, pretty_print=True, with_tail=False)
+
+
+def _write_if_changed(path, data):
+    """
+    Writes *data* to *path* unless the file already holds exactly those bytes.
+
+    The hash of the last bytes written (or found) at each path is kept along with the file's size and modification
+    time, the file is only read again if those changed. Files are written to a temporary file in the same folder
+    which then replaces the original, so a crash never leaves a half-written file behind. The temporary file is
+    given the original's permissions, or the default ones for a new file.
+
+    :param path: The file to write.
+    :param data: The file's new contents.
+    :return: True if the file was written, False if it was left untouched.
+    """
+    digest = sha1(data).digest()
+    try:
+        file_stat = stat(path)
+    except OSError:
+        file_stat = None
+
+    if file_stat is not None:
+        saved = _saved_files.get(path)
+        if saved is None or saved[1:] != (file_stat.st_mtime_ns, file_stat.st_size):
+            with open(path, "rb") as file_:
+                saved = (sha1(file_.read()).digest(), file_stat.st_mtime_ns, file_stat.st_size)
+            _saved_files[path] = saved
+        if saved[0] == digest:
+            return False
+
+    folder, name = split(path)
+    temp_fd, temp_path = mkstemp(prefix="." + name + ".", suffix=".tmp", dir=folder)
+    try:
+        with open(temp_fd, "wb") as temp_file:
+            temp_file.write(data)
+        if file_stat is not None:
+            copymode(path, temp_path)
+        else:
+            current_umask = umask(0)
+            umask(current_umask)
+            chmod(temp_path, 0o666 & ~current_umask)
+        replace(temp_path, path)
+    except BaseException:
+        remove(temp_path)
+        raise
+
+    file_stat = stat(path)
+    _saved_files[path] = (digest, file_stat.st_mtime_ns, file_stat.st_size)
+    return True
+
+
 def export(info_root, config_root, package_path):
     """
     Exports the root elements and saves them to installer files.
 
+    Both files are serialized in memory (without the hidden nodes) and only the ones whose contents changed since
+    they were last saved are written.
+
+    Raises ``ReadOnlyArchiveError`` if *package_path* is a zip archive.
+
     :param info_root: The root element of the info.xml file.
     :param config_root: The root element of the moduleconfig.xml file.
     :param package_path: The path to save the files to.
+    :return: The paths of the files that were written.
     """
-    hidden_nodes_pairs = []
-    for root in (info_root, config_root):
-        for node in root:
-            if node.hidden_children:
-                for hidden_node in node.hidden_children:
-                    hidden_nodes_pairs.append((node, hidden_node, node.index(hidden_node)))
-                    node.remove(hidden_node)
+    if is_archive(package_path):
+        raise ReadOnlyArchiveError(package_path)
+
+    info_data = _serialize(info_root)
+    config_data = _serialize(config_root)
 
     try:
         fomod_folder = _check_file(package_path, "fomod")
     except MissingFileError as e:
         makedirs(join(package_path, e.file))
-        fomod_folder = join(package_path, e.file)
-
-    fomod_folder_path = join(package_path, fomod_folder)
+        fomod_folder = e.file
 
     try:
-        info_file = _check_file(fomod_folder_path, "Info.xml")
+        info_file = _check_file(package_path, join(fomod_folder, "Info.xml"))
     except MissingFileError as e:
-        info_file = e.file
+        info_file = join(fomod_folder, e.file)
 
     try:
-        config_file = _check_file(fomod_folder_path, "ModuleConfig.xml")
+        config_file = _check_file(package_path, join(fomod_folder, "ModuleConfig.xml"))
     except MissingFileError as e:
-        config_file = e.file
-
-    info_path = join(fomod_folder_path, info_file)
-    config_path = join(fomod_folder_path, config_file)
-
-    with open(info_path, "wb") as infofile:
-        info_tree = ElementTree(info_root)
-        info_tree.write(infofile, pretty_print=True)
+        config_file = join(fomod_folder, e.file)
 
-    with open(config_path, "wb") as configfile:
-        config_tree = ElementTree(config_root)
-        config_tree.write(configfile, pretty_print=True)
+    info_path = join(package_path, info_file)
+    config_path = join(package_path, config_file)
 
-    for pair in hidden_nodes_pairs:
-        pair[0].insert(pair[2], pair[1])
+    return [path for path, data in ((info_path, info_data), (config_path, config_data))
+            if _write_if_changed(path, data)]
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Daniel Nunes
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from PyQt5.QtGui import QStandardItem
+from PyQt5.QtCore import Qt
+from lxml.etree import Comment
+
+
+#: The item data role that holds the node's sort key, models holding node items should sort by it.
+SORT_ROLE = Qt.UserRole + 1
+
+
+class NodeStandardItem(QStandardItem):
+    """
+    A Standard Item but with an added reference to a xml node.
+
+    The node's sort key is kept as a string under SORT_ROLE, so models sorting by that role compare items without
+    calling back into python.
+    """
+    def __init__(self, node):
+        self.xml_node = node
+        super().__init__()
+
+        self.setText(node.item_text)
+        self.update_sort_key()
+        if node.tag is Comment:
+            self.setForeground(Qt.blue)
+            self.setFlags(Qt.ItemIsSelectable | Qt.ItemIsDragEnabled | Qt.ItemIsEnabled)
+        else:
+            if node.allowed_instances > 1 or not node.allowed_instances:
+                self.setFlags(Qt.ItemIsSelectable | Qt.ItemIsDragEnabled | Qt.ItemIsEnabled | Qt.ItemIsEditable)
+            else:
+                self.setFlags(Qt.ItemIsSelectable | Qt.ItemIsDropEnabled | Qt.ItemIsEnabled | Qt.ItemIsEditable)
+            self.setEditable(node.name_editable)
+            if node.is_hidden:
+                self.update_foreground()
+
+    def update_foreground(self):
+        """
+        Updates the item's colour to match whether the node is hidden or not.
+        """
+        self.setForeground(Qt.green if self.xml_node.is_hidden else Qt.black)
+
+    def update_sort_key(self):
+        """
+        Updates the item's sort key to match the node's.
+        """
+        self.setData(self.xml_node.sort_order + "." + self.xml_node.user_sort_order, SORT_ROLE)
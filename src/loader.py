@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Daniel Nunes
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QThread, pyqtSignal
+from lxml.etree import parse, tostring
+from validator import validate_tree, check_warnings, ValidationError, WarningError
+from .io import import_, is_archive
+from .exceptions import CancelledImportError
+
+
+class InstallerLoader(QThread):
+    """
+    Thread used to import an installer in the background.
+
+    The installer is loaded from its snapshot if it's unchanged since it was last opened, otherwise both installer
+    files are parsed in parallel. If enabled, the validation and the warnings check run alongside each other once
+    they're done. The results are delivered to the GUI thread through the signals.
+
+    :param package_path: The package where the installer is.
+    :param validate: Whether the installer should be validated.
+    :param warnings: Whether the installer should be checked for common errors.
+    :param cache: Optional. The SnapshotCache to load the installer from when it's unchanged and to store it in after
+                  importing it otherwise.
+    """
+
+    #: Signals the progress of the import, with the number of bytes read and the total number of bytes.
+    progress = pyqtSignal([int, int])
+
+    #: Signals the import is done, with the info root, config root, validation error and warning error.
+    #: The roots are None if any file is missing, the errors are None if the checks passed or were not run.
+    loaded = pyqtSignal([object, object, object, object])
+
+    #: Signals the import failed, with the exception raised.
+    failed = pyqtSignal([object])
+
+    def __init__(self, package_path, validate, warnings, cache=None):
+        super().__init__()
+        self.package_path = package_path
+        self.validate = validate
+        self.warnings = warnings
+        self.cache = cache
+        self._cancelled = False
+
+    def cancel(self):
+        """
+        Cancels the import. Nothing is signalled after the import stops.
+        """
+        self._cancelled = True
+
+    def _validate(self, config_root):
+        validate_tree(parse(BytesIO(config_root)))
+
+    def run(self):
+        try:
+            info_root, config_root = self.cache.load(self.package_path) if self.cache is not None else (None, None)
+            if info_root is None or config_root is None:
+                info_root, config_root = import_(self.package_path, self.progress.emit, lambda: self._cancelled)
+                if info_root is not None and config_root is not None and self.cache is not None:
+                    self.cache.store(self.package_path, info_root, config_root)
+
+            validation_error = None
+            warning_error = None
+            if info_root is not None and config_root is not None:
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    # the validation runs on its own copy of the tree
+                    validation = executor.submit(self._validate, tostring(config_root, pretty_print=True)) \
+                        if self.validate else None
+
+                    # the warnings check looks for the installer's files on disk, which an archive doesn't have
+                    if self.warnings and not is_archive(self.package_path):
+                        try:
+                            check_warnings(self.package_path, config_root)
+                        except WarningError as e:
+                            warning_error = e
+
+                    if validation is not None:
+                        try:
+                            validation.result()
+                        except ValidationError as e:
+                            validation_error = e
+
+            if not self._cancelled:
+                self.loaded.emit(info_root, config_root, validation_error, warning_error)
+        except CancelledImportError:
+            pass
+        except Exception as e:
+            self.failed.emit(e)
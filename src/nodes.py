@@ -15,19 +15,221 @@
 # limitations under the License.
 
 from os import sep
-from collections import OrderedDict
-from PyQt5.QtGui import QStandardItem
-from PyQt5.QtCore import Qt
-from lxml import etree, objectify
-from jsonpickle import encode, decode, set_encoder_options
-from json import JSONDecodeError
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict, Counter
+from weakref import WeakSet
+from operator import attrgetter
+from lxml import etree
+import validator
+from json import dumps, loads
 from .io import copy_node
-from .wizards import WizardFiles, WizardDepend
+from .flags import FlagIndex
 from .props import PropertyCombo, PropertyInt, PropertyText, PropertyFile, PropertyFolder, PropertyColour, \
-    PropertyFlagLabel, PropertyFlagValue, PropertyHTML
+    PropertyFlagLabel, PropertyFlagValue, PropertyHTML, PropertyValues
 
 
-class NodeComment(etree.CommentBase):
+_METADATA_PREFIX = "<designer.metadata.do.not.edit>"
+_XS = "{http://www.w3.org/2001/XMLSchema}"
+
+
+def _encode_metadata(metadata):
+    """
+    :param metadata: A node's metadata.
+    :return: The text of the comment that holds *metadata*.
+    """
+    return _METADATA_PREFIX + " " + dumps(metadata, separators=(",", ":"), sort_keys=True)
+
+
+def _decode_metadata(text):
+    """
+    Raises ``ValueError`` if the metadata can't be decoded.
+
+    :param text: The text of a metadata comment.
+    :return: The metadata held in *text*.
+    """
+    parts = text.split(maxsplit=1)
+    if len(parts) < 2:
+        raise ValueError("The metadata comment is empty.")
+    metadata = loads(parts[1])
+    if not isinstance(metadata, dict):
+        raise ValueError("The metadata is not a json object.")
+    return metadata
+
+
+class _NodeViewMixin(object):
+    """
+    Keeps track of a node's entry in the node tree without depending on Qt.
+
+    The attached children take the place of the model item's rows until the model item is first requested,
+    at that point the items for the whole attached subtree are built - the Qt model is just a view of the nodes.
+
+    Every child's python object is kept in the pinned children, attached or not (the metadata comments aren't), so
+    lxml never discards it - the node state lives as long as the element stays in the tree and _init only ever runs
+    once per element.
+    """
+    def _init_view(self, text):
+        self._model_item = None
+        self._item_text = text
+        self.attached_children = set()
+        self.pinned_children = set()
+
+    @property
+    def item_text(self):
+        """
+        The node's display name in the node tree.
+        """
+        if self._model_item is not None:
+            return self._model_item.text()
+        return self._item_text
+
+    @item_text.setter
+    def item_text(self, text):
+        self._item_text = text
+        if self._model_item is not None:
+            self._model_item.setText(text)
+
+    @property
+    def model_item(self):
+        """
+        The node's NodeStandardItem, built (along with its attached subtree) on first access.
+        """
+        if self._model_item is None:
+            self._build_model_items()
+        return self._model_item
+
+    def _build_model_items(self):
+        from .items import NodeStandardItem
+
+        built = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node._model_item = NodeStandardItem(node)
+            built.append(node)
+            stack.extend(child for child in node if child in node.attached_children and child._model_item is None)
+
+        for node in built:
+            rows = [child.model_item for child in node if child in node.attached_children]
+            if rows:
+                node._model_item.appendRows(rows)
+
+    def pin_child(self, child):
+        """
+        Keeps the child's python object (and its state) alive for as long as this node is.
+
+        :param child: The child to pin.
+        """
+        self.pinned_children.add(child)
+
+    def attach_child_item(self, child, row=None):
+        """
+        Attaches the child's entry to this node's entry in the node tree. The child is pinned as well.
+
+        :param child: The child to attach.
+        :param row: Optional. The row to insert the child's item at if the model item exists, appended otherwise.
+        """
+        self.attached_children.add(child)
+        self.pinned_children.add(child)
+        if self._model_item is not None:
+            if row is None:
+                self._model_item.appendRow(child.model_item)
+            else:
+                self._model_item.insertRow(row, child.model_item)
+
+    def detach_child_item(self, child):
+        """
+        Detaches the child's entry from this node's entry in the node tree.
+
+        :param child: The child to detach.
+        """
+        self.attached_children.discard(child)
+        if self._model_item is not None and child._model_item is not None \
+                and child._model_item.parent() is self._model_item:
+            self._model_item.takeRow(child._model_item.row())
+
+
+class _NodeSortMixin(object):
+    """
+    Keeps a node's sort key and tracks which parts of the tree may be out of order.
+
+    A node's children are flagged as unsorted whenever one is added or changes its user sort order, and every
+    ancestor is flagged as having something unsorted below it - sorting only visits the flagged subtrees.
+    """
+    def _init_sort(self, sort_order):
+        self.sort_order = sort_order
+        self._user_sort_order = "0".zfill(7)
+        self.sort_key = (sort_order, self._user_sort_order)
+        self._children_unsorted = True
+        self._subtree_unsorted = True
+
+    @property
+    def user_sort_order(self):
+        """
+        The order the user gave this node among its siblings of the same type, zero-padded.
+        """
+        return self._user_sort_order
+
+    @user_sort_order.setter
+    def user_sort_order(self, value):
+        if value == self._user_sort_order:
+            return
+        self._user_sort_order = value
+        self.sort_key = (self.sort_order, value)
+        if self._model_item is not None:
+            self._model_item.update_sort_key()
+        parent = self.getparent()
+        if parent is not None:
+            parent.mark_unsorted()
+
+    def mark_unsorted(self):
+        """
+        Flags this node's children as possibly out of order.
+        """
+        self._children_unsorted = True
+        node = self
+        while node is not None and not node._subtree_unsorted:
+            node._subtree_unsorted = True
+            node = node.getparent()
+
+    def sort_children(self):
+        """
+        Sorts this node's children, only moving them if they're out of order.
+
+        :return: True if any child was moved.
+        """
+        moved = False
+        if len(self) > 1:
+            children = list(self)
+            ordered = sorted(children, key=attrgetter("sort_key"))
+            if ordered != children:
+                self[:] = ordered
+                moved = True
+        self._children_unsorted = False
+        return moved
+
+    def sort(self):
+        """
+        Sorts every node in this node's subtree whose children may be out of order.
+
+        :return: A list with the nodes whose children were moved.
+        """
+        moved = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if not node._subtree_unsorted:
+                continue
+            if node._children_unsorted and node.sort_children():
+                moved.append(node)
+            node._subtree_unsorted = False
+            stack.extend(child for child in node if child.tag is not etree.Comment)
+        return moved
+
+
+_comment_properties = ((("<node_text>", PropertyText("Comment")),), {"<node_text>": 0})
+
+
+class NodeComment(_NodeViewMixin, _NodeSortMixin, etree.CommentBase):
     """
     The base class for all comment nodes.
     """
@@ -36,21 +238,19 @@ class NodeComment(etree.CommentBase):
 
     def _init(self):
         super()._init()
-        self.sort_order = "0"
-        self.user_sort_order = "0".zfill(7)
+        self._init_sort("0")
         self.allowed_children = ()
         self.allowed_instances = 0
         self.wizard = None
         self.name = "Comment"
         self.is_hidden = False
         self.forbidden_sequences = ["<!- -", "- ->", "--"]
-        self.properties = {"<node_text>": PropertyText("Comment")}
-        self.model_item = NodeStandardItem(self)
-        self.model_item.setForeground(Qt.blue)
+        self.properties = PropertyValues(*_comment_properties)
+        self._init_view(self.name)
         self.update_item_name()
 
     def update_item_name(self):
-        self.model_item.setText(self.name) if not self.text else self.model_item.setText(self.text[:40])
+        self.item_text = self.name if not self.text else self.text[:40]
 
     def parse_attribs(self):
         self.properties["<node_text>"].set_value(self.text)
@@ -58,10 +258,8 @@ class NodeComment(etree.CommentBase):
 
     def write_attribs(self):
         self.text = self.properties["<node_text>"].value
-        if self.text.startswith("<designer.metadata.do.not.edit>"):
-            self.getparent().model_item.takeRow(self.model_item.row())
-        else:
-            self.model_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsDragEnabled | Qt.ItemIsEnabled)
+        if self.text.startswith(_METADATA_PREFIX):
+            self.getparent().detach_child_item(self)
 
     def load_metadata(self):
         pass
@@ -69,63 +267,159 @@ class NodeComment(etree.CommentBase):
     def save_metadata(self):
         pass
 
+    def dump_state(self):
+        return self.properties.dump()
+
+    def load_state(self, state):
+        self.properties.load(state)
+
     def sort(self):
         pass
 
 
-class _NodeElement(etree.ElementBase):
-    """
-    The base class for all nodes. Should never be instantiated directly.
+class _NodeSchema(object):
     """
-    def _init(self):
-        if type(self) is _NodeElement:
-            raise AssertionError(str(type(self)) + " is not meant to be instanced. A subclass should be used instead.")
-        super()._init()
+    The shared description of a node class - its display name, tag, allowed children and default properties.
 
-    def init(self, name, tag, allowed_instances,
-             sort_order="0",
-             allowed_children=None,
-             properties=None,
-             wizard=None,
-             required_children=None,
-             either_children_group=None,
-             at_least_one_children_group=None,
-             name_editable=False,
-             ):
-
-        if not properties:
-            properties = OrderedDict()
-        if not allowed_children:
-            allowed_children = ()
-        if not required_children:
-            required_children = ()
-        if not either_children_group:
-            either_children_group = ()
-        if not at_least_one_children_group:
-            at_least_one_children_group = ()
+    A node class's schema is built once, the first time one of its nodes is created, and every node of that class
+    reads it from then on. It should never be changed after being built.
+    """
+    __slots__ = ("name", "tag", "allowed_instances", "sort_order", "allowed_children", "properties",
+                 "property_indexes", "wizard", "required_children", "either_children_group",
+                 "at_least_one_children_group", "name_editable")
 
+    def __init__(self, name, tag,
+                 allowed_instances=None,
+                 sort_order="0",
+                 allowed_children=None,
+                 properties=None,
+                 wizard=None,
+                 required_children=None,
+                 either_children_group=None,
+                 at_least_one_children_group=None,
+                 name_editable=False,
+                 ):
+        """
+        :param name: The display name of the nodes.
+        :param tag: The tag of the nodes.
+        :param allowed_instances: Optional. The maximum number of these nodes under the same parent, 0 for
+                                  unlimited. Read from the installer schema when not given.
+        :param sort_order: Optional. The sort order of the nodes.
+        :param allowed_children: Optional. The node classes allowed as children.
+        :param properties: Optional. An OrderedDict with the properties of the nodes, shared by all of them.
+        :param wizard: Optional. The name of the nodes' wizard class.
+        :param required_children: Optional. The node classes that must be children.
+        :param either_children_group: Optional. The node classes of which exactly one must be a child.
+        :param at_least_one_children_group: Optional. The node classes of which at least one must be a child.
+        :param name_editable: Optional. If the nodes' display name can be edited.
+        """
         self.name = name
         self.tag = tag
+        self.allowed_instances = allowed_instances
         self.sort_order = sort_order
-        self.properties = properties
-        self.allowed_children = allowed_children
-        self.required_children = required_children
-        self.either_children_group = either_children_group
-        self.at_least_one_children_group = at_least_one_children_group
+        self.allowed_children = tuple(allowed_children or ())
+        self.properties = tuple((properties or OrderedDict()).items())
+        self.property_indexes = {key: index for index, (key, _) in enumerate(self.properties)}
+        self.wizard = wizard
+        self.required_children = tuple(required_children or ())
+        self.either_children_group = tuple(either_children_group or ())
+        self.at_least_one_children_group = tuple(at_least_one_children_group or ())
+        self.name_editable = name_editable
+
+    def new_properties(self):
+        """
+        :return: A new PropertyValues with the default value of each property.
+        """
+        return PropertyValues(self.properties, self.property_indexes)
+
+
+_node_schemas = {}
+
+#: The nodes with hidden children - the trees without any are exported without looking for them.
+_hidden_parents = WeakSet()
+
+
+class _NodeMeta(ABCMeta):
+    """
+    The metaclass of the nodes. Raises AssertionError when a node class with abstract methods is instanced, as the
+    rest of the designer does for classes not meant to be instanced.
+
+    The parser and makeelement create the nodes without calling their class, so this costs them nothing.
+    """
+    def __call__(cls, *args, **kwargs):
+        if cls.__abstractmethods__:
+            raise AssertionError(str(cls) + " is not meant to be instanced. A subclass should be used instead.")
+        return super().__call__(*args, **kwargs)
+
+
+class _NodeElement(_NodeViewMixin, _NodeSortMixin, etree.ElementBase, metaclass=_NodeMeta):
+    """
+    The base class for all nodes. Should never be instantiated directly - every subclass has to implement _schema.
+    """
+    def _init(self):
+        self.init(type(self).schema())
+        super()._init()
+
+    @classmethod
+    @abstractmethod
+    def _schema(cls):
+        """
+        Method called the first time a node of this class is created, to build the schema shared by all of them.
+
+        :return: A new _NodeSchema.
+        """
+        pass
+
+    @classmethod
+    def schema(cls):
+        """
+        :return: The shared schema of this node class, built on first use. Its allowed instances are read from the
+                 installer schema if the class didn't set them.
+        """
+        try:
+            return _node_schemas[cls]
+        except KeyError:
+            schema = cls._schema()
+            if schema.allowed_instances is None:
+                schema.allowed_instances = _schema_allowed_instances[cls]
+            _node_schemas[cls] = schema
+            return schema
+
+    def init(self, schema):
+        """
+        Sets up this node from its class's schema.
+
+        :param schema: The _NodeSchema of this node's class.
+        """
+        self.name = schema.name
+        self.tag = schema.tag
+        self._init_sort(schema.sort_order)
+        self.properties = schema.new_properties()
+        self.allowed_children = schema.allowed_children
+        self.required_children = schema.required_children
+        self.either_children_group = schema.either_children_group
+        self.at_least_one_children_group = schema.at_least_one_children_group
         self.hidden_children = []
         self.is_hidden = False
-        self.allowed_instances = allowed_instances
-        self.wizard = wizard
+        self.allowed_instances = schema.allowed_instances
+        self.name_editable = schema.name_editable
+        self._wizard = schema.wizard
+        self._child_counts = None
         self.metadata = {}
-        self.user_sort_order = "0".zfill(7)
+        self._metadata_comment = None
+        self._metadata_text = None
+        self._saved_metadata = {}
+        self._init_view(self.name)
 
-        self.model_item = NodeStandardItem(self)
-        self.model_item.setText(self.name)
-        if allowed_instances > 1 or not allowed_instances:
-            self.model_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsDragEnabled | Qt.ItemIsEnabled | Qt.ItemIsEditable)
-        else:
-            self.model_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsDropEnabled | Qt.ItemIsEnabled | Qt.ItemIsEditable)
-        self.model_item.setEditable(name_editable)
+    @property
+    def wizard(self):
+        """
+        The wizard class for this node or None. The wizards are only imported when requested since they need Qt.
+        """
+        if self._wizard is None:
+            return None
+        from . import wizards
+        return getattr(wizards, self._wizard)
 
     def can_add_child(self, child):
         """
@@ -134,17 +428,50 @@ class _NodeElement(etree.ElementBase):
         :param child: The child to check.
         :return: True if possible, False if not.
         """
-        if child.allowed_instances:
-            instances = 0
-            for item in self:
-                if type(item) == type(child):
-                    instances += 1
-            if instances >= child.allowed_instances:
-                return False
+        if child.allowed_instances and self.child_count(type(child)) >= child.allowed_instances:
+            return False
         if type(child) in self.allowed_children or child.tag is etree.Comment:
             return True
         return False
 
+    def child_count(self, node_type):
+        """
+        Counts this node's children of a given type.
+
+        The children are only counted once, after that the count is kept up to date by add_child and remove_child.
+
+        :param node_type: The node class to count.
+        :return: The number of children of type *node_type*.
+        """
+        if self._child_counts is None:
+            self._child_counts = Counter(type(child) for child in self)
+        return self._child_counts[node_type]
+
+    def _update_child_count(self, child, delta):
+        if self._child_counts is not None:
+            self._child_counts[type(child)] += delta
+
+    def append_child(self, child):
+        """
+        Appends the given child to this node, keeping the child count up to date. A hidden child (as one removed
+        and appended back by an undo) is kept hidden.
+
+        Unlike add_child there's no check and the child is neither attached nor updated (only pinned) - meant for
+        callers that take care of that themselves.
+
+        :param child: The child to append.
+        """
+        self.append(child)
+        self.pin_child(child)
+        self._update_child_count(child, 1)
+        if child.is_hidden:
+            self.hidden_children.append(child)
+            _hidden_parents.add(self)
+        self.mark_unsorted()
+        flag_index = self.live_flag_index()
+        if flag_index is not None:
+            flag_index.add_tree(child)
+
     def add_child(self, child):
         """
         Adds the given child to this node. Includes a check with can_add_child at the start.
@@ -152,37 +479,55 @@ class _NodeElement(etree.ElementBase):
         :param child: The child to add.
         """
         if self.can_add_child(child):
-            self.append(child)
-            self.model_item.appendRow(child.model_item)
+            self.append_child(child)
+            self.attach_child_item(child)
             child.write_attribs()
             child.load_metadata()
 
-    def remove_child(self, child):
+    def remove_child(self, child, keep_item=False):
         """
         Removes the given child from this node.
 
         :param child: The child to remove.
+        :param keep_item: Optional. If the child's item should be left in the node tree's model, for when the view
+            removes it itself (as after a drag and drop move).
         """
         if child in self:
-            self.model_item.takeRow(child.model_item.row())
+            flag_index = self.live_flag_index()
+            if flag_index is not None:
+                flag_index.remove_tree(child)
+            if keep_item:
+                self.attached_children.discard(child)
+            else:
+                self.detach_child_item(child)
             self.remove(child)
+            self.pinned_children.discard(child)
+            self._update_child_count(child, -1)
+            if child in self.hidden_children:
+                self.hidden_children.remove(child)
+                if not self.hidden_children:
+                    _hidden_parents.discard(self)
+
+    def live_flag_index(self):
+        """
+        :return: The flag index of this node's config if it has been built already, None otherwise.
+        """
+        root = self.getroottree().getroot()
+        return root._flag_index if isinstance(root, NodeConfigRoot) else None
 
     def set_hidden(self, hide: bool):
         self.is_hidden = hide
+        parent = self.getparent()
         if hide:
-            self.model_item.setForeground(Qt.green)
-            self.getparent().hidden_children.append(self)
+            if self not in parent.hidden_children:
+                parent.hidden_children.append(self)
+            _hidden_parents.add(parent)
         else:
-            self.model_item.setForeground(Qt.black)
-            self.getparent().hidden_children.remove(self)
-        self.getparent().save_metadata()
-
-    def sort(self):
-        for parent in self.xpath('//*[./*]'):
-            parent[:] = sorted(
-                parent,
-                key=lambda x: x.sort_order + "." + x.user_sort_order
-            )
+            parent.hidden_children.remove(self)
+            if not parent.hidden_children:
+                _hidden_parents.discard(parent)
+        if self._model_item is not None:
+            self._model_item.update_foreground()
 
     def parse_attribs(self):
         """
@@ -207,8 +552,6 @@ class _NodeElement(etree.ElementBase):
                 self.text = self.properties[key].value
                 continue
             self.set(key, str(self.properties[key].value))
-        if self.is_hidden:
-            self.getparent().save_metadata()
 
     def update_item_name(self):
         """
@@ -218,36 +561,81 @@ class _NodeElement(etree.ElementBase):
         """
         return self.name
 
+    def _find_metadata_comment(self):
+        """
+        :return: This node's metadata comment or None if there's none. The comment found is remembered.
+        """
+        comment = self._metadata_comment
+        if comment is None or comment.getparent() is not self or not comment.text.startswith(_METADATA_PREFIX):
+            comment = None
+            for child in self:
+                if type(child) is NodeComment and child.text.startswith(_METADATA_PREFIX):
+                    comment = child
+            self._metadata_comment = comment
+        return comment
+
     def load_metadata(self):
         """
         Loads this node's metadata which is stored in a child comment encoded in json.
-        """
-        for child in self:
-            if type(child) is NodeComment:
-                if child.text.startswith("<designer.metadata.do.not.edit>"):
-                    try:
-                        self.metadata = decode(child.text.split(maxsplit=1)[1])
-                    except JSONDecodeError:
-                        continue
 
-        self.model_item.setText(self.metadata.get("name", self.update_item_name()))
+        The comment is only decoded when its text changed since it was last decoded or saved.
+        Hidden children found in the metadata (as written on export) are built once, from then on they're kept as
+        regular nodes and the comment is rewritten without them.
+        """
+        comment = self._find_metadata_comment()
+        if comment is not None and comment.text != self._metadata_text:
+            try:
+                self.metadata = _decode_metadata(comment.text)
+            except ValueError:
+                pass
+            else:
+                self._metadata_text = comment.text
+                self._saved_metadata = dict(self.metadata)
+
+        self.item_text = self.metadata.get("name", self.update_item_name())
         self.user_sort_order = self.metadata.get("user_sort", "0".zfill(7))
-        if not self.hidden_children:
-            hidden_nodes = self.metadata.get("hidden_nodes", [])
-            for node_string in hidden_nodes:
-                node_string = node_string.replace("<!- -", "<!--").replace("- ->", "-->")
-                node = copy_node(etree.fromstring(node_string), self)  # type: _NodeElement
-                self.add_child(node) if node.tag is not etree.Comment else self.append(node)
-                node.set_hidden(True)
+        hidden_nodes = self.metadata.pop("hidden_nodes", None)
+        if hidden_nodes is not None:
+            if not self.hidden_children:
+                for node_string in hidden_nodes:
+                    node_string = node_string.replace("<!- -", "<!--").replace("- ->", "-->")
+                    node = copy_node(etree.fromstring(node_string), self)  # type: _NodeElement
+                    self.add_child(node) if node.tag is not etree.Comment else self.append_child(node)
+                    node.set_hidden(True)
                 self.sort()
-                self.model_item.sortChildren(0)
+                if self._model_item is not None:
+                    self._model_item.sortChildren(0)
+            self.save_metadata()
+
+    def dump_state(self):
+        """
+        :return: This node's state as it's after parse_attribs and load_metadata, as json-serializable data.
+        """
+        return [self.properties.dump(), self.item_text, self.user_sort_order, self.metadata, self._metadata_text]
+
+    def load_state(self, state):
+        """
+        Restores the state made by dump_state, in place of parse_attribs and load_metadata. The node's children are
+        taken to be sorted, as they are once imported.
+
+        :param state: The node's state.
+        """
+        values, self.item_text, user_sort_order, self.metadata, self._metadata_text = state
+        self.properties.load(values)
+        self._saved_metadata = dict(self.metadata)
+        self._user_sort_order = user_sort_order
+        self.sort_key = (self.sort_order, user_sort_order)
+        self._children_unsorted = False
 
     def save_metadata(self):
         """
         Saves this node's metadata.
+
+        The metadata is only encoded (and the comment only written) if any of its fields changed since it was last
+        loaded or saved. The hidden children aren't part of it, they're only serialized on export.
         """
-        if self.model_item.text() != self.name:
-            self.metadata["name"] = self.model_item.text()
+        if self.item_text != self.name:
+            self.metadata["name"] = self.item_text
         else:
             self.metadata.pop("name", None)
 
@@ -256,49 +644,34 @@ class _NodeElement(etree.ElementBase):
         else:
             self.metadata.pop("user_sort", None)
 
-        if self.hidden_children:
-            self.metadata["hidden_nodes"] = []
-            for element in self.hidden_children:
-                objectify.deannotate(element, cleanup_namespaces=True)
-                node_string = etree.tostring(element, pretty_print=False, encoding="unicode")
-                node_string = node_string.replace("<!--", "<!- -").replace("-->", "- ->")
-                self.metadata["hidden_nodes"].append(node_string)
-        else:
-            self.metadata.pop("hidden_nodes", None)
+        self.metadata.pop("hidden_nodes", None)
 
         if not self.allowed_children and "<node_text>" not in self.properties.keys():
             return
+
+        meta_comment = self._find_metadata_comment()
+        if not self.metadata:
+            for child in [child for child in self
+                          if type(child) is NodeComment and child.text.startswith(_METADATA_PREFIX)]:
+                self.remove_child(child)
+            self._metadata_text = None
+            self._saved_metadata = {}
+            return
+
+        if meta_comment is not None and meta_comment.text == self._metadata_text and \
+                self.metadata == self._saved_metadata:
+            return
+
+        text = _encode_metadata(self.metadata)
+        self._metadata_text = text
+        self._saved_metadata = dict(self.metadata)
+        if meta_comment is not None:
+            meta_comment.text = text
         else:
-            meta_comment = None
-            set_encoder_options("json", separators=(',', ':'))
-            for child in self:
-                if type(child) is NodeComment:
-                    if child.text.startswith("<designer.metadata.do.not.edit>"):
-                        meta_comment = child
-                        if self.metadata:
-                            child.text = "<designer.metadata.do.not.edit> " + encode(self.metadata)
-                        else:
-                            self.remove(child)
-
-            if meta_comment is None and self.metadata:
-                meta_comment = NodeComment()
-                meta_comment.properties["<node_text>"].set_value("<designer.metadata.do.not.edit> " + encode(self.metadata))
-                self.add_child(meta_comment)
-
-
-class NodeStandardItem(QStandardItem):
-    """A Standard Item but with an added reference to a xml node."""
-    def __init__(self, node):
-        self.xml_node = node
-        super().__init__()
-
-    def __lt__(self, other):
-        self_sort = self.xml_node.sort_order + "." + self.xml_node.user_sort_order
-        other_sort = other.xml_node.sort_order + "." + other.xml_node.user_sort_order
-        if self_sort < other_sort:
-            return True
-        else:
-            return False
+            meta_comment = NodeComment()
+            meta_comment.properties["<node_text>"].set_value(text)
+            self.add_child(meta_comment)
+            self._metadata_comment = meta_comment
 
 
 class NodeInfoRoot(_NodeElement):
@@ -307,7 +680,8 @@ class NodeInfoRoot(_NodeElement):
     """
     tag = "fomod"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeInfoName,
             NodeInfoAuthor,
@@ -317,13 +691,12 @@ class NodeInfoRoot(_NodeElement):
             NodeInfoVersion,
             NodeInfoWebsite
         )
-        self.init(
+        return _NodeSchema(
             "Info",
-            type(self).tag,
+            cls.tag,
             1,
             allowed_children=allowed_children
         )
-        super()._init()
 
 
 class NodeInfoName(_NodeElement):
@@ -332,17 +705,17 @@ class NodeInfoName(_NodeElement):
     """
     tag = "Name"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("<node_text>", PropertyText("Name"))
         ])
-        self.init(
+        return _NodeSchema(
             "Name",
-            type(self).tag,
+            cls.tag,
             1,
             properties=properties
         )
-        super()._init()
 
 
 class NodeInfoAuthor(_NodeElement):
@@ -351,17 +724,17 @@ class NodeInfoAuthor(_NodeElement):
     """
     tag = "Author"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("<node_text>", PropertyText("Author"))
         ])
-        self.init(
+        return _NodeSchema(
             "Author",
-            type(self).tag,
+            cls.tag,
             1,
             properties=properties
         )
-        super()._init()
 
 
 class NodeInfoVersion(_NodeElement):
@@ -370,17 +743,17 @@ class NodeInfoVersion(_NodeElement):
     """
     tag = "Version"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("<node_text>", PropertyText("Version"))
         ])
-        self.init(
+        return _NodeSchema(
             "Version",
-            type(self).tag,
+            cls.tag,
             1,
             properties=properties
         )
-        super()._init()
 
 
 class NodeInfoID(_NodeElement):
@@ -389,17 +762,17 @@ class NodeInfoID(_NodeElement):
     """
     tag = "Id"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("<node_text>", PropertyText("ID"))
         ])
-        self.init(
+        return _NodeSchema(
             "ID",
-            type(self).tag,
+            cls.tag,
             1,
             properties=properties
         )
-        super()._init()
 
 
 class NodeInfoWebsite(_NodeElement):
@@ -408,17 +781,17 @@ class NodeInfoWebsite(_NodeElement):
     """
     tag = "Website"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("<node_text>", PropertyText("Website"))
         ])
-        self.init(
+        return _NodeSchema(
             "Website",
-            type(self).tag,
+            cls.tag,
             1,
             properties=properties
         )
-        super()._init()
 
 
 class NodeInfoDescription(_NodeElement):
@@ -427,17 +800,17 @@ class NodeInfoDescription(_NodeElement):
     """
     tag = "Description"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("<node_text>", PropertyText("Description"))
         ])
-        self.init(
+        return _NodeSchema(
             "Description",
-            type(self).tag,
+            cls.tag,
             1,
             properties=properties
         )
-        super()._init()
 
 
 class NodeInfoGroup(_NodeElement):
@@ -446,17 +819,17 @@ class NodeInfoGroup(_NodeElement):
     """
     tag = "Groups"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_child = (
             NodeInfoElement,
         )
-        self.init(
+        return _NodeSchema(
             "Categories Group",
-            type(self).tag,
+            cls.tag,
             1,
             allowed_children=allowed_child
         )
-        super()._init()
 
 
 class NodeInfoElement(_NodeElement):
@@ -465,17 +838,17 @@ class NodeInfoElement(_NodeElement):
     """
     tag = "element"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("<node_text>", PropertyText("Category"))
         ])
-        self.init(
+        return _NodeSchema(
             "Category",
-            type(self).tag,
+            cls.tag,
             0,
             properties=properties
         )
-        super()._init()
 
 
 class NodeConfigRoot(_NodeElement):
@@ -484,7 +857,8 @@ class NodeConfigRoot(_NodeElement):
     """
     tag = "config"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigModName,
             NodeConfigModImage,
@@ -510,16 +884,30 @@ class NodeConfigRoot(_NodeElement):
                  ))
             ]
         )
-        self.init(
+        return _NodeSchema(
             "Config",
-            type(self).tag,
+            cls.tag,
             1,
             allowed_children=allowed_children,
             properties=properties,
             required_children=required,
             at_least_one_children_group=at_least_one
         )
+
+    def _init(self):
         super()._init()
+        self._flag_index = None
+
+    @property
+    def flag_index(self):
+        """
+        The FlagIndex of this config. Built from the whole tree the first time it's requested and kept up to date
+        by the nodes from then on.
+        """
+        if self._flag_index is None:
+            self._flag_index = FlagIndex()
+            self._flag_index.add_tree(self)
+        return self._flag_index
 
 
 class NodeConfigModName(_NodeElement):
@@ -528,20 +916,19 @@ class NodeConfigModName(_NodeElement):
     """
     tag = "moduleName"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("<node_text>", PropertyText("Name")),
             ("position", PropertyCombo("Position", ("Left", "Right", "RightOfImage"))),
             ("colour", PropertyColour("Colour", "000000"))
         ])
-        self.init(
+        return _NodeSchema(
             "Name",
-            type(self).tag,
-            1,
+            cls.tag,
             properties=properties,
             sort_order="1"
         )
-        super()._init()
 
 
 class NodeConfigModImage(_NodeElement):
@@ -550,21 +937,20 @@ class NodeConfigModImage(_NodeElement):
     """
     tag = "moduleImage"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("path", PropertyFile("Path")),
             ("showImage", PropertyCombo("Show Image", ("true", "false"))),
             ("showFade", PropertyCombo("Show Fade", ("true", "false"))),
             ("height", PropertyInt("Height", -1, 9999, -1))
         ])
-        self.init(
+        return _NodeSchema(
             "Image",
             "moduleImage",
-            1,
             properties=properties,
             sort_order="2"
         )
-        super()._init()
 
 
 class NodeConfigModDepend(_NodeElement):
@@ -573,7 +959,8 @@ class NodeConfigModDepend(_NodeElement):
     """
     tag = "moduleDependencies"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigDependFile,
             NodeConfigDependFlag,
@@ -583,16 +970,14 @@ class NodeConfigModDepend(_NodeElement):
         properties = OrderedDict([
             ("operator", PropertyCombo("Type", ["And", "Or"]))
         ])
-        self.init(
+        return _NodeSchema(
             "Mod Dependencies",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             properties=properties,
             sort_order="3",
-            wizard=WizardDepend
+            wizard="WizardDepend"
         )
-        super()._init()
 
 
 class NodeConfigReqFiles(_NodeElement):
@@ -601,20 +986,19 @@ class NodeConfigReqFiles(_NodeElement):
     """
     tag = "requiredInstallFiles"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigFile,
             NodeConfigFolder
         )
-        self.init(
+        return _NodeSchema(
             "Mod Requirements",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             sort_order="4",
-            wizard=WizardFiles
+            wizard="WizardFiles"
         )
-        super()._init()
 
 
 class NodeConfigInstallSteps(_NodeElement):
@@ -623,7 +1007,8 @@ class NodeConfigInstallSteps(_NodeElement):
     """
     tag = "installSteps"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigInstallStep,
         )
@@ -633,16 +1018,14 @@ class NodeConfigInstallSteps(_NodeElement):
         properties = OrderedDict([
             ("order", PropertyCombo("Order", ["Ascending", "Descending", "Explicit"]))
         ])
-        self.init(
+        return _NodeSchema(
             "Installation Steps",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             properties=properties,
             sort_order="5",
             required_children=required
         )
-        super()._init()
 
 
 class NodeConfigCondInstall(_NodeElement):
@@ -651,22 +1034,21 @@ class NodeConfigCondInstall(_NodeElement):
     """
     tag = "conditionalFileInstalls"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigPatterns,
         )
         required = (
             NodeConfigPatterns,
         )
-        self.init(
+        return _NodeSchema(
             "Conditional Installation",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             sort_order="6",
             required_children=required
         )
-        super()._init()
 
 
 class NodeConfigDependFile(_NodeElement):
@@ -675,18 +1057,17 @@ class NodeConfigDependFile(_NodeElement):
     """
     tag = "fileDependency"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("file", PropertyText("File")),
             ("state", PropertyCombo("State", ("Active", "Inactive", "Missing")))
         ])
-        self.init(
+        return _NodeSchema(
             "File Dependency",
-            type(self).tag,
-            0,
+            cls.tag,
             properties=properties
         )
-        super()._init()
 
 
 class NodeConfigDependFlag(_NodeElement):
@@ -695,18 +1076,23 @@ class NodeConfigDependFlag(_NodeElement):
     """
     tag = "flagDependency"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("flag", PropertyFlagLabel("Label")),
             ("value", PropertyFlagValue("Value"))
         ])
-        self.init(
+        return _NodeSchema(
             "Flag Dependency",
-            type(self).tag,
-            0,
+            cls.tag,
             properties=properties
         )
-        super()._init()
+
+    def write_attribs(self):
+        super().write_attribs()
+        flag_index = self.live_flag_index()
+        if flag_index is not None:
+            flag_index.add(self)
 
 
 class NodeConfigDependGame(_NodeElement):
@@ -715,17 +1101,16 @@ class NodeConfigDependGame(_NodeElement):
     """
     tag = "gameDependency"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("version", PropertyText("Version"))
         ])
-        self.init(
+        return _NodeSchema(
             "Game Dependency",
             "gameDependency",
-            1,
             properties=properties
         )
-        super()._init()
 
 
 class NodeConfigFile(_NodeElement):
@@ -734,7 +1119,8 @@ class NodeConfigFile(_NodeElement):
     """
     tag = "file"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("source", PropertyFile("Source")),
             ("destination", PropertyText("Destination")),
@@ -742,13 +1128,11 @@ class NodeConfigFile(_NodeElement):
             ("alwaysInstall", PropertyCombo("Always Install", ("false", "true"))),
             ("installIfUsable", PropertyCombo("Install If Usable", ("false", "true")))
         ])
-        self.init(
+        return _NodeSchema(
             "File",
-            type(self).tag,
-            0,
+            cls.tag,
             properties=properties
         )
-        super()._init()
 
     def update_item_name(self):
         """
@@ -757,10 +1141,10 @@ class NodeConfigFile(_NodeElement):
         Override in subclasses as needed.
         """
         if not self.properties["source"].value:
-            self.model_item.setText(self.name)
+            self.item_text = self.name
             return self.name
         split_name = self.properties["source"].value.split(sep)
-        self.model_item.setText(split_name[len(split_name) - 1])
+        self.item_text = split_name[len(split_name) - 1]
         return split_name[len(split_name) - 1]
 
 
@@ -770,7 +1154,8 @@ class NodeConfigFolder(_NodeElement):
     """
     tag = "folder"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("source", PropertyFolder("Source")),
             ("destination", PropertyText("Destination")),
@@ -778,13 +1163,11 @@ class NodeConfigFolder(_NodeElement):
             ("alwaysInstall", PropertyCombo("Always Install", ("false", "true"))),
             ("installIfUsable", PropertyCombo("Install If Usable", ("false", "true")))
         ])
-        self.init(
+        return _NodeSchema(
             "Folder",
-            type(self).tag,
-            0,
+            cls.tag,
             properties=properties
         )
-        super()._init()
 
     def update_item_name(self):
         """
@@ -793,10 +1176,10 @@ class NodeConfigFolder(_NodeElement):
         Override in subclasses as needed.
         """
         if not self.properties["source"].value:
-            self.model_item.setText(self.name)
+            self.item_text = self.name
             return self.name
         split_name = self.properties["source"].value.split(sep)
-        self.model_item.setText(split_name[len(split_name) - 1])
+        self.item_text = split_name[len(split_name) - 1]
         return split_name[len(split_name) - 1]
 
 
@@ -806,21 +1189,20 @@ class NodeConfigPatterns(_NodeElement):
     """
     tag = "patterns"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigPattern,
         )
         required = (
             NodeConfigPattern,
         )
-        self.init(
+        return _NodeSchema(
             "Patterns",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             required_children=required
         )
-        super()._init()
 
 
 class NodeConfigPattern(_NodeElement):
@@ -829,7 +1211,8 @@ class NodeConfigPattern(_NodeElement):
     """
     tag = "pattern"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigFiles,
             NodeConfigDependencies
@@ -838,15 +1221,13 @@ class NodeConfigPattern(_NodeElement):
             NodeConfigFiles,
             NodeConfigDependencies
         )
-        self.init(
+        return _NodeSchema(
             "Pattern",
-            type(self).tag,
-            0,
+            cls.tag,
             allowed_children=allowed_children,
             required_children=required,
             name_editable=True
         )
-        super()._init()
 
 
 class NodeConfigFiles(_NodeElement):
@@ -855,20 +1236,19 @@ class NodeConfigFiles(_NodeElement):
     """
     tag = "files"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigFile,
             NodeConfigFolder
         )
-        self.init(
+        return _NodeSchema(
             "Files",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             sort_order="3",
-            wizard=WizardFiles
+            wizard="WizardFiles"
         )
-        super()._init()
 
 
 class NodeConfigDependencies(_NodeElement):
@@ -877,7 +1257,8 @@ class NodeConfigDependencies(_NodeElement):
     """
     tag = "dependencies"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigDependFile,
             NodeConfigDependFlag,
@@ -887,16 +1268,14 @@ class NodeConfigDependencies(_NodeElement):
         properties = OrderedDict([
             ("operator", PropertyCombo("Type", ["And", "Or"]))
         ])
-        self.init(
+        return _NodeSchema(
             "Dependencies",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             properties=properties,
             sort_order="1",
-            wizard=WizardDepend
+            wizard="WizardDepend"
         )
-        super()._init()
 
 
 class NodeConfigNestedDependencies(_NodeElement):
@@ -905,7 +1284,8 @@ class NodeConfigNestedDependencies(_NodeElement):
     """
     tag = "dependencies"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigDependFile,
             NodeConfigDependFlag,
@@ -915,15 +1295,13 @@ class NodeConfigNestedDependencies(_NodeElement):
         properties = OrderedDict([
             ("operator", PropertyCombo("Type", ["And", "Or"]))
         ])
-        self.init(
+        return _NodeSchema(
             "Dependencies",
-            type(self).tag,
-            0,
+            cls.tag,
             allowed_children=allowed_children,
             properties=properties,
-            wizard=WizardDepend
+            wizard="WizardDepend"
         )
-        super()._init()
 
 
 class NodeConfigInstallStep(_NodeElement):
@@ -932,7 +1310,8 @@ class NodeConfigInstallStep(_NodeElement):
     """
     tag = "installStep"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigVisible,
             NodeConfigOptGroups
@@ -943,15 +1322,13 @@ class NodeConfigInstallStep(_NodeElement):
         properties = OrderedDict([
             ("name", PropertyText("Name"))
         ])
-        self.init(
+        return _NodeSchema(
             "Install Step",
-            type(self).tag,
-            0,
+            cls.tag,
             allowed_children=allowed_children,
             properties=properties,
             required_children=required
         )
-        super()._init()
 
     def update_item_name(self):
         """
@@ -960,9 +1337,9 @@ class NodeConfigInstallStep(_NodeElement):
         Override in subclasses as needed.
         """
         if not self.properties["name"].value:
-            self.model_item.setText(self.name)
+            self.item_text = self.name
             return self.name
-        self.model_item.setText(self.properties["name"].value)
+        self.item_text = self.properties["name"].value
         return self.properties["name"].value
 
 
@@ -972,7 +1349,8 @@ class NodeConfigVisible(_NodeElement):
     """
     tag = "visible"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigDependFile,
             NodeConfigDependFlag,
@@ -982,16 +1360,14 @@ class NodeConfigVisible(_NodeElement):
         properties = OrderedDict([
             ("operator", PropertyCombo("Type", ["And", "Or"]))
         ])
-        self.init(
+        return _NodeSchema(
             "Visibility",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             sort_order="1",
-            wizard=WizardDepend,
+            wizard="WizardDepend",
             properties=properties
         )
-        super()._init()
 
 
 class NodeConfigOptGroups(_NodeElement):
@@ -1000,7 +1376,8 @@ class NodeConfigOptGroups(_NodeElement):
     """
     tag = "optionalFileGroups"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigGroup,
         )
@@ -1010,16 +1387,14 @@ class NodeConfigOptGroups(_NodeElement):
         properties = OrderedDict([
             ("order", PropertyCombo("Order", ["Ascending", "Descending", "Explicit"]))
         ])
-        self.init(
+        return _NodeSchema(
             "Option Group",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             properties=properties,
             sort_order="2",
             required_children=required
         )
-        super()._init()
 
 
 class NodeConfigGroup(_NodeElement):
@@ -1028,7 +1403,8 @@ class NodeConfigGroup(_NodeElement):
     """
     tag = "group"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigPlugins,
         )
@@ -1045,15 +1421,13 @@ class NodeConfigGroup(_NodeElement):
                 "SelectAtLeastOne"
             ]))
         ])
-        self.init(
+        return _NodeSchema(
             "Group",
-            type(self).tag,
-            0,
+            cls.tag,
             allowed_children=allowed_children,
             properties=properties,
             required_children=required
         )
-        super()._init()
 
     def update_item_name(self):
         """
@@ -1062,9 +1436,9 @@ class NodeConfigGroup(_NodeElement):
         Override in subclasses as needed.
         """
         if not self.properties["name"].value:
-            self.model_item.setText(self.name)
+            self.item_text = self.name
             return self.name
-        self.model_item.setText(self.properties["name"].value)
+        self.item_text = self.properties["name"].value
         return self.properties["name"].value
 
 
@@ -1074,7 +1448,8 @@ class NodeConfigPlugins(_NodeElement):
     """
     tag = "plugins"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigPlugin,
         )
@@ -1084,15 +1459,13 @@ class NodeConfigPlugins(_NodeElement):
         properties = OrderedDict([
             ("order", PropertyCombo("Order", ["Ascending", "Descending", "Explicit"]))
         ])
-        self.init(
+        return _NodeSchema(
             "Plugins",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             properties=properties,
             required_children=required
         )
-        super()._init()
 
 
 class NodeConfigPlugin(_NodeElement):
@@ -1101,7 +1474,8 @@ class NodeConfigPlugin(_NodeElement):
     """
     tag = "plugin"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigPluginDescription,
             NodeConfigImage,
@@ -1116,15 +1490,13 @@ class NodeConfigPlugin(_NodeElement):
         properties = OrderedDict([
             ("name", PropertyText("Name"))
         ])
-        self.init(
+        return _NodeSchema(
             "Plugin",
-            type(self).tag,
-            0,
+            cls.tag,
             allowed_children=allowed_children,
             properties=properties,
             required_children=required
         )
-        super()._init()
 
     def update_item_name(self):
         """
@@ -1133,9 +1505,9 @@ class NodeConfigPlugin(_NodeElement):
         Override in subclasses as needed.
         """
         if not self.properties["name"].value:
-            self.model_item.setText(self.name)
+            self.item_text = self.name
             return self.name
-        self.model_item.setText(self.properties["name"].value)
+        self.item_text = self.properties["name"].value
         return self.properties["name"].value
 
 
@@ -1145,18 +1517,17 @@ class NodeConfigPluginDescription(_NodeElement):
     """
     tag = "description"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("<node_text>", PropertyHTML("Description"))
         ])
-        self.init(
+        return _NodeSchema(
             "Description",
-            type(self).tag,
-            1,
+            cls.tag,
             properties=properties,
             sort_order="1"
         )
-        super()._init()
 
 
 class NodeConfigImage(_NodeElement):
@@ -1165,18 +1536,17 @@ class NodeConfigImage(_NodeElement):
     """
     tag = "image"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("path", PropertyFile("Path"))
         ])
-        self.init(
+        return _NodeSchema(
             "Image",
-            type(self).tag,
-            1,
+            cls.tag,
             properties=properties,
             sort_order="2"
         )
-        super()._init()
 
 
 class NodeConfigConditionFlags(_NodeElement):
@@ -1185,22 +1555,21 @@ class NodeConfigConditionFlags(_NodeElement):
     """
     tag = "conditionFlags"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigFlag,
         )
         required = (
             NodeConfigFlag,
         )
-        self.init(
+        return _NodeSchema(
             "Flags",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             sort_order="3",
             required_children=required
         )
-        super()._init()
 
 
 class NodeConfigTypeDesc(_NodeElement):
@@ -1209,7 +1578,8 @@ class NodeConfigTypeDesc(_NodeElement):
     """
     tag = "typeDescriptor"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigDependencyType,
             NodeConfigType
@@ -1218,15 +1588,13 @@ class NodeConfigTypeDesc(_NodeElement):
             NodeConfigDependencyType,
             NodeConfigType
         )
-        self.init(
+        return _NodeSchema(
             "Type Descriptor",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             sort_order="4",
             either_children_group=either_children
         )
-        super()._init()
 
     def can_add_child(self, child):
         if super().can_add_child(child):
@@ -1241,18 +1609,17 @@ class NodeConfigFlag(_NodeElement):
     """
     tag = "flag"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("name", PropertyFlagLabel("Label")),
             ("<node_text>", PropertyText("Value")),
         ])
-        self.init(
+        return _NodeSchema(
             "Flag",
-            type(self).tag,
-            0,
+            cls.tag,
             properties=properties,
         )
-        super()._init()
 
     def update_item_name(self):
         """
@@ -1261,11 +1628,17 @@ class NodeConfigFlag(_NodeElement):
         Override in subclasses as needed.
         """
         if not self.properties["name"].value:
-            self.model_item.setText(self.name)
+            self.item_text = self.name
             return self.name
-        self.model_item.setText(self.properties["name"].value)
+        self.item_text = self.properties["name"].value
         return self.properties["name"].value
 
+    def write_attribs(self):
+        super().write_attribs()
+        flag_index = self.live_flag_index()
+        if flag_index is not None:
+            flag_index.add(self)
+
 
 class NodeConfigDependencyType(_NodeElement):
     """
@@ -1273,7 +1646,8 @@ class NodeConfigDependencyType(_NodeElement):
     """
     tag = "dependencyType"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigInstallPatterns,
             NodeConfigDefaultType
@@ -1282,14 +1656,12 @@ class NodeConfigDependencyType(_NodeElement):
             NodeConfigInstallPatterns,
             NodeConfigDefaultType
         )
-        self.init(
+        return _NodeSchema(
             "Dependency Type",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             required_children=required
         )
-        super()._init()
 
 
 class NodeConfigDefaultType(_NodeElement):
@@ -1298,18 +1670,17 @@ class NodeConfigDefaultType(_NodeElement):
     """
     tag = "defaultType"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("name", PropertyCombo("Type", ["Required", "Recommended", "Optional", "CouldBeUsable", "NotUsable"]))
         ])
-        self.init(
+        return _NodeSchema(
             "Default Type",
-            type(self).tag,
-            1,
+            cls.tag,
             properties=properties,
             sort_order="1"
         )
-        super()._init()
 
     def update_item_name(self):
         """
@@ -1318,9 +1689,9 @@ class NodeConfigDefaultType(_NodeElement):
         Override in subclasses as needed.
         """
         if not self.properties["name"].value:
-            self.model_item.setText(self.name)
+            self.item_text = self.name
             return self.name
-        self.model_item.setText(self.properties["name"].value)
+        self.item_text = self.properties["name"].value
         return self.properties["name"].value
 
 
@@ -1330,18 +1701,17 @@ class NodeConfigType(_NodeElement):
     """
     tag = "type"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         properties = OrderedDict([
             ("name", PropertyCombo("Type", ["Required", "Recommended", "Optional", "CouldBeUsable", "NotUsable"]))
         ])
-        self.init(
+        return _NodeSchema(
             "Type",
-            type(self).tag,
-            1,
+            cls.tag,
             properties=properties,
             sort_order="2"
         )
-        super()._init()
 
     def update_item_name(self):
         """
@@ -1350,9 +1720,9 @@ class NodeConfigType(_NodeElement):
         Override in subclasses as needed.
         """
         if not self.properties["name"].value:
-            self.model_item.setText(self.name)
+            self.item_text = self.name
             return self.name
-        self.model_item.setText(self.properties["name"].value)
+        self.item_text = self.properties["name"].value
         return self.properties["name"].value
 
 
@@ -1362,22 +1732,21 @@ class NodeConfigInstallPatterns(_NodeElement):
     """
     tag = "patterns"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigInstallPattern,
         )
         required = (
             NodeConfigInstallPattern,
         )
-        self.init(
+        return _NodeSchema(
             "Patterns",
-            type(self).tag,
-            1,
+            cls.tag,
             allowed_children=allowed_children,
             sort_order="2",
             required_children=required
         )
-        super()._init()
 
 
 class NodeConfigInstallPattern(_NodeElement):
@@ -1386,7 +1755,8 @@ class NodeConfigInstallPattern(_NodeElement):
     """
     tag = "pattern"
 
-    def _init(self):
+    @classmethod
+    def _schema(cls):
         allowed_children = (
             NodeConfigType,
             NodeConfigDependencies
@@ -1395,12 +1765,93 @@ class NodeConfigInstallPattern(_NodeElement):
             NodeConfigType,
             NodeConfigDependencies
         )
-        self.init(
+        return _NodeSchema(
             "Pattern",
-            type(self).tag,
-            0,
+            cls.tag,
             allowed_children=allowed_children,
             required_children=required,
             name_editable=True
         )
-        super()._init()
+
+
+def _max_occurs(declaration):
+    """
+    :param declaration: A schema element or compositor.
+    :return: Its maxOccurs, 0 for unbounded.
+    """
+    value = declaration.get("maxOccurs", "1")
+    return 0 if value == "unbounded" else int(value)
+
+
+def _schema_children(declaration, types, limit=1, children=None):
+    """
+    Collects the child elements declared under a complexType, through its compositors and extensions.
+
+    An element's maximum number of instances is its own maxOccurs if it has one, or else the product of the
+    maxOccurs of the compositors it is in. An element declared more than once keeps the largest one.
+
+    :param declaration: The xs:complexType (or compositor) to look under.
+    :param types: A dict with the schema's named complexTypes.
+    :param limit: Used in recursion. The number of times the declaration can repeat, 0 for unlimited.
+    :param children: Used in recursion. The dict the children are collected to.
+    :return: A dict mapping each child tag to a tuple with its complexType (None if simple) and its maximum number
+             of instances, 0 for unlimited.
+    """
+    if children is None:
+        children = {}
+    for child in declaration:
+        if child.tag == _XS + "element":
+            child_limit = _max_occurs(child) if "maxOccurs" in child.attrib else limit
+            child_type = types.get(child.get("type"), child.find(_XS + "complexType"))
+            if child.get("name") in children:
+                child_type, old_limit = children[child.get("name")]
+                child_limit = 0 if 0 in (old_limit, child_limit) else max(old_limit, child_limit)
+            children[child.get("name")] = (child_type, child_limit)
+        elif child.tag in (_XS + "sequence", _XS + "choice", _XS + "all"):
+            _schema_children(child, types, limit * _max_occurs(child), children)
+        elif child.tag == _XS + "complexContent":
+            _schema_children(child, types, limit, children)
+        elif child.tag == _XS + "extension":
+            if child.get("base") in types:
+                _schema_children(types[child.get("base")], types, limit, children)
+            _schema_children(child, types, limit, children)
+    return children
+
+
+def _load_allowed_instances(root_class, schema_path):
+    """
+    Reads how many of each node class are allowed under the same parent from the installer schema.
+
+    :param root_class: The node class of the root, declared as a top level element in the schema.
+    :param schema_path: The path to the schema file.
+    :return: A dict mapping each node class under the root to its maximum number of instances, 0 for unlimited.
+    """
+    schema = etree.parse(schema_path).getroot()
+    types = {declaration.get("name"): declaration for declaration in schema.iterfind(_XS + "complexType")}
+    root = schema.find(_XS + "element[@name='" + root_class.tag + "']")
+    if root is None:
+        raise AssertionError("The schema at " + schema_path + " has no " + root_class.tag + " element.")
+
+    allowed_instances = {}
+    visited = set()
+    pending = [(root_class, types.get(root.get("type"), root.find(_XS + "complexType")))]
+    while pending:
+        node_class, declaration = pending.pop()
+        if node_class in visited:
+            continue
+        visited.add(node_class)
+        children = {} if declaration is None else _schema_children(declaration, types)
+        for child_class in node_class._schema().allowed_children:
+            if child_class.tag not in children:
+                raise AssertionError("The schema at " + schema_path + " doesn't allow " + child_class.tag +
+                                     " under " + node_class.tag + ".")
+            child_type, limit = children[child_class.tag]
+            if allowed_instances.setdefault(child_class, limit) != limit:
+                raise AssertionError("The schema at " + schema_path + " allows a different number of " +
+                                     child_class.tag + " under each of its parents.")
+            pending.append((child_class, child_type))
+    return allowed_instances
+
+
+#: The allowed instances of each config node class, read once from the installer schema.
+_schema_allowed_instances = _load_allowed_instances(NodeConfigRoot, validator.validate.SCHEMA_FILE_PATH)
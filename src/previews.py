@@ -14,30 +14,202 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from os.path import join, sep, normpath
-from queue import Queue
+from os.path import normpath
+from collections import OrderedDict
+from hashlib import sha1
+from itertools import count
+from threading import Condition
+from time import monotonic
 from PyQt5.QtCore import QThread
-from lxml.etree import XML, tostring, Comment
+from lxml.etree import XML, tostring
 from lxml.objectify import deannotate
-from pygments import highlight
-from pygments.formatters.html import HtmlFormatter
-from pygments.lexers.html import XmlLexer
+from .io import package_index, _index_path
+from .exceptions import MissingFileError
+
+
+class LatestQueue(object):
+    """
+    A queue that only keeps the newest item - putting an item replaces the one waiting to be taken, if any.
+
+    Bursts of items can be debounced: once an item is waiting, get waits until no new item arrived for *debounce*
+    seconds, but never holds an item back for more than *max_delay* seconds.
+
+    :param debounce: Optional. The quiet time to wait for before handing out an item, in seconds.
+    :param max_delay: Optional. The longest a burst of items can hold back the newest one, in seconds.
+    """
+    _empty = object()
+
+    def __init__(self, debounce=0.0, max_delay=0.25):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._condition = Condition()
+        self._item = self._empty
+        self._first_put = 0.0
+        self._last_put = 0.0
+
+    def put(self, item):
+        """
+        Replaces the waiting item with *item*.
+
+        :param item: The new item.
+        """
+        with self._condition:
+            self._last_put = monotonic()
+            if self._item is self._empty:
+                self._first_put = self._last_put
+            self._item = item
+            self._condition.notify()
+
+    def pending(self):
+        """
+        :return: True if there's an item waiting to be taken - anything done for the previous one is already stale.
+        """
+        return self._item is not self._empty
+
+    def get(self):
+        """
+        Waits for an item and takes it.
+
+        :return: The newest item.
+        """
+        with self._condition:
+            while self._item is self._empty:
+                self._condition.wait()
+            while True:
+                remaining = min(self._last_put + self.debounce, self._first_put + self.max_delay) - monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            item, self._item = self._item, self._empty
+            return item
+
+
+class _RenderCancelled(Exception):
+    """
+    Raised by the preview workers to drop a render once a newer element is waiting.
+    """
+    pass
+
+
+class PreviewSnapshot(object):
+    """
+    A read-only copy of everything the previews need from an element, taken on the gui thread.
+
+    The preview workers only ever read snapshots, never the live node tree the gui thread keeps changing. The code
+    preview shows the element's whole document, but the document is only serialized whole when it may have changed
+    as a whole - a new *revision* of it. Otherwise the snapshot keeps the previous snapshot's document and adds
+    *patches* to it: the path and xml of each subtree changed since, merged with the previous snapshot's patches, so
+    only what changed is serialized. The patches are cumulative, so a worker that missed the snapshots in between can
+    still rebuild the document from the revision's xml, and once they grow past a quarter of it the document is
+    serialized whole again. The workers keep the document's tree up to date with a PatchedDocument, and the install
+    step is read from it at *step_path*.
+
+    :param element: The element to preview or None.
+    :param info_root: The root element of the info.xml file or None.
+    :param config_root: The root element of the moduleconfig.xml file or None.
+    :param changed: Optional. The nodes that changed, along with their subtrees, since the previous snapshot. None if
+                    the element's whole document may have changed.
+    :param previous: Optional. The previous snapshot.
+    """
+    __slots__ = ("document", "revision", "patches", "path", "step_path", "state", "info")
+
+    STEP = "step"
+    INVALID = "invalid"
+    MISSING = "missing"
+
+    _revisions = count()
+
+    def __init__(self, element, info_root, config_root, changed=None, previous=None):
+        self.document = None
+        self.revision = None
+        self.patches = ()
+        self.path = None
+        self.step_path = None
+        self.state = self.INVALID
+        self.info = ("", "", "", "")
+
+        if element is None:
+            return
+        root = element.getroottree().getroot()
+        self._take_document(root, changed, previous)
+        self.path = tuple(_index_path(element, root))
+
+        if element.tag == "installStep":
+            step = element
+        else:
+            step = next(element.iterancestors("installStep"), None)
+            if step is None:
+                if config_root is None or config_root.find(".//installStep") is None:
+                    self.state = self.MISSING
+                return
+
+        distance = 0
+        node = element
+        while node is not step:
+            node = node.getparent()
+            distance += 1
+        self.step_path = self.path[:len(self.path) - distance]
+        self.state = self.STEP
+        if info_root is not None:
+            self.info = tuple(info_root.findtext(tag, "") for tag in ("Name", "Author", "Version", "Website"))
+
+    def _take_document(self, root, changed, previous):
+        """
+        Sets the snapshot's document, revision and patches.
+
+        :param root: The root of the element's document.
+        :param changed: The nodes changed since the previous snapshot or None.
+        :param previous: The previous snapshot or None.
+        """
+        if changed is None or previous is None or previous.document is None or root in changed:
+            self._take_revision(root)
+            return
+        changed = {node for node in changed if root in node.iterancestors()}
+        self.document = previous.document
+        self.revision = previous.revision
+        if not changed:
+            self.patches = previous.patches
+            return
+
+        paths = {tuple(_index_path(node, root)) for node in changed}
+        paths.update([old_path for old_path, _ in previous.patches
+                      if any(old_path == path[:len(old_path)] for path in paths)])
+        paths = [path for path in paths if not any(other == path[:len(other)] != path for other in paths)]
+        patches = {path: xml for path, xml in previous.patches if not any(path[:len(new)] == new for new in paths)}
+        for path in paths:
+            node = root
+            for index in path:
+                node = node[index]
+            patches[path] = tostring(node, with_tail=False)
+        if sum(len(xml) for xml in patches.values()) > len(self.document) // 4:
+            self._take_revision(root)
+            return
+        self.patches = tuple(sorted(patches.items()))
+
+    def _take_revision(self, root):
+        self.document = tostring(root)
+        self.revision = next(self._revisions)
+        self.patches = ()
 
 
 class PreviewDispatcherThread(QThread):
     """
-    Thread used to dispatch the element to each preview worker thread.
+    Thread used to dispatch the snapshots to each preview worker thread.
+
+    Only the newest snapshot is ever rendered - the queues are LatestQueue's, so the snapshots queued while a render
+    is running replace each other and the running render is dropped as soon as a newer snapshot is waiting. Bursts of
+    snapshots are coalesced by the main queue's debounce, so it should be created with one (the gui uses 50ms, with
+    a max_delay of 250ms).
 
-    :param queue: The main queue containing the elements to process.
-    :param mo_signal: The signal to pass to the MO preview worker, updates the MO preview.
-    :param nmm_signal: The signal to pass to the NMM preview worker, updates the NMM preview.
+    :param queue: The main LatestQueue containing the PreviewSnapshot's to process.
     :param code_signal: The signal to pass to the code preview worker, updates the code preview.
+    :param kwargs: The arguments to pass to the gui preview worker.
     """
     def __init__(self, queue, code_signal, **kwargs):
         super().__init__()
         self.queue = queue
-        self.gui_queue = Queue()
-        self.code_queue = Queue()
+        self.gui_queue = LatestQueue()
+        self.code_queue = LatestQueue()
 
         self.code_thread = PreviewCodeWorker(self.code_queue, code_signal)
         self.code_thread.start()
@@ -46,55 +218,234 @@ class PreviewDispatcherThread(QThread):
 
     def run(self):
         while True:
-            # wait for next element
-            element = self.queue.get()
-
-            if element is not None:
-                element.write_attribs()
-                element.load_metadata()
-                element.sort()
+            # wait for next snapshot
+            snapshot = self.queue.get()
 
             # dispatch to every queue
-            self.gui_queue.put(element)
-            self.code_queue.put(element)
+            self.gui_queue.put(snapshot)
+            self.code_queue.put(snapshot)
+
+
+class PatchedDocument(object):
+    """
+    A preview worker's copy of the previewed document's tree, brought up to date with each snapshot's patches.
+
+    Only a new revision of the document is parsed whole - otherwise only the subtrees patched since the last update
+    are parsed, and replace the old ones in place.
+    """
+    __slots__ = ("revision", "tree", "patches")
+
+    def __init__(self):
+        self.revision = None
+        self.tree = None
+        self.patches = {}
+
+    def update(self, xml, revision=None, patches=()):
+        """
+        :param xml: The xml of the document's revision.
+        :param revision: Optional. The document's revision, None if it's not to be patched later.
+        :param patches: Optional. The paths and xml of the subtrees changed since the revision.
+        :return: The document's root element. It's changed in place by the next update.
+        """
+        if revision is None or revision != self.revision:
+            self.tree = self.parse(xml)
+            self.revision = revision
+            self.patches = {}
+        applied, self.patches = self.patches, dict(patches)
+        for path, patch in patches:
+            if applied.get(path) is patch:
+                continue
+            old = self.element(path)
+            new = self.parse(patch)
+            new.tail = old.tail
+            old.getparent().replace(old, new)
+        return self.tree
+
+    def element(self, path):
+        """
+        :param path: The child indexes that lead from the root to the element.
+        :return: The element.
+        """
+        element = self.tree
+        for index in path:
+            element = element[index]
+        return element
+
+    @staticmethod
+    def parse(xml):
+        """
+        :param xml: The xml of an element.
+        :return: The parsed element, without any annotations.
+        """
+        element = XML(xml)
+        deannotate(element, cleanup_namespaces=True)
+        return element
+
+
+class CodeDocument(object):
+    """
+    The pretty printed code of a whole document, along with where each of its elements is written.
+
+    :param element: The document's root element. It isn't kept, so it can be changed afterwards.
+    """
+    __slots__ = ("lines", "tree", "size")
+
+    def __init__(self, element):
+        code = tostring(element, encoding="Unicode", pretty_print=True, xml_declaration=False)
+        self.lines = code.splitlines()
+        self.tree = XML(code)
+        self.size = len(code)
+
+    def line_range(self, path):
+        """
+        An element ends right before its next sibling starts or, if it's the last child, right before its parent
+        ends - so only the elements on the way from the root are ever looked at.
+
+        :param path: The child indexes that lead from the root to the element.
+        :return: The numbers of the first and last lines of the element, starting at 0. None if there's no such
+                 element.
+        """
+        element = self.tree
+        end = len(self.lines) - 1
+        try:
+            for index in path:
+                element = element[index]
+                sibling = element.getnext()
+                end = sibling.sourceline - 2 if sibling is not None else end - 1
+        except IndexError:
+            return None
+        return element.sourceline - 1, end
+
+
+class CodePreviewUpdate(object):
+    """
+    A change to the code view - the lines to replace, if any, and the lines of the selected element.
+
+    :param start: The first line to replace.
+    :param end: The line after the last line to replace.
+    :param lines: The new lines or None if the text didn't change.
+    :param selection: The first and last lines of the selected element or None.
+    """
+    __slots__ = ("start", "end", "lines", "selection")
+
+    def __init__(self, start, end, lines, selection):
+        self.start = start
+        self.end = end
+        self.lines = lines
+        self.selection = selection
 
 
 class PreviewCodeWorker(QThread):
     """
-    Takes a xml element, writes the code, highlights it with inline css and returns the html code.
+    Takes a snapshot of a xml element and returns the changes needed to show it in the code view.
+
+    The view shows the element's whole document, kept up to date by a PatchedDocument. The document is only written
+    again when it changed, and only the lines that changed since the last one are sent - otherwise
+    the update is just the element's lines, looked up from the rendered document.
 
-    :param queue: The queue that receives the elements to be processed.
-    :param return_signal: The signal used to send the return code through.
-    :return: The highlighted element html code.
+    The rendered documents are cached by the hash of their xml and patches, least recently used first, so going back
+    to a document that hasn't changed since it was last shown doesn't write its code again.
+
+    :param queue: The queue that receives the snapshots to be processed.
+    :param return_signal: The signal used to send the CodePreviewUpdate's through.
+    :param cache_size: Optional. The maximum total length of the cached code.
     """
-    def __init__(self, queue, return_signal):
+    def __init__(self, queue, return_signal, cache_size=16 * 2 ** 20):
         super().__init__()
         self.queue = queue
         self.return_signal = return_signal
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cached_size = 0
+        self.shown = None
+        self.document = PatchedDocument()
+
+    def cache_document(self, key, document):
+        """
+        Caches the rendered document and evicts the least recently used entries until the cache fits its size.
+
+        :param key: The hash of the document's xml.
+        :param document: The CodeDocument.
+        """
+        if document.size > self.cache_size:
+            return
+        self.cache[key] = document
+        self.cached_size += document.size
+        while self.cached_size > self.cache_size:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_size -= evicted.size
+
+    def render(self, xml, revision=None, patches=()):
+        """
+        :param xml: The xml of the document's revision.
+        :param revision: Optional. The document's revision, None if it's not to be patched later.
+        :param patches: Optional. The paths and xml of the subtrees changed since the revision.
+        :return: The document's CodeDocument, from the cache if possible.
+        """
+        key = sha1(xml)
+        for path, patch in patches:
+            key.update(repr(path).encode("utf-8"))
+            key.update(patch)
+        key = key.digest()
+        document = self.cache.get(key)
+        if document is not None:
+            self.cache.move_to_end(key)
+            return document
+
+        document = CodeDocument(self.document.update(xml, revision, patches))
+        self.cache_document(key, document)
+        return document
+
+    def update(self, document, path):
+        """
+        Shows *document* instead of the document shown until now and selects the element at *path*.
+
+        :param document: The CodeDocument to show or None to clear the view.
+        :param path: The child indexes that lead from the root to the selected element.
+        :return: The CodePreviewUpdate with the lines that changed.
+        """
+        old_lines = self.shown.lines if self.shown is not None else []
+        new_lines = document.lines if document is not None else []
+        self.shown = document
+
+        common = min(len(old_lines), len(new_lines))
+        prefix = 0
+        while prefix < common and old_lines[prefix] == new_lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < common - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+            suffix += 1
+
+        selection = document.line_range(path) if document is not None else None
+        if prefix == len(old_lines) == len(new_lines):
+            return CodePreviewUpdate(0, 0, None, selection)
+        return CodePreviewUpdate(
+            prefix, len(old_lines) - suffix, new_lines[prefix:len(new_lines) - suffix], selection
+        )
 
     def run(self):
         while True:
-            # wait for next element
-            element = self.queue.get()
-
-            if element is None or element.tag is Comment:
-                self.return_signal.emit("")
-                continue
-
-            element = XML(tostring(element))
-
-            # process the element
-            deannotate(element, cleanup_namespaces=True)
-            code = tostring(element, encoding="Unicode", pretty_print=True, xml_declaration=False)
-            self.return_signal.emit(highlight(code, XmlLexer(), HtmlFormatter(
-                noclasses=True, style="autumn", linenos="table"
-            )))
+            # wait for next snapshot
+            snapshot = self.queue.get()
+
+            if snapshot.path is None:
+                self.return_signal.emit(self.update(None, None))
+            elif snapshot.document is not None:
+                document = self.render(snapshot.document, snapshot.revision, snapshot.patches)
+                if self.queue.pending():
+                    continue
+                self.return_signal.emit(self.update(document, snapshot.path))
+            elif self.shown is not None:
+                self.return_signal.emit(
+                    CodePreviewUpdate(0, 0, None, self.shown.line_range(snapshot.path))
+                )
 
 
 class PreviewGuiWorker(QThread):
     class InstallStepData(object):
-        def __init__(self, name):
+        def __init__(self, name, package=None):
             self.name = name
+            self.package = package
             self.group_list = []
 
         def set_group_list(self, group_list):
@@ -132,8 +483,8 @@ class PreviewGuiWorker(QThread):
             self.type = plugin_type
 
     class FileData(object):
-        def __init__(self, abs_source, rel_source, destination, priority, always_install, install_usable):
-            self.abs_source = abs_source
+        def __init__(self, source, rel_source, destination, priority, always_install, install_usable):
+            self.source = source
             self.rel_source = rel_source
             self.destination = destination
             self.priority = priority
@@ -148,139 +499,159 @@ class PreviewGuiWorker(QThread):
             self.label = label
             self.value = value
 
-    def __init__(self, queue, **kwargs):
+    _step_tags = ("group", "plugins", "plugin", "description", "image", "file", "folder", "flag", "type",
+                  "defaultType")
+
+    def __init__(self, queue, step_cache_size=32, **kwargs):
         super().__init__()
         self.queue = queue
         self.kwargs = kwargs
+        self.step_cache_size = step_cache_size
+        self.step_cache = OrderedDict()
+        self.document = PatchedDocument()
+
+    @staticmethod
+    def resolve_source(package, source):
+        """
+        :param package: The package's PackageIndex or ArchiveIndex.
+        :param source: A path relative to the package, as written in the installer.
+        :return: The real path to *source* relative to the package, matched case-insensitively against the package's
+                 files (or the archive's members) if it exists. The files are read through *package* from then on.
+        """
+        try:
+            return package.resolve(source)
+        except MissingFileError:
+            return normpath(source.replace("\\", "/"))
+
+    def step_data(self, element):
+        """
+        Builds the data the preview needs to show an install step, in a single pass over the step's subtree.
+
+        :param element: The installStep element.
+        :return: The step's InstallStepData.
+        :raise _RenderCancelled: If a newer element is waiting to be previewed.
+        """
+        package = package_index(self.kwargs["package_path"]())
+        step_data = self.InstallStepData(element.get("name"), package)
+        group_data_list = []
+        group_data = None
+        plugin_data = None
+        plugins_order = {}
+        plugin_types = {}
+
+        for elem in element.iter(*self._step_tags):
+            tag = elem.tag
+            if tag == "group":
+                group_data = self.GroupData(elem.get("name"), elem.get("type"))
+                group_data_list.append(group_data)
+                plugin_data = None
+            elif tag == "plugins":
+                plugins_order[group_data] = elem.get("order")
+            elif tag == "plugin":
+                if self.queue.pending():
+                    raise _RenderCancelled
+                plugin_data = self.PluginData(elem.get("name"), "", "", [], [], [], None)
+                group_data.plugin_list.append(plugin_data)
+                plugin_types[plugin_data] = [None, None]
+            elif tag == "description":
+                plugin_data.description = elem.text
+            elif tag == "image":
+                image_ = elem.get("path")
+                plugin_data.image_path = self.resolve_source(package, image_) if image_ else ""
+            elif tag == "file" or tag == "folder":
+                data_class = self.FileData if tag == "file" else self.FolderData
+                (plugin_data.file_list if tag == "file" else plugin_data.folder_list).append(
+                    data_class(
+                        self.resolve_source(package, elem.get("source")),
+                        elem.get("source"),
+                        normpath(elem.get("destination").replace("\\", "/")),
+                        elem.get("priority"),
+                        elem.get("alwaysInstall"),
+                        elem.get("installIfUsable")
+                    )
+                )
+            elif tag == "flag":
+                plugin_data.flag_list.append(self.FlagData(elem.get("name"), elem.text))
+            elif tag == "type":
+                if elem.getparent().tag == "typeDescriptor":
+                    plugin_types[plugin_data][0] = elem.get("name")
+            elif tag == "defaultType":
+                plugin_types[plugin_data][1] = elem.get("name")
+
+        for plugin_data, (type_, default_type) in plugin_types.items():
+            plugin_data.type = type_ or default_type or "Required"
+        for group_data in group_data_list:
+            if plugins_order.get(group_data) == "Ascending":
+                group_data.sort_ascending()
+            elif plugins_order.get(group_data) == "Descending":
+                group_data.sort_descending()
+
+        opt_group_elem = element.find("optionalFileGroups")
+        if opt_group_elem is not None:
+            step_data.set_group_list(group_data_list)
+            if opt_group_elem.get("order") == "Ascending":
+                step_data.sort_ascending()
+            elif opt_group_elem.get("order") == "Descending":
+                step_data.sort_descending()
+
+        return step_data
+
+    def cached_step_data(self, step, revision, step_path, patches=()):
+        """
+        Each step is cached once per document revision, along with the patches to its subtree it was built with -
+        the patches to the step, the nodes under it or its ancestors. Patches elsewhere in the document leave it
+        cached, so the step is only looked at again when a patch touches it.
+
+        :param step: The step's element.
+        :param revision: The revision of the step's document.
+        :param step_path: The child indexes that lead from the document's root to the step.
+        :param patches: Optional. The paths and xml of the document's subtrees patched since the revision.
+        :return: The step's InstallStepData, from the cache if neither the step nor the package changed since.
+        :raise _RenderCancelled: If a newer element is waiting to be previewed.
+        """
+        step_patches = tuple(
+            (path, xml) for path, xml in patches
+            if path[:len(step_path)] == step_path or step_path[:len(path)] == path
+        )
+        key = (revision, step_path, self.kwargs["package_path"]())
+        cached = self.step_cache.get(key)
+        if cached is not None and cached[0] == step_patches:
+            self.step_cache.move_to_end(key)
+            return cached[1]
+        step_data = self.step_data(step)
+        self.step_cache[key] = (step_patches, step_data)
+        self.step_cache.move_to_end(key)
+        if len(self.step_cache) > self.step_cache_size:
+            self.step_cache.popitem(last=False)
+        return step_data
 
     def run(self):
+        shown = None
         while True:
-            # wait for next element
-            element = self.queue.get()
+            # wait for next snapshot
+            snapshot = self.queue.get()
 
-            if element is None:
-                self.kwargs["gui_worker"].invalid_node_signal.emit()
-                continue
-            elif element.tag == "installStep":
-                pass
-            elif [elem for elem in element.iterancestors() if elem.tag == "installStep"]:
-                element = [elem for elem in element.iterancestors() if elem.tag == "installStep"][0]
-            elif not [elem for elem in self.kwargs["config_root"]().iter() if elem.tag == "installStep"]:
+            if snapshot.state == PreviewSnapshot.MISSING:
+                shown = None
                 self.kwargs["gui_worker"].missing_node_signal.emit()
                 continue
-            else:
+            elif snapshot.state == PreviewSnapshot.INVALID:
+                shown = None
                 self.kwargs["gui_worker"].invalid_node_signal.emit()
                 continue
 
+            try:
+                self.document.update(snapshot.document, snapshot.revision, snapshot.patches)
+                step_data = self.cached_step_data(
+                    self.document.element(snapshot.step_path), snapshot.revision, snapshot.step_path, snapshot.patches
+                )
+            except _RenderCancelled:
+                continue
+            if shown == (step_data, snapshot.info):
+                continue
+            shown = (step_data, snapshot.info)
+
             self.kwargs["gui_worker"].clear_tab_signal.emit()
             self.kwargs["gui_worker"].clear_ui_signal.emit()
-            info_name = self.kwargs["info_root"]().find("Name").text \
-                if self.kwargs["info_root"]().find("Name") is not None else ""
-            info_author = self.kwargs["info_root"]().find("Author").text \
-                if self.kwargs["info_root"]().find("Author") is not None else ""
-            info_version = self.kwargs["info_root"]().find("Version").text \
-                if self.kwargs["info_root"]().find("Version") is not None else ""
-            info_website = self.kwargs["info_root"]().find("Website").text \
-                if self.kwargs["info_root"]().find("Website") is not None else ""
-            self.kwargs["gui_worker"].set_labels_signal.emit(info_name, info_author, info_version, info_website)
-
-            step_data = self.InstallStepData(element.get("name"))
-            opt_group_elem = element.find("optionalFileGroups")
-            if opt_group_elem is not None:
-                group_data_list = []
-
-                for group_elem in opt_group_elem.findall("group"):
-                    group_data = self.GroupData(group_elem.get("name"), group_elem.get("type"))
-
-                    plugins_elem = group_elem.find("plugins")
-                    if plugins_elem is not None:
-                        plugin_data_list = []
-
-                        for plugin_elem in plugins_elem.findall("plugin"):
-                            name_ = plugin_elem.get("name")
-                            description_ = plugin_elem.find("description").text \
-                                if plugin_elem.find("description") is not None else ""
-                            image_ = plugin_elem.find("image").get("path") \
-                                if plugin_elem.find("image") is not None else ""
-                            if image_:
-                                # normalize path, for some reason normpath wasn't working
-                                image_ = join(self.kwargs["package_path"](), image_).replace("\\", "/")
-                                image_ = image_.replace("/", sep)
-
-                            file_data_list = []
-                            for file_elem in plugin_elem.findall("files/file"):
-                                file_data_list.append(
-                                    self.FileData(
-                                        normpath(join(
-                                            self.kwargs["package_path"](),
-                                            file_elem.get("source").replace("\\", "/")
-                                        )),
-                                        file_elem.get("source"),
-                                        normpath(file_elem.get("destination").replace("\\", "/")),
-                                        file_elem.get("priority"),
-                                        file_elem.get("alwaysInstall"),
-                                        file_elem.get("installIfUsable")
-                                    )
-                                )
-
-                            folder_data_list = []
-                            for folder_elem in plugin_elem.findall("files/folder"):
-                                folder_data_list.append(
-                                    self.FolderData(
-                                        normpath(join(
-                                            self.kwargs["package_path"](),
-                                            folder_elem.get("source").replace("\\", "/")
-                                        )),
-                                        folder_elem.get("source"),
-                                        normpath(folder_elem.get("destination").replace("\\", "/")),
-                                        folder_elem.get("priority"),
-                                        folder_elem.get("alwaysInstall"),
-                                        folder_elem.get("installIfUsable")
-                                    )
-                                )
-
-                            flag_data_list = []
-                            for flag_elem in plugin_elem.findall("conditionFlags/flag"):
-                                flag_data_list.append(
-                                    self.FlagData(
-                                        flag_elem.get("name"),
-                                        flag_elem.text
-                                    )
-                                )
-
-                            type_elem = plugin_elem.find("typeDescriptor/type")
-                            default_type_elem = plugin_elem.find("typeDescriptor/dependencyType/defaultType")
-                            if type_elem is not None:
-                                type_ = type_elem.get("name")
-                            elif default_type_elem is not None:
-                                type_ = default_type_elem.get("name")
-                            else:
-                                type_ = "Required"
-
-                            plugin_data_list.append(
-                                self.PluginData(
-                                    name_,
-                                    description_,
-                                    image_,
-                                    file_data_list,
-                                    folder_data_list,
-                                    flag_data_list,
-                                    type_
-                                )
-                            )
-
-                        group_data.set_plugin_list(plugin_data_list)
-                        if plugins_elem.get("order") == "Ascending":
-                            group_data.sort_ascending()
-                        elif plugins_elem.get("order") == "Descending":
-                            group_data.sort_descending()
-
-                    group_data_list.append(group_data)
-
-                step_data.set_group_list(group_data_list)
-                if opt_group_elem.get("order") == "Ascending":
-                    step_data.sort_ascending()
-                elif opt_group_elem.get("order") == "Descending":
-                    step_data.sort_descending()
-
+            self.kwargs["gui_worker"].set_labels_signal.emit(*snapshot.info)
             self.kwargs["gui_worker"].create_page_signal.emit(step_data)
@@ -14,10 +14,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections.abc import Mapping
+
 
 class _PropertyBase(object):
     """
     Base class for the properties. Shouldn't be used directly.
+
+    A property only describes a value and is shared by every node of the same class - the values themselves are kept
+    by each node's PropertyValues.
     """
     def __init__(self, name, values, editable=True):
         """
@@ -31,17 +36,17 @@ class _PropertyBase(object):
         self.name = name
         self.editable = editable
 
-        self.value = ""
+        self.default = ""
         self.values = values
 
-    def set_value(self, value):
+    def accepts(self, value):
         """
-        Method used to set the property's value. Sub-classes should validate the value before setting it.
+        Checks if the given value can be set. Sub-classes should validate the value here.
 
-        :param value: The value to be validated and set.
+        :param value: The value to be validated.
+        :return: True if the value can be set, False otherwise.
         """
-        if self.editable:
-            self.value = value
+        return self.editable
 
 
 class PropertyText(_PropertyBase):
@@ -50,7 +55,7 @@ class PropertyText(_PropertyBase):
     """
     def __init__(self, name, text="", editable=True):
         super().__init__(name, (), editable)
-        self.value = text
+        self.default = text
 
 
 class PropertyCombo(_PropertyBase):
@@ -59,11 +64,10 @@ class PropertyCombo(_PropertyBase):
     """
     def __init__(self, name, values, editable=True):
         super().__init__(name, values, editable)
-        self.value = values[0]
+        self.default = values[0]
 
-    def set_value(self, value):
-        if value in self.values:
-            super().set_value(value)
+    def accepts(self, value):
+        return value in self.values and super().accepts(value)
 
 
 class PropertyInt(_PropertyBase):
@@ -83,11 +87,10 @@ class PropertyInt(_PropertyBase):
         values = range(min_value, max_value + 1)
 
         super().__init__(name, values, editable)
-        self.value = default
+        self.default = default
 
-    def set_value(self, value):
-        if value in self.values:
-            super().set_value(value)
+    def accepts(self, value):
+        return value in self.values and super().accepts(value)
 
 
 class PropertyFolder(PropertyText):
@@ -130,3 +133,87 @@ class PropertyHTML(PropertyText):
     A property that allows html text. Used for plugin descriptions.
     """
     pass
+
+
+class BoundProperty(object):
+    """
+    A property together with a node's value for it. Any attribute not found here is read from the property itself.
+    """
+    __slots__ = ("prop", "_values", "_index", "__weakref__")
+
+    def __init__(self, prop, values, index):
+        """
+        :param prop: The shared property.
+        :param values: The node's list of property values.
+        :param index: The index of this property's value in *values*.
+        """
+        self.prop = prop
+        self._values = values
+        self._index = index
+
+    def __getattr__(self, name):
+        return getattr(self.prop, name)
+
+    @property
+    def value(self):
+        """
+        The node's value for this property. Setting it directly skips the property's validation.
+        """
+        return self._values[self._index]
+
+    @value.setter
+    def value(self, value):
+        self._values[self._index] = value
+
+    def set_value(self, value):
+        """
+        Method used to set the property's value. The value is only set if the property accepts it.
+
+        :param value: The value to be validated and set.
+        """
+        if self.prop.accepts(value):
+            self._values[self._index] = value
+
+
+class PropertyValues(Mapping):
+    """
+    A node's property values, kept in a single list. Maps each property key to a BoundProperty, in the order the
+    properties were given.
+    """
+    __slots__ = ("_properties", "_indexes", "_values")
+
+    def __init__(self, properties, indexes):
+        """
+        :param properties: A tuple of (key, property) pairs, usually shared with the other nodes of the same class.
+        :param indexes: A dict mapping each key to its index in *properties*, usually shared as well.
+        """
+        self._properties = properties
+        self._indexes = indexes
+        self._values = [prop.default for _, prop in properties]
+
+    def __getitem__(self, key):
+        index = self._indexes[key]
+        return BoundProperty(self._properties[index][1], self._values, index)
+
+    def __contains__(self, key):
+        return key in self._indexes
+
+    def __iter__(self):
+        return (key for key, _ in self._properties)
+
+    def __len__(self):
+        return len(self._properties)
+
+    def dump(self):
+        """
+        :return: A list with the node's value for each property, in order.
+        """
+        return list(self._values)
+
+    def load(self, values):
+        """
+        Sets the node's value for each property from a list made by dump. The values aren't validated.
+
+        :param values: The list of values.
+        """
+        self._values[:] = values
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Daniel Nunes
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from os import listdir, makedirs, replace, remove, stat, utime
+from os.path import join, normpath
+from hashlib import sha1
+from json import dumps, loads
+from tempfile import mkstemp
+from zlib import compress, decompress
+from lxml.etree import XMLParser, Comment, fromstring, tostring
+from . import __version__
+from .io import _check_file, _module_lookup, is_archive
+from .exceptions import MissingFileError
+
+
+class SnapshotCache(object):
+    """
+    An on-disk cache of the installers as they are right after being imported.
+
+    Each snapshot holds both files already sorted, validated and with their hidden nodes restored along with each
+    node's state (its property values, display name, sort order and decoded metadata), so loading one only has to
+    parse the xml and hand each node its state back. Snapshots are stored as compressed json and are keyed by the
+    package path and both files' (or the zip archive's) modification times and sizes, and are evicted least
+    recently used first once there are more than *max_entries* of them or they take more than *max_size* bytes.
+
+    The cache is best-effort - a snapshot that can't be read or written is simply treated as missing.
+
+    :param folder: The folder to keep the snapshots in.
+    :param max_entries: Optional. The maximum number of snapshots to keep.
+    :param max_size: Optional. The maximum total size of the snapshots, in bytes.
+    """
+    def __init__(self, folder, max_entries=5, max_size=64 * 2 ** 20):
+        self.folder = folder
+        self.max_entries = max_entries
+        self.max_size = max_size
+
+    def _path(self, package_path):
+        return join(self.folder, sha1(normpath(package_path).encode("utf-8")).hexdigest() + ".snapshot")
+
+    @staticmethod
+    def _key(package_path):
+        """
+        :param package_path: The package where the installer is.
+        :return: The snapshot key for the installer at *package_path* or None if any file is missing.
+        """
+        package_path = normpath(package_path)
+        key = [__version__, package_path]
+        try:
+            if is_archive(package_path):
+                archive_stat = stat(package_path)
+                return tuple(key + [archive_stat.st_mtime_ns, archive_stat.st_size])
+            for file_ in ("Info.xml", "ModuleConfig.xml"):
+                file_stat = stat(join(package_path, _check_file(package_path, join("fomod", file_))))
+                key.extend((file_stat.st_mtime_ns, file_stat.st_size))
+        except (MissingFileError, OSError):
+            return None
+        return tuple(key)
+
+    @staticmethod
+    def _dump_root(root):
+        """
+        :param root: An imported root element.
+        :return: A dict with the root's xml, the state of every node in document order and the document order indexes
+            of the hidden nodes.
+        """
+        elements = list(root.iter())
+        indexes = {element: index for index, element in enumerate(elements)}
+        return {
+            "xml": tostring(root, encoding="unicode"),
+            "states": [element.dump_state() for element in elements],
+            "hidden": [indexes[node] for element in elements for node in getattr(element, "hidden_children", ())],
+        }
+
+    @staticmethod
+    def _load_root(snapshot):
+        """
+        Rebuilds an imported root from its snapshot.
+
+        Nothing is sorted, validated or copied and no node reads its attributes or metadata - each gets its saved
+        state back and its children are attached to its node tree entry, the same as during an import.
+
+        :param snapshot: The root's snapshot, as made by _dump_root.
+        :return: The root element.
+        """
+        parser = XMLParser(remove_pis=True, remove_blank_text=True)
+        parser.set_element_class_lookup(_module_lookup)
+        root = fromstring(snapshot["xml"], parser)
+        elements = list(root.iter())  # keeps every node alive until its parent attaches it
+        if len(elements) != len(snapshot["states"]):
+            raise ValueError("The snapshot doesn't match its xml.")
+
+        for element, state in zip(elements, snapshot["states"]):
+            element.load_state(state)
+        for index in snapshot["hidden"]:
+            elements[index].set_hidden(True)
+
+        for element in elements:
+            if element.tag is Comment:
+                continue
+            for child in element:
+                if child.tag is Comment and child.text.startswith("<designer.metadata.do.not.edit>"):
+                    element.pin_child(child)
+                else:
+                    element.attach_child_item(child)
+        return root
+
+    def load(self, package_path):
+        """
+        Loads the snapshot of the installer at *package_path* if there's an up-to-date one.
+
+        :param package_path: The package where the installer is.
+        :return: The root elements of each installer file. A tuple of None, None if there's no up-to-date snapshot.
+        """
+        key = self._key(package_path)
+        if key is None:
+            return None, None
+
+        path = self._path(package_path)
+        try:
+            with open(path, "rb") as file_:
+                snapshot = loads(decompress(file_.read()).decode("utf-8"))
+            if snapshot["key"] != list(key):
+                remove(path)
+                return None, None
+            utime(path)
+            return self._load_root(snapshot["info"]), self._load_root(snapshot["config"])
+        except Exception:
+            return None, None
+
+    def store(self, package_path, info_root, config_root):
+        """
+        Stores a snapshot of the freshly imported installer at *package_path* and evicts the old ones if needed.
+
+        :param package_path: The package where the installer is.
+        :param info_root: The imported root element of the info.xml file.
+        :param config_root: The imported root element of the moduleconfig.xml file.
+        """
+        key = self._key(package_path)
+        if key is None:
+            return
+
+        data = compress(dumps(
+            {"key": key, "info": self._dump_root(info_root), "config": self._dump_root(config_root)},
+            separators=(",", ":")
+        ).encode("utf-8"))
+        try:
+            makedirs(self.folder, exist_ok=True)
+            temp_fd, temp_path = mkstemp(suffix=".tmp", dir=self.folder)
+            try:
+                with open(temp_fd, "wb") as temp_file:
+                    temp_file.write(data)
+                replace(temp_path, self._path(package_path))
+            except BaseException:
+                remove(temp_path)
+                raise
+            self._evict()
+        except OSError:
+            pass
+
+    def _evict(self):
+        """
+        Removes the least recently used snapshots until the cache fits its limits.
+        """
+        snapshots = []
+        for name in listdir(self.folder):
+            if name.endswith(".snapshot"):
+                file_stat = stat(join(self.folder, name))
+                snapshots.append((file_stat.st_mtime_ns, file_stat.st_size, name))
+        snapshots.sort(reverse=True)
+
+        total = 0
+        for index, (_, size, name) in enumerate(snapshots):
+            total += size
+            if index >= self.max_entries or total > self.max_size:
+                remove(join(self.folder, name))
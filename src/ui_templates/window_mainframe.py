@@ -37,11 +37,6 @@ class Ui_MainWindow(object):
         self.label.setAlignment(QtCore.Qt.AlignCenter)
         self.label.setObjectName("label")
         self.verticalLayout.addWidget(self.label)
-        self.xml_code_browser = QtWidgets.QTextBrowser(self.tabWidgetPage2)
-        self.xml_code_browser.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAsNeeded)
-        self.xml_code_browser.setLineWrapMode(QtWidgets.QTextEdit.NoWrap)
-        self.xml_code_browser.setObjectName("xml_code_browser")
-        self.verticalLayout.addWidget(self.xml_code_browser)
         self.tabWidget.addTab(self.tabWidgetPage2, "")
         self.horizontalLayout_3.addWidget(self.splitter)
         MainWindow.setCentralWidget(self.centralwidget)
@@ -276,7 +271,6 @@ class Ui_MainWindow(object):
         MainWindow.setWindowTitle(_translate("MainWindow", "FOMOD Designer"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tabWidgetPage1), _translate("MainWindow", "Preview"))
         self.label.setText(_translate("MainWindow", "Generated XML Code"))
-        self.xml_code_browser.setPlaceholderText(_translate("MainWindow", "Click a node to see the generated XML code here."))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tabWidgetPage2), _translate("MainWindow", "XML Preview"))
         self.property_editor.setStatusTip(_translate("MainWindow", "A list of all the properties and the means to edit them."))
         self.property_editor.setWindowTitle(_translate("MainWindow", "Property Editor"))
@@ -52,6 +52,11 @@ def preview():
     run("python dev/pyinstaller-bootstrap.py")
 
 
+@task()
+def bench():
+    run("python dev/benchmarks.py", pty=True)
+
+
 @task()
 def clean():
     from shutil import rmtree
@@ -17,8 +17,9 @@
 import sys, os, lxml, pytest
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.io import import_, export, module_parser, new, copy_node, node_factory
-from src.exceptions import ParserError
-from src.nodes import _NodeElement
+from src.exceptions import ParserError, CancelledImportError
+import validator
+from src.nodes import _NodeElement, NodeConfigRoot, _load_allowed_instances
 from src.props import _PropertyBase
 
 
@@ -46,6 +47,59 @@ def test_import_export(tmpdir):
             assert config_base.read() == config_exported.read()
 
 
+def test_export_skips_unchanged(tmpdir):
+    tmpdir = str(tmpdir)
+
+    info_root, config_root = import_(os.path.join(os.path.dirname(__file__), "data", "valid_fomod"))
+    assert len(export(info_root, config_root, tmpdir)) == 2
+    assert export(info_root, config_root, tmpdir) == []
+
+    config_root.find("moduleName").properties["<node_text>"].set_value("Changed")
+    config_root.find("moduleName").write_attribs()
+    assert export(info_root, config_root, tmpdir) == [os.path.join(tmpdir, "fomod", "ModuleConfig.xml")]
+    assert [name for name in os.listdir(os.path.join(tmpdir, "fomod")) if name.endswith(".tmp")] == []
+
+
+def test_hidden_nodes_roundtrip(tmpdir):
+    tmpdir = str(tmpdir)
+
+    info_root, config_root = import_(os.path.join(os.path.dirname(__file__), "data", "valid_fomod"))
+    export(info_root, config_root, tmpdir)
+    module_name = config_root.find("moduleName")
+    module_name.set_hidden(True)
+    config_size = len(config_root)
+    written = export(info_root, config_root, tmpdir)
+    assert written == [os.path.join(tmpdir, "fomod", "ModuleConfig.xml")]
+    assert len(config_root) == config_size and module_name.getparent() is config_root
+    assert lxml.etree.parse(written[0]).getroot().find("moduleName") is None
+    assert "hidden_nodes" not in lxml.etree.tostring(config_root, encoding="unicode")
+
+    _, reimported_root = import_(tmpdir)
+    assert reimported_root.find("moduleName").is_hidden
+    assert reimported_root.hidden_children == [reimported_root.find("moduleName")]
+    assert "hidden_nodes" not in lxml.etree.tostring(reimported_root, encoding="unicode")
+    assert [name for name in os.listdir(os.path.join(tmpdir, "fomod")) if name.endswith(".tmp")] == []
+
+
+def test_remove_hidden_child(tmpdir):
+    tmpdir = str(tmpdir)
+
+    info_root, config_root = import_(os.path.join(os.path.dirname(__file__), "data", "valid_fomod"))
+    plugin = config_root.find(".//plugin")
+    plugins = plugin.getparent()
+    plugin.set_hidden(True)
+    plugins.remove_child(plugin)
+    assert plugins.hidden_children == []
+    written = export(info_root, config_root, tmpdir)
+    assert os.path.join(tmpdir, "fomod", "ModuleConfig.xml") in written
+
+    plugins.append_child(plugin)
+    assert plugins.hidden_children == [plugin]
+    export(info_root, config_root, tmpdir)
+    exported_plugins = lxml.etree.parse(os.path.join(tmpdir, "fomod", "ModuleConfig.xml")).find(".//plugins")
+    assert len(exported_plugins.findall("plugin")) == len(plugins.findall("plugin")) - 1
+
+
 def test_exceptions():
     invalid_fomod = "<boopity/>"
     with pytest.raises(AssertionError):
@@ -64,6 +118,17 @@ def test_exceptions():
     assert (None, None) == import_(os.path.join(os.path.dirname(__file__), "boop"))
 
 
+def test_import_cancel():
+    with pytest.raises(CancelledImportError):
+        import_(os.path.join(os.path.dirname(__file__), "data", "valid_fomod"), cancelled=lambda: True)
+
+
+def test_import_progress():
+    progress = []
+    import_(os.path.join(os.path.dirname(__file__), "data", "valid_fomod"), lambda *args: progress.append(args))
+    assert max(position for position, _ in progress) == progress[0][1]
+
+
 def test_node_operations():
     base_info = "<fomod/>"
     base_config = "<config xmlns:xsi=\"http://www.w3.org/2001/XMLSchema-instance\" " \
@@ -94,3 +159,621 @@ def test_node_operations():
     new_config_root.load_metadata()
 
     assert new_sort_order_xml == lxml.etree.tostring(new_config_root, encoding="unicode")
+
+
+def test_child_counts():
+    _, config_root = new()
+    mod_name = node_factory("moduleName", config_root)
+    assert config_root.can_add_child(mod_name)
+    config_root.add_child(mod_name)
+    assert config_root.child_count(type(mod_name)) == 1
+    assert not config_root.can_add_child(node_factory("moduleName", config_root))
+
+    config_root.remove_child(mod_name)
+    assert config_root.child_count(type(mod_name)) == 0
+    assert config_root.can_add_child(mod_name)
+
+    # pasting, as the paste command does it
+    steps = node_factory("installSteps", config_root)
+    config_root.add_child(steps)
+    step = node_factory("installStep", steps)
+    steps.add_child(step)
+    pasted = copy_node(step, steps)
+    steps.append_child(pasted)
+    steps.attach_child_item(pasted)
+    assert steps.child_count(type(step)) == 2
+    assert steps.child_count(type(step)) == len(steps.findall("installStep"))
+    steps.remove_child(pasted)
+    assert steps.child_count(type(step)) == 1
+
+
+def test_node_class_lookup():
+    from src import nodes
+
+    config = "<config>" \
+             "<moduleDependencies><dependencies><dependencies/></dependencies></moduleDependencies>" \
+             "<conditionalFileInstalls><patterns><pattern><dependencies/></pattern></patterns>" \
+             "</conditionalFileInstalls>" \
+             "<installSteps><installStep><optionalFileGroups><group><plugins><plugin><typeDescriptor>" \
+             "<dependencyType><patterns><pattern><dependencies/></pattern></patterns></dependencyType>" \
+             "</typeDescriptor></plugin></plugins></group></optionalFileGroups></installStep></installSteps>" \
+             "</config>"
+    root = lxml.etree.fromstring(config, parser=module_parser)
+
+    assert type(root.find("moduleDependencies/dependencies")) is nodes.NodeConfigNestedDependencies
+    assert type(root.find("moduleDependencies/dependencies/dependencies")) is nodes.NodeConfigNestedDependencies
+    assert type(root.find("conditionalFileInstalls/patterns")) is nodes.NodeConfigPatterns
+    assert type(root.find("conditionalFileInstalls/patterns/pattern")) is nodes.NodeConfigPattern
+    assert type(root.find("conditionalFileInstalls/patterns/pattern/dependencies")) is nodes.NodeConfigDependencies
+
+    type_desc = root.find(".//typeDescriptor")
+    assert type(type_desc.find("dependencyType/patterns")) is nodes.NodeConfigInstallPatterns
+    assert type(type_desc.find("dependencyType/patterns/pattern")) is nodes.NodeConfigInstallPattern
+    assert type(type_desc.find("dependencyType/patterns/pattern/dependencies")) is nodes.NodeConfigDependencies
+
+    pattern = type_desc.find("dependencyType/patterns/pattern")
+    assert type(node_factory("pattern", type_desc.find("dependencyType/patterns"))) is nodes.NodeConfigInstallPattern
+    assert type(node_factory("dependencies", pattern)) is nodes.NodeConfigDependencies
+    assert type(node_factory("dependencies", pattern.find("dependencies"))) is nodes.NodeConfigNestedDependencies
+    assert type(node_factory("pattern", root.find("conditionalFileInstalls/patterns"))) is nodes.NodeConfigPattern
+    assert type(node_factory("dependencies", pattern).getparent()) is nodes.NodeConfigInstallPattern
+
+
+def test_copy_node():
+    from src import nodes
+
+    depth = 1500
+    root = lxml.etree.fromstring("<config><moduleDependencies/></config>", parser=module_parser)
+    parent = root[0]
+    for _ in range(depth):
+        parent = lxml.etree.SubElement(parent, "dependencies", operator="Or")
+    parent.append(lxml.etree.Comment("comment"))
+    lxml.etree.SubElement(parent, "fileDependency", file="a.esp", state="Active")
+    source = root[0][0]
+    parent[1].set_hidden(True)
+
+    result = copy_node(source)
+    assert type(result) is nodes.NodeConfigNestedDependencies
+    assert len(list(result.iter())) == len(list(source.iter()))
+    assert result.model_item.rowCount() == 1
+
+    deepest = result.find("dependencies/" * (depth - 2) + "dependencies")
+    assert [type(child) for child in deepest] == [nodes.NodeComment, nodes.NodeConfigDependFile]
+    assert deepest.properties["operator"].value == "Or"
+    assert deepest.model_item.rowCount() == 2
+    assert deepest[0].model_item.text() == "comment"
+    assert len(deepest.findall("fileDependency")) == 1
+    assert deepest.find("fileDependency").is_hidden
+
+
+def test_package_index(tmpdir):
+    from src.io import PackageIndex
+    from src.exceptions import MissingFileError
+
+    tmpdir.mkdir("Fomod").join("info.XML").write("")
+    index = PackageIndex(str(tmpdir))
+
+    assert index.resolve("fomod\\Info.xml") == os.path.join("Fomod", "info.XML")
+    with pytest.raises(MissingFileError):
+        index.resolve("fomod/ModuleConfig.xml")
+
+    tmpdir.join("Fomod", "moduleconfig.xml").write("")
+    tmpdir.join("Fomod", "info.XML").remove()
+    assert index.resolve("FOMOD/ModuleConfig.xml") == os.path.join("Fomod", "moduleconfig.xml")
+    with pytest.raises(MissingFileError):
+        index.resolve("fomod/Info.xml")
+
+    # a file added within the same modification time tick is still found
+    folder_stat = os.stat(str(tmpdir.join("Fomod")))
+    tmpdir.join("Fomod", "Info.xml").write("")
+    os.utime(str(tmpdir.join("Fomod")), ns=(folder_stat.st_atime_ns, folder_stat.st_mtime_ns))
+    assert index.resolve("fomod/info.xml") == os.path.join("Fomod", "Info.xml")
+
+
+def test_headless(tmpdir):
+    import subprocess
+
+    script = "import sys\n" \
+             "sys.modules['PyQt5'] = None\n" \
+             "from src.io import import_, export\n" \
+             "info_root, config_root = import_(sys.argv[1])\n" \
+             "config_root.find('moduleName').item_text = 'Renamed'\n" \
+             "config_root.find('moduleName').save_metadata()\n" \
+             "export(info_root, config_root, sys.argv[2])\n"
+    subprocess.check_call(
+        [sys.executable, "-c", script, os.path.join(os.path.dirname(__file__), "data", "valid_fomod"), str(tmpdir)],
+        cwd=os.path.join(os.path.dirname(__file__), "..")
+    )
+    assert "{\"name\":\"Renamed\"}" in tmpdir.join("fomod", "ModuleConfig.xml").read()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="file modes are posix only")
+def test_export_permissions(tmpdir):
+    info_root, config_root = import_(os.path.join(os.path.dirname(__file__), "data", "valid_fomod"))
+    export(info_root, config_root, str(tmpdir))
+    info_path = str(tmpdir.join("fomod", "Info.xml"))
+    config_path = str(tmpdir.join("fomod", "ModuleConfig.xml"))
+    current_umask = os.umask(0)
+    os.umask(current_umask)
+    assert os.stat(info_path).st_mode & 0o777 == 0o666 & ~current_umask
+
+    os.chmod(config_path, 0o644)
+    config_root.find("moduleName").item_text = "Renamed"
+    config_root.find("moduleName").save_metadata()
+    assert export(info_root, config_root, str(tmpdir)) == [config_path]
+    assert os.stat(config_path).st_mode & 0o777 == 0o644
+
+
+def test_snapshot_cache(tmpdir):
+    import shutil
+    from src.snapshots import SnapshotCache
+
+    package = str(tmpdir.join("package"))
+    shutil.copytree(os.path.join(os.path.dirname(__file__), "data", "valid_fomod"), package)
+    cache = SnapshotCache(str(tmpdir.join("snapshots")), max_entries=1)
+    assert (None, None) == cache.load(package)
+
+    info_root, config_root = import_(package)
+    config_root.find("moduleName").set_hidden(True)
+    cache.store(package, info_root, config_root)
+    cached_info, cached_config = cache.load(package)
+    assert lxml.etree.tostring(cached_info) == lxml.etree.tostring(info_root)
+    assert lxml.etree.tostring(cached_config) == lxml.etree.tostring(config_root)
+    assert cached_config.hidden_children == [cached_config.find("moduleName")]
+    assert cached_config.find("moduleName").is_hidden
+    assert cached_config.model_item.rowCount() == config_root.model_item.rowCount()
+    for cached, imported in zip(cached_config.iter(), config_root.iter()):
+        assert cached.dump_state() == imported.dump_state()
+        assert cached.item_text == imported.item_text
+        if cached.tag is not lxml.etree.Comment:
+            assert cached.sort_key == imported.sort_key
+
+    snapshot_path = tmpdir.join("snapshots").listdir()[0]
+    snapshot_path.write_binary(b"not a snapshot")
+    assert (None, None) == cache.load(package)
+    cache.store(package, info_root, config_root)
+
+    tmpdir.join("package", "fomod", "Info.xml").write("<fomod/>")
+    assert (None, None) == cache.load(package)
+
+    other = str(tmpdir.join("other"))
+    shutil.copytree(os.path.join(os.path.dirname(__file__), "data", "valid_fomod"), other)
+    cache.store(package, *import_(package))
+    cache.store(other, *import_(other))
+    assert len(tmpdir.join("snapshots").listdir()) == 1
+
+
+def test_archive_import(tmpdir):
+    import zipfile
+    from src.io import ArchiveIndex
+    from src.exceptions import MissingFileError, ReadOnlyArchiveError
+
+    package = os.path.join(os.path.dirname(__file__), "data", "valid_fomod")
+    archive_path = str(tmpdir.join("valid_fomod.zip"))
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.write(os.path.join(package, "fomod", "Info.xml"), "FOMOD/info.xml")
+        archive.write(os.path.join(package, "fomod", "ModuleConfig.xml"), "FOMOD/ModuleConfig.xml")
+
+    index = ArchiveIndex(archive_path)
+    assert index.resolve("fomod\\Info.xml") == "FOMOD/info.xml"
+    assert index.resolve("fomod") == "FOMOD"
+    with pytest.raises(MissingFileError):
+        index.resolve("fomod/images")
+
+    info_root, config_root = import_(archive_path)
+    folder_info_root, folder_config_root = import_(package)
+    assert lxml.etree.tostring(info_root) == lxml.etree.tostring(folder_info_root)
+    assert lxml.etree.tostring(config_root) == lxml.etree.tostring(folder_config_root)
+
+    with pytest.raises(ReadOnlyArchiveError):
+        export(info_root, config_root, archive_path)
+
+
+def test_archive_preview(tmpdir):
+    import zipfile
+    from src.io import ArchiveIndex
+    from src.previews import PreviewGuiWorker, LatestQueue
+
+    archive_path = str(tmpdir.join("package.zip"))
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.writestr("Data/Sub/plugin.esp", b"esp")
+        archive.writestr("Data/image.png", b"png")
+        archive.writestr("Empty/", b"")
+
+    index = ArchiveIndex(archive_path)
+    assert index.is_folder("") and index.is_folder("data") and index.is_folder("Empty")
+    assert not index.is_folder("Data/image.png")
+    assert sorted(index.list_folder("data")) == [("Sub", "Data/Sub", True), ("image.png", "Data/image.png", False)]
+    assert index.list_folder("Empty") == []
+
+    step = b"<installStep name=\"Step\"><optionalFileGroups><group name=\"Group\" type=\"SelectAny\"><plugins>" \
+           b"<plugin name=\"Plugin\"><description/><image path=\"data\\image.png\"/>" \
+           b"<files><folder source=\"data/sub\" destination=\"\"/></files>" \
+           b"<typeDescriptor><type name=\"Optional\"/></typeDescriptor></plugin>" \
+           b"</plugins></group></optionalFileGroups></installStep>"
+    worker = PreviewGuiWorker(LatestQueue(), package_path=lambda: archive_path)
+    step_data = worker.step_data(lxml.etree.fromstring(step))
+    plugin = step_data.group_list[0].plugin_list[0]
+    assert plugin.image_path == "Data/image.png"
+    with step_data.package.open(plugin.image_path) as file_:
+        assert file_.read() == b"png"
+    assert step_data.package.list_folder(plugin.folder_list[0].source) == [("plugin.esp", "Data/Sub/plugin.esp", False)]
+
+
+def test_node_state_pinned():
+    import gc
+
+    info_root, config_root = import_(os.path.join(os.path.dirname(__file__), "data", "valid_fomod"))
+    module_name = config_root.find("moduleName")
+    module_name.item_text = "Renamed"
+    module_name.save_metadata()
+
+    for element in config_root.iter():
+        element.state_marker = True
+    gc.collect()
+    assert all(getattr(element, "state_marker", False) for element in config_root.iter())
+
+    config_root.remove_child(module_name)
+    assert module_name not in config_root.pinned_children
+
+
+def test_move_child():
+    _, config_root = import_(os.path.join(os.path.dirname(__file__), "data", "valid_fomod"))
+    files = config_root.find("requiredInstallFiles")
+    row_count = files.model_item.rowCount()
+    original = files.find("file")
+    assert files.child_count(type(original)) == 1
+    config_root.sort()
+
+    # a drag and drop move, as the node tree's model does it
+    moved = copy_node(original)
+    files.remove_child(original, keep_item=True)
+    assert original.model_item.parent() is files.model_item  # the view removes the row itself
+    files.append_child(moved)
+    files.attach_child_item(moved, 0)
+    assert files.model_item.rowCount() == row_count + 1
+    assert files.child_count(type(moved)) == len(files.findall("file")) == 1
+    assert original not in files.pinned_children and moved in files.pinned_children
+    assert files._children_unsorted and config_root._subtree_unsorted
+
+
+def test_sort():
+    root = lxml.etree.fromstring(
+        "<config><moduleDependencies><fileDependency file=\"a.esp\" state=\"Active\"/>"
+        "<fileDependency file=\"b.esp\" state=\"Active\"/></moduleDependencies>"
+        "<requiredInstallFiles><file source=\"a\"/><file source=\"b\"/></requiredInstallFiles></config>",
+        parser=module_parser
+    )
+    # keep the proxies (and their flags) alive
+    nodes_ = list(root.iter())
+    root.sort()
+    dependencies, files = root.find("moduleDependencies"), root.find("requiredInstallFiles")
+    assert not root._subtree_unsorted and not dependencies._children_unsorted
+
+    dependencies[0].user_sort_order = "2".zfill(7)
+    files[0].user_sort_order = "2".zfill(7)
+    assert dependencies._children_unsorted and root._subtree_unsorted
+
+    assert dependencies.sort() == [dependencies]
+    assert [child.get("file") for child in dependencies] == ["b.esp", "a.esp"]
+    assert [child.get("source") for child in files] == ["a", "b"]
+    assert root._subtree_unsorted
+
+    assert root.sort() == [files]
+    assert [child.get("source") for child in files] == ["b", "a"]
+    assert not root._subtree_unsorted and len(nodes_) == 7
+
+    from src.items import SORT_ROLE
+    item = files[0].model_item
+    assert item.data(SORT_ROLE) == files[0].sort_order + ".0000000"
+    files[0].user_sort_order = "3".zfill(7)
+    assert item.data(SORT_ROLE) == files[0].sort_order + ".0000003"
+
+
+def test_metadata_codec():
+    legacy = "<!--<designer.metadata.do.not.edit> {\"user_sort\": \"0000003\", \"name\": \"Named\"}-->"
+    root = lxml.etree.fromstring("<config><moduleName>" + legacy + "</moduleName></config>", parser=module_parser)
+    module_name = root[0]
+    module_name.load_metadata()
+    assert module_name.metadata == {"name": "Named", "user_sort": "0000003"}
+    assert module_name.item_text == "Named" and module_name.user_sort_order == "0000003"
+
+    # unchanged metadata keeps its comment as it was
+    module_name.save_metadata()
+    assert lxml.etree.tostring(module_name[0], encoding="unicode") == legacy
+
+    module_name.item_text = "Renamed"
+    module_name.save_metadata()
+    assert module_name[0].text == "<designer.metadata.do.not.edit> {\"name\":\"Renamed\",\"user_sort\":\"0000003\"}"
+
+    module_name.item_text = module_name.name
+    module_name.user_sort_order = "0".zfill(7)
+    module_name.save_metadata()
+    assert len(module_name) == 0
+
+
+def test_node_schema(tmpdir):
+    first = node_factory("installStep", None)
+    second = node_factory("installStep", None)
+    assert type(first).schema() is type(second).schema()
+    assert first.allowed_children is second.allowed_children
+    assert [cls.tag for cls in first.required_children] == ["optionalFileGroups"]
+
+    class NodeWithoutSchema(_NodeElement):
+        tag = "withoutSchema"
+
+    with pytest.raises(AssertionError):
+        NodeWithoutSchema()
+
+    assert first.allowed_instances == 0
+    assert node_factory("gameDependency", None).allowed_instances == 1
+    assert node_factory("file", None).allowed_instances == 0
+    assert node_factory("moduleName", None).allowed_instances == 1
+
+    with open(validator.validate.SCHEMA_FILE_PATH) as schema_file:
+        schema = schema_file.read()
+    drifted = os.path.join(str(tmpdir), "drifted.xsd")
+    with open(drifted, "w") as drifted_file:
+        drifted_file.write(schema.replace('name="fileDependency" type="fileDependency"',
+                                          'name="fileDependency" type="fileDependency" maxOccurs="1"'))
+    assert _load_allowed_instances(NodeConfigRoot, drifted)[type(node_factory("fileDependency", None))] == 1
+    with open(drifted, "w") as drifted_file:
+        drifted_file.write(schema.replace('name="moduleName"', 'name="modName"'))
+    with pytest.raises(AssertionError):
+        _load_allowed_instances(NodeConfigRoot, drifted)
+
+    first.properties["name"].set_value("First")
+    assert second.properties["name"].value == ""
+    assert first.properties["name"].prop is second.properties["name"].prop
+
+
+def test_property_values():
+    first = node_factory("dependencies", None)
+    second = node_factory("dependencies", None)
+    assert list(first.properties) == ["operator"] and "operator" in first.properties
+    assert first.properties["operator"].name == "Type" and first.properties["operator"].value == "And"
+
+    set_operator = first.properties["operator"].set_value
+    set_operator("Or")
+    set_operator("Neither")
+    assert first.properties["operator"].value == "Or"
+    assert second.properties["operator"].value == "And"
+
+    first.write_attribs()
+    assert first.get("operator") == "Or"
+
+    # Qt only keeps weak references to the objects behind connected slots
+    from weakref import ref
+    assert ref(first.properties["operator"])() is not None
+
+
+def test_flag_index():
+    config = "<config><conditionalFileInstalls><patterns><pattern><dependencies>" \
+             "<flagDependency flag=\"a\" value=\"On\"/></dependencies></pattern></patterns></conditionalFileInstalls>" \
+             "</config>"
+    root = lxml.etree.fromstring(config, parser=module_parser)
+    for node in root.iter():
+        node.parse_attribs()
+    reader = root.find(".//flagDependency")
+    assert root.live_flag_index() is None
+    flag_index = root.flag_index
+    assert root.live_flag_index() is flag_index
+    assert flag_index.labels() == [] and flag_index.usages("a") == ([], [reader])
+
+    install_steps = node_factory("installSteps", root)
+    root.add_child(install_steps)
+    step = node_factory("installStep", install_steps)
+    install_steps.add_child(step)
+    groups = node_factory("optionalFileGroups", step)
+    step.add_child(groups)
+    group = node_factory("group", groups)
+    groups.add_child(group)
+    plugins = node_factory("plugins", group)
+    group.add_child(plugins)
+    plugin = node_factory("plugin", plugins)
+    plugins.add_child(plugin)
+    flags = node_factory("conditionFlags", plugin)
+    plugin.add_child(flags)
+    flag = node_factory("flag", flags)
+    flags.add_child(flag)
+
+    flag.properties["name"].set_value("a")
+    flag.properties["<node_text>"].set_value("On")
+    flag.write_attribs()
+    assert flag_index.labels() == ["a"] and flag_index.values("a") == ["On"]
+    assert flag_index.usages("a") == ([flag], [reader])
+
+    labels_revision = flag_index.labels_revision
+    flag.properties["<node_text>"].set_value("Off")
+    flag.write_attribs()
+    assert flag_index.values("a") == ["Off"] and flag_index.labels_revision == labels_revision
+
+    # moving the flag to another plugin, as a drag and drop does
+    other_plugin = node_factory("plugin", plugins)
+    plugins.add_child(other_plugin)
+    other_flags = node_factory("conditionFlags", other_plugin)
+    other_plugin.add_child(other_flags)
+    moved = copy_node(flag, other_flags)
+    flags.remove_child(flag, keep_item=True)
+    other_flags.append_child(moved)
+    assert flag_index.labels() == ["a"] and flag_index.values("a") == ["Off"]
+    assert flag_index.usages("a") == ([moved], [reader])
+
+    labels_revision = flag_index.labels_revision
+    assert flag_index.rename("a", "b") == [moved, reader]
+    assert flag_index.labels_revision != labels_revision
+    assert moved.get("name") == "b" and reader.get("flag") == "b"
+    assert flag_index.labels() == ["b"] and flag_index.values("b") == ["Off"]
+    assert flag_index.usages("a") == ([], []) and flag_index.usages("b") == ([moved], [reader])
+    flag_index.relabel([moved, reader], "a")
+    assert flag_index.usages("a") == ([moved], [reader]) and flag_index.usages("b") == ([], [])
+    assert flag_index.rename("a", "") == [] and flag_index.rename("a", "a") == []
+
+    root.remove_child(install_steps)
+    assert flag_index.labels() == [] and flag_index.values("a") == []
+
+
+def test_latest_queue():
+    from threading import Thread
+    from src.previews import LatestQueue
+
+    queue = LatestQueue()
+    assert not queue.pending()
+    queue.put("old")
+    queue.put(None)
+    assert queue.pending()
+    assert queue.get() is None
+    assert not queue.pending()
+
+    queue = LatestQueue(debounce=0.05)
+    results = []
+    consumer = Thread(target=lambda: results.append(queue.get()))
+    consumer.start()
+    for item in range(5):
+        queue.put(item)
+    consumer.join(1)
+    assert results == [4]
+
+    from time import sleep
+    queue = LatestQueue(debounce=0.05, max_delay=0.1)
+    consumer = Thread(target=lambda: results.append(queue.get()))
+    consumer.start()
+    for item in range(50):
+        queue.put(item)
+        sleep(0.01)
+    consumer.join(1)
+    assert 0 < results[1] < 40
+
+
+def test_preview_snapshot():
+    from src.previews import PreviewSnapshot
+
+    info_root = lxml.etree.fromstring("<fomod><Name>Mod</Name></fomod>", parser=module_parser)
+    config_root = lxml.etree.fromstring(
+        "<config><moduleName>" + "Mod" * 300 + "</moduleName><installSteps order=\"Explicit\">"
+        "<installStep name=\"Step\"><optionalFileGroups order=\"Explicit\"/></installStep></installSteps></config>",
+        parser=module_parser
+    )
+    groups = config_root.find(".//optionalFileGroups")
+    snapshot = PreviewSnapshot(groups, info_root, config_root)
+    assert snapshot.state == PreviewSnapshot.STEP
+    assert snapshot.document == lxml.etree.tostring(config_root)
+    assert snapshot.path == (1, 0, 0)
+    assert snapshot.info == ("Mod", "", "", "")
+
+    assert snapshot.step_path == (1, 0)
+    assert PreviewSnapshot(groups, info_root, config_root, changed=()).document == snapshot.document
+    unchanged = PreviewSnapshot(groups.getparent(), info_root, config_root, (), snapshot)
+    assert unchanged.document is snapshot.document and unchanged.step_path == (1, 0)
+    assert unchanged.revision == snapshot.revision and unchanged.patches == ()
+
+    step = groups.getparent()
+    step.set("name", "Renamed")
+    patched = PreviewSnapshot(groups, info_root, config_root, {step}, unchanged)
+    assert patched.document is snapshot.document and patched.revision == snapshot.revision
+    assert patched.patches == (((1, 0), lxml.etree.tostring(step)),)
+    groups.set("order", "Ascending")
+    patched = PreviewSnapshot(groups, info_root, config_root, {groups}, patched)
+    assert patched.patches == (((1, 0), lxml.etree.tostring(step)),)
+    config_root[0].text = "Other"
+    patched = PreviewSnapshot(groups, info_root, config_root, {config_root[0]}, patched)
+    assert [path for path, _ in patched.patches] == [(0,), (1, 0)]
+    patched = PreviewSnapshot(groups, info_root, config_root, {step.getparent()}, patched)
+    assert [path for path, _ in patched.patches] == [(0,), (1,)]
+    renewed = PreviewSnapshot(groups, info_root, config_root, {config_root}, patched)
+    assert renewed.document == lxml.etree.tostring(config_root) and renewed.revision != snapshot.revision
+    assert renewed.patches == ()
+    assert PreviewSnapshot(groups, info_root, config_root, {info_root}, renewed).patches == ()
+    config_root[0].text = "Mod" * 100
+    assert PreviewSnapshot(groups, info_root, config_root, {config_root[0]}, patched).revision != patched.revision
+    config_root[0].text = "Other"
+    step.remove(groups)
+    detached = PreviewSnapshot(step, info_root, config_root, {step, groups}, patched)
+    assert detached.revision == patched.revision and [path for path, _ in detached.patches] == [(0,), (1,)]
+
+    assert PreviewSnapshot(config_root[0], info_root, config_root).state == PreviewSnapshot.INVALID
+    config_root.remove(config_root[1])
+    assert PreviewSnapshot(config_root[0], info_root, config_root).state == PreviewSnapshot.MISSING
+    assert PreviewSnapshot(None, info_root, config_root).path is None
+
+
+def test_code_preview():
+    from src.previews import PreviewCodeWorker, CodeDocument, LatestQueue
+
+    document = CodeDocument(lxml.etree.fromstring(b"<config><moduleName>Mod</moduleName><installSteps><installStep>"
+                                                  b"<visible/></installStep></installSteps></config>"))
+    assert document.lines[4] == "      <visible/>"
+    assert document.line_range(()) == (0, 7)
+    assert document.line_range((0,)) == (1, 1)
+    assert document.line_range((1,)) == (2, 6)
+    assert document.line_range((1, 0)) == (3, 5)
+    assert document.line_range((1, 0, 0)) == (4, 4)
+    assert document.line_range((2,)) is None
+
+    worker = PreviewCodeWorker(LatestQueue(), None)
+    update = worker.update(document, (0,))
+    assert (update.start, update.end, update.lines, update.selection) == (0, 0, document.lines, (1, 1))
+    edited = CodeDocument(lxml.etree.fromstring(b"<config><moduleName>Mod</moduleName><installSteps><installStep>"
+                                                b"<visible/><visible/></installStep></installSteps></config>"))
+    update = worker.update(edited, (1, 0, 1))
+    assert (update.start, update.end, update.lines, update.selection) == (5, 5, ["      <visible/>"], (5, 5))
+    update = worker.update(edited, (0,))
+    assert update.lines is None and update.selection == (1, 1)
+    update = worker.update(None, None)
+    assert (update.start, update.end, update.lines, update.selection) == (0, 9, [], None)
+
+    worker = PreviewCodeWorker(LatestQueue(), None, cache_size=2 * document.size)
+    assert worker.render(b"<config/>") is worker.render(b"<config/>")
+    worker.cache_document(b"a", document)
+    worker.cache_document(b"b", document)
+    assert b"a" in worker.cache and len(worker.cache) == 2
+    worker.cache_document(b"c", edited)
+    assert list(worker.cache) == [b"c"]
+
+    worker = PreviewCodeWorker(LatestQueue(), None)
+    xml = b"<config><moduleName>Mod</moduleName><installSteps><installStep/></installSteps></config>"
+    assert worker.render(xml, 1).lines[1] == "  <moduleName>Mod</moduleName>"
+    patch = ((0,), b"<moduleName>Other</moduleName>")
+    assert worker.render(xml, 1, (patch,)).lines[1] == "  <moduleName>Other</moduleName>"
+    patched = worker.render(xml, 1, (patch, ((1, 0), b"<installStep><visible/></installStep>")))
+    assert patched.lines == ["<config>", "  <moduleName>Other</moduleName>", "  <installSteps>", "    <installStep>",
+                             "      <visible/>", "    </installStep>", "  </installSteps>", "</config>"]
+    assert patched.line_range((1, 0, 0)) == (4, 4)
+    other = PreviewCodeWorker(LatestQueue(), None)
+    assert other.render(xml, 1, ((patch[0], b"<moduleName>Other</moduleName>"),)).lines[1] == \
+        "  <moduleName>Other</moduleName>"
+    assert worker.render(xml, 2).lines[1] == "  <moduleName>Mod</moduleName>"
+
+
+def test_preview_step_data():
+    from src.previews import PreviewGuiWorker, LatestQueue
+
+    step = b"<installStep name=\"Step\"><visible><flagDependency flag=\"a\" value=\"On\"/></visible>" \
+           b"<optionalFileGroups order=\"Descending\">" \
+           b"<group name=\"First\" type=\"SelectAny\"><plugins order=\"Ascending\">" \
+           b"<plugin name=\"B\"><description>Desc</description><conditionFlags><flag name=\"a\">On</flag>" \
+           b"</conditionFlags><typeDescriptor><dependencyType><defaultType name=\"Optional\"/><patterns>" \
+           b"<pattern><dependencies/><type name=\"NotUsable\"/></pattern></patterns></dependencyType>" \
+           b"</typeDescriptor></plugin>" \
+           b"<plugin name=\"A\"><description/><typeDescriptor><type name=\"Recommended\"/></typeDescriptor>" \
+           b"</plugin></plugins></group>" \
+           b"<group name=\"Second\" type=\"SelectAll\"><plugins order=\"Explicit\"/></group>" \
+           b"</optionalFileGroups></installStep>"
+    worker = PreviewGuiWorker(LatestQueue(), package_path=lambda: "")
+    step_data = worker.cached_step_data(lxml.etree.fromstring(step), 0, (1, 0))
+    assert worker.cached_step_data(lxml.etree.fromstring(step), 0, (1, 0), (((0,), b"<moduleName/>"),)) is step_data
+    assert worker.cached_step_data(lxml.etree.fromstring(step), 1, (1, 0)) is not step_data
+    step_patch = ((1, 0, 1, 0), b"<group name=\"First\"/>")
+    patched = worker.cached_step_data(lxml.etree.fromstring(step), 0, (1, 0), (step_patch,))
+    assert patched is not step_data
+    assert worker.cached_step_data(lxml.etree.fromstring(step), 0, (1, 0), (step_patch,)) is patched
+    assert worker.cached_step_data(lxml.etree.fromstring(step), 0, (1, 0), (((1,), b"<installSteps/>"),)) \
+        is not patched
+
+    assert step_data.name == "Step"
+    assert [group.name for group in step_data.group_list] == ["Second", "First"]
+    plugins = step_data.group_list[1].plugin_list
+    assert [(plugin.name, plugin.type) for plugin in plugins] == [("A", "Recommended"), ("B", "Optional")]
+    assert plugins[1].description == "Desc"
+    assert [(flag.label, flag.value) for flag in plugins[1].flag_list] == [("a", "On")]
+    assert step_data.group_list[0].plugin_list == []